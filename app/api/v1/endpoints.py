@@ -1,8 +1,18 @@
-from fastapi import APIRouter,Request,Body
-from app.models.predict import PredictRequest
+import time
+
+from fastapi import APIRouter,Request,Body,HTTPException
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from app.models.predict import PredictRequest, DelayReportRequest
 from app.services import algorithm
 from app.models.response import ResponseModel
-from app.core.funcLogger import log_function
+from app.core.funcLogger import log_function, logger
+from app.core import deadline
+from app.core.admission import admission, Overloaded
+from app.services import bulk_predict
+from app.services.delay_ingest import delay_buffer, delay_journal, ingest_reports
+from app.services.train_delay.predict_delay_api import model_registry
+from app.services.model_tiers import tier_controller
 
 router = APIRouter()
 
@@ -16,8 +26,99 @@ router = APIRouter()
 
 
 
+# 每个请求带截止时间（REQUEST_DEADLINE_MS，含排队时间），数据库、模型、级联各阶段按剩余时间降级；
+# 排队已满或排队超时的请求直接返回 503
 @router.post("/affect/predict", response_model=ResponseModel)
 @log_function
 def forecast(request: PredictRequest):
-    algorithm_result = algorithm.get_predict_result(request)
-    return ResponseModel.success(algorithm_result)
\ No newline at end of file
+    with deadline.scope(deadline.REQUEST_DEADLINE_MS / 1000):
+        try:
+            with admission.admit():
+                algorithm_result = algorithm.get_predict_result(request)
+        except Overloaded as e:
+            raise HTTPException(status_code=503, detail=f"服务繁忙，请稍后重试（{e}）")
+    return ResponseModel.success(algorithm_result)
+
+
+# 实时到站报告批量写入（经共享日志同步到所有 worker）；报告量大，不逐条记录入参日志
+@router.post("/delay/report", response_model=ResponseModel)
+def report_delay(request: DelayReportRequest):
+    timetable = algorithm.data_input_utils.historical_data if algorithm.data_input_utils else None
+    result = ingest_reports(request.reports, timetable, delay_buffer, delay_journal)
+    return ResponseModel.success(result)
+
+
+# 模型版本：saved_weights/ 索引与当前服务版本
+@router.get("/models", response_model=ResponseModel)
+def list_models():
+    return ResponseModel.success({**model_registry.status(), "tiers": tier_controller.status(),
+                                  "models": model_registry.index()})
+
+
+# 影子 / A/B 对比：各版本在已到站目标上的在线误差（多 worker 部署时为处理该请求的 worker 的统计）
+@router.get("/models/comparison", response_model=ResponseModel)
+def model_comparison():
+    report = algorithm.shadow_comparison.report() if algorithm.shadow_comparison is not None else {}
+    return ResponseModel.success({**model_registry.experiments(), "errors": report})
+
+
+# 后台加载并预热指定版本，成功后切换；进行中的请求在旧版本上完成
+@router.post("/models/{name}/activate", response_model=ResponseModel)
+@log_function
+def activate_model(name: str):
+    try:
+        return ResponseModel.success(model_registry.activate(name))
+    except ValueError as e:
+        return ResponseModel.fail(str(e))
+
+
+# 批量后果预估：[{"args": {...}}, ...]，最多 BULK_MAX_REQUESTS 条，整批占用一个准入名额、共用一个截止时间；
+# 请求体只解析一次并校验必填字段，结果不经 Pydantic 模型直接序列化，只记录一行摘要日志
+@router.post("/affect/predict/bulk", response_model=ResponseModel)
+async def forecast_bulk(request: Request):
+    start = time.time()
+    try:
+        requests = bulk_predict.parse_bulk(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    def run():
+        with deadline.scope(bulk_predict.BULK_DEADLINE_MS / 1000):
+            with admission.admit():
+                return bulk_predict.encode_response(
+                    bulk_predict.run_bulk(requests, algorithm.compute_predict_result))
+
+    try:
+        body = await run_in_threadpool(run)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=f"服务繁忙，请稍后重试（{e}）")
+    logger.info(f"Bulk forecast: {len(requests)} requests, {len(body)} bytes, "
+                f"{(time.time() - start) * 1000:.0f}ms")
+    return Response(content=body, media_type="application/json")
+
+
+# 流式后果预估：请求体与 /affect/predict 相同，预测完成后依次以 NDJSON 分块发送统计信息、列车表各行、
+# 影响图各站点和线路段（格式见 bulk_predict.iter_ndjson），不在内存中组装完整的响应文档
+@router.post("/affect/predict/stream")
+async def forecast_stream(request: Request):
+    start = time.time()
+    try:
+        lean = bulk_predict.parse_request(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    # 准入名额和截止时间只覆盖预测本身，发送阶段不占用名额
+    def prepare():
+        with deadline.scope(deadline.REQUEST_DEADLINE_MS / 1000):
+            with admission.admit():
+                return algorithm.prepare_predict_result(lean)
+
+    try:
+        prepared = await run_in_threadpool(prepare)
+    except Overloaded as e:
+        raise HTTPException(status_code=503, detail=f"服务繁忙，请稍后重试（{e}）")
+    logger.info(f"Stream forecast: {len(prepared['affected_trains'])} trains, "
+                f"{(time.time() - start) * 1000:.0f}ms to first chunk")
+    records = algorithm.iter_predict_result(prepared)
+    return StreamingResponse(bulk_predict.iter_ndjson(records, prepared['model_tier']),
+                             media_type="application/x-ndjson")
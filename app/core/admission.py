@@ -0,0 +1,72 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from app.core import deadline
+from app.core.metrics import metrics
+
+# 每个 worker 同时处理的预测请求数
+ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', '4'))
+# 排队等待的请求数上限，超过时直接拒绝
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', '16'))
+# 最长排队时间（秒），同时受请求截止时间限制
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '2'))
+
+
+class Overloaded(Exception):
+    """请求未被接纳（队列已满或排队超时）"""
+
+
+class AdmissionController:
+    """
+    有界队列的准入控制
+
+    最多 max_concurrent 个请求同时执行，最多 max_queue 个请求排队；
+    队列已满时立即拒绝，排队超过 queue_timeout 或请求截止时间时拒绝，
+    避免数据库变慢时请求无限堆积、尾延迟失控。
+    """
+
+    def __init__(self, max_concurrent: int = ADMISSION_MAX_CONCURRENT, max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrent))
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        metrics.set_gauge("admission.waiting", lambda: self._waiting)
+        metrics.set_gauge("admission.running", lambda: self._running)
+
+    @contextmanager
+    def admit(self):
+        """获得执行名额后进入；未被接纳时抛出 Overloaded"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self._waiting >= self.max_queue:
+                    metrics.inc("admission.rejected.queue_full")
+                    raise Overloaded("排队请求已满")
+                self._waiting += 1
+            start = time.time()
+            try:
+                acquired = self._slots.acquire(timeout=deadline.bounded(self.queue_timeout))
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+            metrics.observe("admission.wait", time.time() - start)
+            if not acquired:
+                metrics.inc("admission.rejected.timeout")
+                raise Overloaded("排队超时")
+
+        with self._lock:
+            self._running += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._slots.release()
+
+
+# 全局准入控制实例（每个 worker 一份）
+admission = AdmissionController()
@@ -0,0 +1,96 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from app.core.metrics import metrics
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，调用被直接拒绝"""
+
+
+class CircuitBreaker:
+    """
+    连续失败熔断器
+
+    - closed: 正常放行，连续失败 failure_threshold 次后打开
+    - open: 直接拒绝调用（调用方改用内存快照等降级数据），由后台线程每 probe_interval 秒执行一次 probe，
+      probe 成功后关闭
+
+    探测线程在 allow() 中按需启动：pre-fork 部署时 master 中的线程不会被 worker 继承，
+    各 worker 在第一次被拒绝时自行启动探测。
+    """
+
+    def __init__(self, name: str, probe: Callable[[], bool], failure_threshold: int = 3,
+                 probe_interval: float = 5.0):
+        self.name = name
+        self.probe = probe
+        self.failure_threshold = max(1, failure_threshold)
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_thread: Optional[threading.Thread] = None
+        metrics.set_gauge(f"breaker.{name}.state", lambda: self.state)
+
+    @property
+    def state(self) -> str:
+        return 'open' if self._opened_at is not None else 'closed'
+
+    def allow(self) -> bool:
+        """是否放行本次调用；打开状态下确保探测线程在运行"""
+        if self._opened_at is None:
+            return True
+        self._ensure_probe()
+        metrics.inc(f"breaker.{self.name}.rejected")
+        return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self._opened_at is not None:
+                self._close()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._opened_at is None and self._failures >= self.failure_threshold:
+                self._opened_at = time.time()
+                metrics.inc(f"breaker.{self.name}.trips")
+                print(f"熔断器 {self.name} 打开：连续失败 {self._failures} 次")
+        if self._opened_at is not None:
+            self._ensure_probe()
+
+    def _close(self) -> None:
+        print(f"熔断器 {self.name} 关闭：已打开 {time.time() - self._opened_at:.1f}s")
+        self._opened_at = None
+        self._failures = 0
+
+    def _ensure_probe(self) -> None:
+        with self._lock:
+            if self._probe_thread is not None and self._probe_thread.is_alive():
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name=f"breaker-{self.name}", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self) -> None:
+        while self._opened_at is not None:
+            time.sleep(self.probe_interval)
+            try:
+                ok = self.probe()
+            except Exception as e:
+                print(f"熔断器 {self.name} 探测失败: {e}")
+                ok = False
+            if ok:
+                with self._lock:
+                    if self._opened_at is not None:
+                        self._close()
+                return
+
+    def status(self) -> dict:
+        opened_at = self._opened_at
+        return {
+            'state': self.state,
+            'failures': self._failures,
+            'open_seconds': round(time.time() - opened_at, 1) if opened_at is not None else None,
+        }
@@ -3,9 +3,18 @@ import pymysql
 from typing import Dict, Optional
 import time
 import logging
+from app.core import deadline
+from app.core.circuit_breaker import CircuitBreaker, CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
+# 连续失败多少次后熔断，熔断期间的探测间隔（秒）
+DB_BREAKER_FAILURES = int(os.getenv('DB_BREAKER_FAILURES', '3'))
+DB_BREAKER_PROBE_INTERVAL = float(os.getenv('DB_BREAKER_PROBE_INTERVAL', '5'))
+
+# 连接层面的错误（断线、超时、无法连接）：计入熔断器并重连重试；SQL 错误、约束冲突等直接抛出
+CONNECTION_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
 class DatabaseConfig:
     """数据库配置管理类"""
     
@@ -26,35 +35,63 @@ class DatabaseConfig:
         }
 
 class DatabaseConnection:
-    """数据库连接管理类"""
+    """
+    数据库连接管理类
+    给出 breaker 时，连接与查询的成败计入熔断器；熔断期间不再尝试连接，查询直接抛出 CircuitOpenError
+    """
     
-    def __init__(self, max_retries: int = 5, retry_delay: int = 5):
+    def __init__(self, max_retries: int = 5, retry_delay: int = 5, breaker: Optional[CircuitBreaker] = None):
         self.max_retries = max_retries
         self.retry_delay = retry_delay
+        self.breaker = breaker
         self.db = None
         self.cursor = None
+        # 本会话当前的 max_execution_time（毫秒，0 为不限制）
+        self._execution_time_ms = 0
         
-    def connect(self) -> bool:
-        """建立数据库连接，支持重试机制"""
+    def connect(self, record: bool = True) -> bool:
+        """
+        建立数据库连接，支持重试机制
+        在请求中调用时，连接超时与重试等待不超过请求剩余时间，剩余时间不足时不再重试
+        record 为 False 时连接的成败不计入熔断器（查询失败后的重连，由查询本身计一次）
+        """
         config = DatabaseConfig.get_db_config()
         
         for attempt in range(self.max_retries):
+            if deadline.expired():
+                logger.error("请求已超过截止时间，放弃连接数据库")
+                break
+            if self.breaker is not None and not self.breaker.allow():
+                logger.error("数据库熔断中，放弃连接，等待后台探测恢复")
+                break
             try:
                 logger.info(f"尝试连接数据库 (第 {attempt + 1} 次): {config['host']}:{config['port']}")
                 
-                self.db = pymysql.connect(**config)
+                self.db = pymysql.connect(**{**config, 'connect_timeout': deadline.bounded(config['connect_timeout'])})
                 self.cursor = self.db.cursor()
+                self._execution_time_ms = 0
                 
                 # 测试连接
                 self.cursor.execute("SELECT 1")
                 self.cursor.fetchone()
                 
                 logger.info("数据库连接成功")
+                if record:
+                    self._record(True)
                 return True
                 
             except Exception as e:
                 logger.error(f"数据库连接失败 (第 {attempt + 1} 次): {e}")
+                if record:
+                    self._record(False)
                 
+                if self.breaker is not None and self.breaker.state == 'open':
+                    logger.error("数据库熔断中，不再重试连接")
+                    break
+                left = deadline.remaining()
+                if left is not None and left < self.retry_delay:
+                    logger.error("请求剩余时间不足以等待重试，放弃连接数据库")
+                    break
                 if attempt < self.max_retries - 1:
                     logger.info(f"等待 {self.retry_delay} 秒后重试...")
                     time.sleep(self.retry_delay)
@@ -67,16 +104,16 @@ class DatabaseConnection:
         """检查数据库连接是否有效"""
         try:
             if self.db and self.cursor:
-                self.cursor.execute("SELECT 1")
+                self._execute("SELECT 1")
                 return True
-        except:
+        except Exception:
             pass
         return False
     
-    def reconnect(self) -> bool:
+    def reconnect(self, record: bool = True) -> bool:
         """重新连接数据库"""
         self.close()
-        return self.connect()
+        return self.connect(record)
     
     def close(self):
         """关闭数据库连接"""
@@ -92,22 +129,64 @@ class DatabaseConnection:
             self.db = None
     
     def execute_with_retry(self, sql: str, params=None):
-        """执行SQL语句，支持连接重试"""
+        """
+        执行SQL语句，连接层面的错误重连后重试一次
+        每次调用最多计入熔断器一次失败；SQL 本身的错误（表不存在、约束冲突等）不计入熔断、不重试，直接抛出
+        在请求中调用时，已超过截止时间则抛出 DeadlineExceeded，查询执行时间不超过请求剩余时间
+        """
+        deadline.check("db")
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenError("数据库熔断中")
         if not self.is_connected():
             if not self.reconnect():
                 raise Exception("无法建立数据库连接")
         
         try:
-            self.cursor.execute(sql, params)
-            return self.cursor.fetchall()
-        except Exception as e:
+            rows = self._execute(sql, params)
+        except CONNECTION_ERRORS as e:
             logger.error(f"SQL执行失败: {e}")
-            # 尝试重新连接一次
-            if self.reconnect():
-                self.cursor.execute(sql, params)
-                return self.cursor.fetchall()
-            else:
+            self._record(False)
+            deadline.check("db")
+            # 尝试重新连接一次（熔断后 connect 不再尝试）
+            if not self.reconnect(record=False):
                 raise e
+            rows = self._execute(sql, params)
+        self._record(True)
+        return rows
+
+    def _record(self, ok: bool) -> None:
+        if self.breaker is not None:
+            if ok:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+    def _execute(self, sql: str, params=None):
+        self._bound_execution_time()
+        self.cursor.execute(sql, params)
+        return self.cursor.fetchall()
+
+    def _bound_execution_time(self) -> None:
+        """
+        请求中把本会话的 max_execution_time（MySQL 5.7+，对 SELECT 生效）设为请求剩余时间，请求外恢复为不限制；
+        与上次设置的值相同时不再发送。连接的 read_timeout 仍作为网络读取的上限
+        """
+        left = deadline.remaining()
+        ms = 0 if left is None else max(1, int(left * 1000))
+        if ms == self._execution_time_ms:
+            return
+        self.cursor.execute("SET SESSION max_execution_time = %s", (ms,))
+        self._execution_time_ms = ms
+
+def _probe_database() -> bool:
+    """熔断期间的后台探测：用独立连接尝试一次连接"""
+    probe = DatabaseConnection(max_retries=1, retry_delay=0)
+    try:
+        return probe.connect()
+    finally:
+        probe.close()
+
 
-# 全局数据库连接实例
-db_connection = DatabaseConnection()
+# 全局数据库熔断器与连接实例
+db_breaker = CircuitBreaker("db", _probe_database, DB_BREAKER_FAILURES, DB_BREAKER_PROBE_INTERVAL)
+db_connection = DatabaseConnection(breaker=db_breaker)
@@ -0,0 +1,62 @@
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from app.core.metrics import metrics
+
+# /affect/predict 的默认请求截止时间（毫秒），0 表示不限制
+REQUEST_DEADLINE_MS = int(os.getenv('REQUEST_DEADLINE_MS', '5000'))
+
+# 当前请求的截止时刻（time.monotonic()），不在请求中时为 None
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """请求在 stage 阶段已超过截止时间"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"请求已超过截止时间（{stage}）")
+        self.stage = stage
+
+
+@contextmanager
+def scope(seconds: Optional[float]):
+    """
+    为当前上下文（一次请求）设置截止时间，seconds 为 None 或 <= 0 时不限制
+    嵌套时取更早的截止时间
+    """
+    deadline = time.monotonic() + seconds if seconds and seconds > 0 else None
+    outer = _deadline.get()
+    if outer is not None and (deadline is None or outer < deadline):
+        deadline = outer
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """当前请求剩余的秒数（可为负），不在请求中时为 None"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check(stage: str) -> None:
+    """已超过截止时间时记录指标并抛出 DeadlineExceeded，各阶段开始前调用"""
+    if expired():
+        metrics.inc(f"deadline.exceeded.{stage}")
+        raise DeadlineExceeded(stage)
+
+
+def bounded(timeout: float) -> float:
+    """把阶段超时（秒）限制在请求剩余时间以内"""
+    left = remaining()
+    return timeout if left is None else max(0.001, min(timeout, left))
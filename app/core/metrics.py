@@ -0,0 +1,81 @@
+import os
+import threading
+from typing import Any, Dict, Optional
+
+
+class MetricsRegistry:
+    """进程内指标注册表（计数器 / 仪表 / 耗时统计），多 worker 部署时每个进程各自一份"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, Any] = {}
+        self._timers: Dict[str, Dict[str, float]] = {}
+
+    def inc(self, name: str, value: float = 1):
+        """计数器累加"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: Any):
+        """设置仪表值；value 可以是无参函数，在读取指标时才求值"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float):
+        """记录一次耗时（秒），累计次数、总耗时和最大耗时"""
+        with self._lock:
+            timer = self._timers.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+            timer["count"] += 1
+            timer["sum"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """导出当前所有指标"""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            timers = {k: dict(v) for k, v in self._timers.items()}
+
+        for name, value in gauges.items():
+            if callable(value):
+                try:
+                    gauges[name] = value()
+                except Exception as e:
+                    gauges[name] = f"error: {e}"
+
+        return {"counters": counters, "gauges": gauges, "timers": timers}
+
+
+def process_memory(pid: Optional[int] = None) -> Dict[str, int]:
+    """
+    读取 /proc/<pid>/smaps_rollup，返回进程内存占用（KB）
+    rss: 常驻内存；pss: 按共享进程数分摊后的内存；shared/private: 共享页与私有页
+    pre-fork 部署时 worker 的 pss/private 越小，说明与 master 共享的模型和参考数据越多
+    """
+    pid = pid or os.getpid()
+    fields = {
+        "Rss": "rss_kb",
+        "Pss": "pss_kb",
+        "Shared_Clean": "shared_clean_kb",
+        "Shared_Dirty": "shared_dirty_kb",
+        "Private_Clean": "private_clean_kb",
+        "Private_Dirty": "private_dirty_kb",
+    }
+    usage = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in fields:
+                    usage[fields[key]] = int(rest.split()[0])
+    except OSError:
+        return {}
+
+    usage["shared_kb"] = usage.get("shared_clean_kb", 0) + usage.get("shared_dirty_kb", 0)
+    usage["private_kb"] = usage.get("private_clean_kb", 0) + usage.get("private_dirty_kb", 0)
+    return usage
+
+
+# 全局指标实例
+metrics = MetricsRegistry()
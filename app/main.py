@@ -2,8 +2,12 @@ from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from app.core.error_handler import register_exception_handlers
 from app.api.router import api_router
-from app.core.database import db_connection
+from app.core.database import db_connection, db_breaker
+from app.core.metrics import metrics, process_memory
+from app.services import algorithm
+from app.services.delay_ingest import delay_journal
 import logging
+import os
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -29,10 +33,23 @@ async def startup_event():
     except Exception as e:
         logger.error(f"数据库连接初始化异常: {e}")
 
+    # 启动参考数据增量同步
+    if algorithm.timetable_sync is not None:
+        algorithm.timetable_sync.start()
+
+    # 启动到站观测日志同步（各 worker 读取其它 worker 收到的到站报告）
+    if delay_journal is not None:
+        delay_journal.start()
+
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭时的清理"""
     logger.info("正在关闭 Railway Python API...")
+
+    if algorithm.timetable_sync is not None:
+        algorithm.timetable_sync.stop()
+    if delay_journal is not None:
+        delay_journal.stop()
     
     # 关闭数据库连接
     try:
@@ -45,6 +62,9 @@ async def shutdown_event():
 def health_check():
     """健康检查端点 - 用于 Docker healthcheck"""
     try:
+        # 数据库熔断期间不再访问数据库，预测请求使用内存时刻表快照
+        if db_breaker.state == 'open':
+            return {"status": "degraded", "database": "circuit_open", "breaker": db_breaker.status()}
         # 检查数据库连接
         if db_connection.is_connected():
             return {"status": "healthy", "database": "connected"}
@@ -56,4 +76,9 @@ def health_check():
 
 @app.get("/ping")
 def ping():
-    return {"code": 200, "msg": "pong", "data": None} 
\ No newline at end of file
+    return {"code": 200, "msg": "pong", "data": None}
+
+@app.get("/metrics")
+def get_metrics():
+    """当前进程的内存占用与运行指标（多 worker 部署时由处理该请求的 worker 返回）"""
+    return {"pid": os.getpid(), "memory": process_memory(), **metrics.snapshot()}
@@ -115,6 +115,7 @@ class TrainStatus(IntEnum):
     DELAYED = 1
     CANCELLED = 2
     REROUTED = 3
+    EARLY = 4
 
 # 列车表信息
 class TrainTableItem(BaseModel):
@@ -164,6 +165,7 @@ class PredictResponse(BaseModel):
     statistics: Statistics  # 统计信息
     train_table: List[TrainTableItem]  # 列车表
     affect_graph: AffectGraph  # 影响图
+    model_tier: Optional[str] = None  # 主要列车预测的来源：forecast / deeptte / lite / heuristic
     
 # 预测请求模型
 class PredictRequest(BaseModel):
@@ -186,3 +188,15 @@ class TrainDelayRequest(BaseModel):
     temperature: List[Union[int, float, str]]
     wind: List[Union[int, float, str]]
 
+
+
+# 实时到站报告
+class ArrivalReport(BaseModel):
+    train_id: str  # 车次
+    station: str  # 到达站
+    actual_arrival: datetime  # 实际到站时间
+    scheduled_arrival: Optional[datetime] = None  # 计划到站时间，缺省时从时刻表查找
+
+
+class DelayReportRequest(BaseModel):
+    reports: List[ArrivalReport]
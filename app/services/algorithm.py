@@ -1,33 +1,26 @@
-import torch
+import math
 import os
-import json
-import inspect
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
-from app.services.train_delay import utils
-from app.services.train_delay.data_loader import collate_fn
-from app.services.train_delay import models
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from app.services.data_input_utils import DataInputUtils
+from app.services.feature_builder import BatchFeatureBuilder
+from app.services.timetable_sync import TimetableSync
+from app.services import timetable_queries
 from app.core.database import db_connection, DatabaseConfig
+from app.core.metrics import metrics
+from app.core import deadline
 
 from app.models.predict import (
-    PredictRequest, PredictResponse, Statistics, TrainTableItem,
-    TrainStatus, TrainDelayRequest, AffectGraph, AffectAddress,
-    AffectPoint, LineSegment, LineTrainInfo, TrainDirection,
-    EventLocationType
+    PredictRequest, PredictResponse, TrainStatus, TrainDirection, EventLocationType
 )
 
-# 晚点预测模型加载
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'train_delay', 'config_update.json')
-WEIGHT_PATH = os.path.join(os.path.dirname(__file__), 'train_delay', 'saved_weights', 'run_log_GPU_2025-06-26_222529.890974_update1003')
-config = json.load(open(CONFIG_PATH, 'r'))
-model_init_args = inspect.getfullargspec(models.DeepTTE_nextstop.Net.__init__).args
-if 'self' in model_init_args:
-    model_init_args.remove('self')
-filtered_config = {k: v for k, v in config.items() if k in model_init_args}
-model = models.DeepTTE_nextstop.Net(**filtered_config)
-model.load_state_dict(torch.load(WEIGHT_PATH, map_location='cpu'))
-model.eval()
+# 晚点预测模型：复用 predict_delay_api 的模型注册表，避免每个进程持有两份权重
+from app.services.train_delay.predict_delay_api import model_registry, predict_delay
+from app.services.forecast_store import forecast_store
+from app.services.delay_ingest import delay_buffer
+from app.services.shadow_serving import OnlineComparison, PredictionLog, ShadowRunner, PREDICTION_LOG_DIR
+from app.services.model_tiers import lite_model, tier_controller
 
 # 初始化数据输入工具
 print("初始化数据库连接...")
@@ -45,79 +38,54 @@ except Exception as e:
     print(f"数据输入工具初始化失败: {e}")
     data_input_utils = None
 
-def _prepare_input_for_model(input_data):
-    if isinstance(input_data, dict):
-        batch = [input_data]
-    else:
-        batch = input_data
-    attr, traj = collate_fn(batch)
-    device = next(model.parameters()).device
-    for k, v in attr.items():
-        attr[k] = utils.to_var(v)
-        if hasattr(attr[k], 'to'):
-            attr[k] = attr[k].to(device)
-    for k, v in traj.items():
-        traj[k] = utils.to_var(v)
-        if hasattr(traj[k], 'to'):
-            traj[k] = traj[k].to(device)
-    return attr, traj
-
-def _convert_to_model_format(request_data):
-    if isinstance(request_data, dict) and 'args' in request_data:
-        # PredictRequest 格式：包含 args
-        if data_input_utils is not None:
-            try:
-                predict_request = PredictRequest(**request_data)
-                return data_input_utils.convert_predict_request_to_model_format(predict_request)
-            except Exception as e:
-                print(f"转换 PredictRequest 失败: {e}")
-                return _get_default_model_format()
-        else:
-            print("数据输入工具未初始化，使用默认格式")
-            return _get_default_model_format()
-    elif isinstance(request_data, dict) and 'historical_data' in request_data:
-        # 新格式：包含历史数据和目标站点
-        print("检测到新格式输入，使用数据转换器")
-        if data_input_utils is not None:
-            return data_input_utils.convert_to_model_format(request_data)
-        else:
-            print("数据输入工具未初始化，使用默认格式")
-            return _get_default_model_format()
-    else:
-        # 原有格式：直接使用
-        return request_data
+# 级联列车模型输入的批量构造
+feature_builder = BatchFeatureBuilder(data_input_utils) if data_input_utils is not None else None
 
-def _get_default_model_format():
-    return {
-        "time_gap": [0.0, 0.0, -1.0, -1.0],
-        "dist": 138.0,
-        "lats": [34.44619, 34.660505, 34.772197, 34.839294],
-        "lngs": [115.658058, 115.180599, 114.824453, 114.261521],
-        "driverID": 1262,
-        "weekID": 0,
-        "states": [1.0, 1.0, 1.0, 1.0],
-        "timeID": 838,
-        "time": -1.0,
-        "dateID": 340,
-        "dist_gap": [0.0, 50.0, 35.0, 53.0],
-        "weather": [22, 22, 1, 1],
-        "temperature": [9, 10, 8, 8],
-        "wind": [24, 24, 15, 15]
-    }
+# 参考数据增量同步（TIMETABLE_SYNC_INTERVAL 秒，0 表示关闭），由应用启动事件在各 worker 中启动
+TIMETABLE_SYNC_INTERVAL = float(os.getenv('TIMETABLE_SYNC_INTERVAL', '60'))
+timetable_sync = None
+if data_input_utils is not None and TIMETABLE_SYNC_INTERVAL > 0:
+    timetable_sync = TimetableSync(data_input_utils, interval=TIMETABLE_SYNC_INTERVAL)
+
+def _evict_terminated_train(train_id, service_date, station, delay, observed_at):
+    """车次到达当日终点站后移除其编码器状态（当前模型版本的状态缓存）"""
+    state_cache = model_registry.active.state_cache
+    if state_cache is None or data_input_utils is None:
+        return
+    if station == data_input_utils.historical_data.terminal_station(train_id, service_date):
+        state_cache.evict((train_id, service_date))
+
+delay_buffer.subscribe(_evict_terminated_train)
+
+# 配置了影子模型或 A/B 版本时，实时推理的每个批次在后台交给其它版本对比，到站报告到达后在线计算误差
+shadow_comparison = None
+shadow_runner = None
+if model_registry.shadows or model_registry.ab_version is not None:
+    shadow_comparison = OnlineComparison()
+    delay_buffer.subscribe(shadow_comparison.observe)
+    shadow_runner = ShadowRunner(model_registry, shadow_comparison, PredictionLog(PREDICTION_LOG_DIR))
+
+def _query_day_schedule(train_no: str, date_str: str) -> List[tuple]:
+    """
+    查询指定列车在指定日期的站点序列 [(站点, 出发时间)]
+    数据库不可用（熔断、超时或查询失败）时使用内存时刻表快照
+    """
+    try:
+        return db_connection.execute_with_retry(timetable_queries.SCHEDULE_SQL,
+                                                timetable_queries.schedule_params(train_no, date_str))
+    except Exception as e:
+        if data_input_utils is None:
+            raise
+        print(f"查询时刻表失败，使用内存快照: {e}")
+        metrics.inc("timetable.snapshot_reads")
+        return data_input_utils.historical_data.day_schedule(train_no, datetime.strptime(date_str, "%Y-%m-%d").date())
 
 def _get_next_station_from_schedule(train_no: str, date_str: str, current_station: str) -> str:
     """
     从时刻表获取指定列车的下一站
     """
     try:
-        # 查询指定列车在指定日期的站点序列
-        sql = """
-            SELECT station, departure_time 
-            FROM test3 
-            WHERE train_ID = %s AND DATE(departure_time) = %s
-            ORDER BY departure_time
-        """
-        stations = db_connection.execute_with_retry(sql, (train_no, date_str))
+        stations = _query_day_schedule(train_no, date_str)
         
         # 找到当前站点的位置
         current_index = -1
@@ -144,15 +112,7 @@ def _get_affected_station_range(train_no: str, date_str: str, incident_station:
     获取受影响站点范围
     """
     try:
-        # 查询指定列车在指定日期的站点序列
-        sql = """
-            SELECT station, departure_time 
-            FROM test3 
-            WHERE train_ID = %s AND DATE(departure_time) = %s
-            ORDER BY departure_time
-        """
-        
-        stations = db_connection.execute_with_retry(sql, (train_no, date_str))
+        stations = _query_day_schedule(train_no, date_str)
         
         # 找到事故站点的位置
         incident_index = -1
@@ -185,30 +145,25 @@ def _get_concurrent_trains_in_range(date_str: str, time_window_start: datetime,
     concurrent_trains = []
     
     try:
-        # 查询在指定时间窗口内到达或从事故站点出发的列车
-        sql = """
-            SELECT DISTINCT t1.train_ID, 
-                   t1.station as from_station, t1.departure_time as from_time,
-                   t2.station as to_station, t2.arrival_time as to_time
-            FROM test3 t1
-            JOIN test3 t2 ON t1.train_ID = t2.train_ID 
-            WHERE DATE(t1.departure_time) = %s
-              AND (t1.station = %s OR t2.station = %s)  -- 从事故站点出发或到达事故站点
-              AND t1.departure_time BETWEEN %s AND %s
-              AND t2.arrival_time BETWEEN %s AND %s
-              AND t1.departure_time < t2.arrival_time  -- 确保时间顺序正确
-              AND t1.station != t2.station  -- 确保不是同一站点
-            ORDER BY t1.departure_time
-        """
-        
         start_time_str = time_window_start.strftime("%Y-%m-%d %H:%M:%S")
         end_time_str = time_window_end.strftime("%Y-%m-%d %H:%M:%S")
         
         print(f"查询事故站点 {incident_station} 的并发列车")
         print(f"时间窗口: {start_time_str} - {end_time_str}")
         
-        rows = db_connection.execute_with_retry(sql, (date_str, incident_station, incident_station, 
-                                                    start_time_str, end_time_str, start_time_str, end_time_str))
+        try:
+            # 查询在指定时间窗口内到达或从事故站点出发的列车
+            rows = db_connection.execute_with_retry(
+                timetable_queries.CONCURRENT_SQL,
+                timetable_queries.concurrent_params(date_str, incident_station, time_window_start, time_window_end))
+        except Exception as e:
+            # 数据库不可用（熔断、超时或查询失败）时使用内存时刻表快照
+            if data_input_utils is None:
+                raise
+            print(f"查询并发列车失败，使用内存快照: {e}")
+            metrics.inc("timetable.snapshot_reads")
+            rows = data_input_utils.historical_data.trips_between(
+                datetime.strptime(date_str, "%Y-%m-%d").date(), time_window_start, time_window_end, incident_station)
         
         for row in rows:
             train_info = {
@@ -242,22 +197,28 @@ def _calculate_space_factor(train_info: Dict[str, Any], incident_station: str) -
     # 其他情况（理论上不应该出现，因为查询已经限制了只查询经过事故站点的列车）
     return 0.5
 
-def _calculate_affected_delay(primary_delay: int, time_factor: float, space_factor: float) -> int:
+def _calculate_affected_delay(primary_delay: int, time_factor: float, space_factor: float,
+                              model_delay: Optional[int] = None) -> int:
     """
     计算受影响列车的晚点时间
+    有该列车自身的模型预测时取预测值与传播影响中的较大者；模型不可用时用随机波动近似
     """
     base_affected_delay = primary_delay * time_factor * space_factor
     
     print(f" 基础影响计算: {primary_delay} * {time_factor:.2f} * {space_factor:.2f} = {base_affected_delay:.2f}")
     
-    # 添加随机性，模拟实际情况的不确定性
-    import random
-    random_factor = random.uniform(0.8, 1.2)  # 80%-120%的随机波动
-    
-    affected_delay = int(base_affected_delay * random_factor)
-    
-    print(f"    随机因子: {random_factor:.2f}")
-    print(f"    随机影响: {base_affected_delay:.2f} * {random_factor:.2f} = {base_affected_delay * random_factor:.2f}")
+    if model_delay is not None:
+        affected_delay = max(model_delay, int(base_affected_delay))
+        print(f"    模型预测: {model_delay}分钟, 传播影响: {base_affected_delay:.2f}分钟")
+    else:
+        # 添加随机性，模拟实际情况的不确定性
+        import random
+        random_factor = random.uniform(0.8, 1.2)  # 80%-120%的随机波动
+        
+        affected_delay = int(base_affected_delay * random_factor)
+        
+        print(f"    随机因子: {random_factor:.2f}")
+        print(f"    随机影响: {base_affected_delay:.2f} * {random_factor:.2f} = {base_affected_delay * random_factor:.2f}")
     
     # 确保晚点时间在合理范围内
     affected_delay = max(0, min(affected_delay, primary_delay + 5))
@@ -266,11 +227,82 @@ def _calculate_affected_delay(primary_delay: int, time_factor: float, space_fact
     
     return affected_delay
 
-def _get_affected_trains_from_schedule(request: PredictRequest, primary_raw_delay: int) -> List[Dict[str, Any]]:
+def _heuristic_primary_delay(model_input: Dict[str, Any]) -> int:
+    """模型不可用时的主要列车晚点估计：历史正晚点的均值，没有时取 15 分钟"""
+    positive_delays = [x for x in model_input.get('time_gap', []) if x > 0]
+    print(f"正数晚点数量: {len(positive_delays)}")
+    if positive_delays:
+        print(f"晚点范围: {min(positive_delays)} - {max(positive_delays)}分钟")
+        return int(round(sum(positive_delays) / len(positive_delays)))
+    return 15
+
+def _predict_delays(model_inputs: List[Dict[str, Any]], keys: Optional[List[tuple]] = None,
+                    version=None, targets: Optional[List[tuple]] = None) -> Tuple[Optional[List[Optional[int]]], str]:
+    """
+    对多条模型输入做一次批量前向，返回 (每条的预测晚点（分钟，取整）, 模型层级)
+    模型层级由 tier_controller 按负载选择：deeptte / lite（轻量基线模型）/ heuristic
+    给出 keys（每条输入的 (车次, 运行日期)）且开启状态缓存时，只对各车次新增的站点增量编码
+    version 为请求开始时取得的模型版本，缺省为注册表当前版本
+    给出 targets（每条输入的 (车次, 运行日期, 目标站点)）且开启影子对比时，预测结果交给后台对比
+    层级为 heuristic、请求已超过截止时间或模型推理失败时预测为 None，单条无法预测时该条为 None，
+    由调用方退回启发式估计
+    """
+    if deadline.expired():
+        metrics.inc("deadline.exceeded.model")
+        return None, 'heuristic'
+    tier = tier_controller.enter()
+    start = time.time()
+    try:
+        if tier == 'heuristic':
+            return None, tier
+        if tier == 'lite':
+            predictions = lite_model.predict(model_inputs)
+        else:
+            version = version or model_registry.active
+            if keys is not None and version.state_cache is not None:
+                try:
+                    predictions = version.state_cache.predict(keys, model_inputs)
+                except ValueError as e:
+                    print(f"增量编码不可用，使用完整前向: {e}")
+                    predictions = predict_delay(model_inputs, version)
+            else:
+                predictions = predict_delay(model_inputs, version)
+    except Exception as e:
+        metrics.inc("model.predict.errors")
+        print(f"晚点预测模型推理失败: {e}")
+        return None, 'heuristic'
+    finally:
+        tier_controller.exit(tier, time.time() - start)
+    metrics.observe("model.predict", time.time() - start)
+    metrics.inc("model.predict.rows", len(model_inputs))
+    if tier == 'deeptte' and shadow_runner is not None and targets is not None:
+        shadow_runner.submit(version, targets, model_inputs, predictions)
+    print(f"批量预测 {len(model_inputs)} 条（{tier}），耗时 {(time.time() - start) * 1000:.1f}ms")
+    return [int(round(p)) if math.isfinite(p) else None for p in predictions], tier
+
+def _lookup_forecast(train_no: str, service_date, pre_station: Optional[str], next_station: Optional[str],
+                     model_version: str) -> Optional[int]:
     """
-    基于时刻表数据获取受影响的列车列表
+    查询夜间预计算的区间晚点预测（只使用 model_version 版本的结果）
+    预计算假设无实时晚点观测，当天已有到站报告的车次返回 None，由调用方实时推理
+    """
+    if pre_station is None or next_station is None or delay_buffer.has_observations(train_no, service_date):
+        return None
+    delay = forecast_store.lookup(train_no, service_date, pre_station, next_station, model_version)
+    return None if delay is None else int(round(delay))
+
+def _get_affected_trains_from_schedule(request: PredictRequest, primary_input: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    基于时刻表数据获取受影响的列车列表（第一项为主要列车）
+    主要列车与窗口内全部并发列车的模型输入合为一个批次，每个请求只调用一次模型
     """
     affected_trains = []
+    primary_raw_delay = _heuristic_primary_delay(primary_input)
+    # 主要列车预测的来源：forecast（预计算）/ deeptte / lite / heuristic
+    primary_tier = 'heuristic'
+    # 整个请求使用同一个模型版本：热切换发生时，进行中的请求在旧版本上完成；
+    # 配置 A/B 时按主要列车车次稳定分流
+    version = model_registry.choose(request.args.train_id)
     
     try:
         # 从 PredictRequest 对象中获取基本信息
@@ -304,7 +336,7 @@ def _get_affected_trains_from_schedule(request: PredictRequest, primary_raw_dela
             time_window_end = datetime.strptime("2025-07-22 08:01:40", "%Y-%m-%d %H:%M:%S")
         
         print(f"\n=== 基于时刻表的连锁影响计算 ===")
-        print(f"主要列车: {primary_train_no}, 原始预测晚点/早到: {primary_raw_delay}分钟")
+        print(f"主要列车: {primary_train_no}")
         print(f"事故发生站点: {incident_station}")
         print(f"事故时间: {incident_time.strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"查询时间窗口: {time_window_start.strftime('%H:%M:%S')} - {time_window_end.strftime('%H:%M:%S')}")
@@ -323,6 +355,48 @@ def _get_affected_trains_from_schedule(request: PredictRequest, primary_raw_dela
             date_str, time_window_start, time_window_end, incident_station
         )
         
+        cascade_trains = [t for t in concurrent_trains if t['train_ID'] != primary_train_no]
+
+        # 主要列车与并发列车：优先使用夜间预计算结果，其余一次批量前向
+        # 只写了一个站点的区间事件没有目标站点，不查预计算结果，实时推理时目标站点取时刻表中的下一站
+        if args.event_location == EventLocationType.SECTION:
+            section = args.event_location_value.split(",")
+            primary_section = (section[0], section[1] if len(section) > 1 else None)
+        else:
+            primary_section = (None, None)
+        predictions = [_lookup_forecast(primary_train_no, incident_time.date(), *primary_section, version.name)]
+        predictions += [_lookup_forecast(t['train_ID'], t['from_time'].date(), t['from_station'], t['to_station'],
+                                         version.name)
+                        for t in cascade_trains]
+
+        live = [i for i, p in enumerate(predictions) if p is None]
+        if live:
+            model_inputs, keys, targets = [], [], []
+            if live[0] == 0:
+                model_inputs.append(primary_input)
+                keys.append((primary_train_no, incident_time.date()))
+                targets.append(keys[-1] + (primary_section[1] or next_station,))
+            cascade_live = [cascade_trains[i - 1] for i in live if i > 0]
+            # 已超过截止时间时不再为级联列车构造模型输入，其晚点按主要列车晚点估计
+            if cascade_live and deadline.expired():
+                metrics.inc("deadline.exceeded.cascade")
+                cascade_live = []
+            # 级联列车的模型输入一次批量构造
+            model_inputs += feature_builder.build(
+                [(t['train_ID'], t['from_station'], t['to_station'], t['from_time']) for t in cascade_live])
+            for train_info in cascade_live:
+                keys.append((train_info['train_ID'], train_info['from_time'].date()))
+                targets.append(keys[-1] + (train_info['to_station'],))
+            live_predictions, tier = _predict_delays(model_inputs, keys, version, targets)
+            if live_predictions is not None:
+                for i, p in zip(live, live_predictions):
+                    predictions[i] = p
+        print(f"预计算命中 {len(predictions) - len(live)} 条，实时推理 {len(live)} 条")
+        if predictions[0] is not None:
+            primary_raw_delay = predictions[0]
+            primary_tier = tier if live and live[0] == 0 else 'forecast'
+        print(f"主要列车原始预测晚点/早到: {primary_raw_delay}分钟")
+
         # 主要列车的晚点时间，用于连锁影响计算（早到不产生连锁影响）
         primary_delay_for_chain_effect = max(0, primary_raw_delay)
 
@@ -336,13 +410,11 @@ def _get_affected_trains_from_schedule(request: PredictRequest, primary_raw_dela
             'time_factor': 1.0,
             'space_factor': 1.0,
             'status': TrainStatus.DELAYED if primary_raw_delay >= 2 else (TrainStatus.EARLY if primary_raw_delay < 0 else TrainStatus.NORMAL),
+            'tier': primary_tier,
         })
         
         # 计算其他列车的影响
-        for train_info in concurrent_trains:
-            if train_info['train_ID'] == primary_train_no:
-                continue  
-            
+        for i, train_info in enumerate(cascade_trains, start=1):
             # 计算时间因子：越接近事故时间，影响越大
             train_time = train_info['from_time']  # 使用列车在事故区段的出发时间
             time_diff_minutes = abs((train_time - incident_time).total_seconds() / 60)
@@ -360,7 +432,9 @@ def _get_affected_trains_from_schedule(request: PredictRequest, primary_raw_dela
             space_factor = _calculate_space_factor(train_info, incident_station)
             
             # 计算受影响晚点 (传入的primary_delay_for_chain_effect已确保非负)
-            affected_delay = _calculate_affected_delay(primary_delay_for_chain_effect, time_factor, space_factor)
+            model_delay = predictions[i]
+            affected_delay = _calculate_affected_delay(primary_delay_for_chain_effect, time_factor, space_factor,
+                                                       model_delay)
             
             # 处理受影响晚点：确保不为负数 (因为连锁影响通常只导致晚点，不会导致早到)
             if affected_delay < 0:
@@ -411,21 +485,32 @@ def _get_affected_trains_from_schedule(request: PredictRequest, primary_raw_dela
             'time_factor': 1.0,
             'space_factor': 1.0,
             'status': TrainStatus.DELAYED if primary_raw_delay >= 2 else (TrainStatus.EARLY if primary_raw_delay < 0 else TrainStatus.NORMAL),
+            'tier': primary_tier,
         }]
     
     return affected_trains
 
-def _generate_affect_graph(primary_delay: int, affected_trains: List[Dict[str, Any]], incident_station: str) -> AffectGraph:
+def _iter_affect_graph(primary_delay: int, affected_trains: List[Dict[str, Any]], incident_station: str
+                       ) -> Iterator[Tuple[str, Any]]:
     """
-    根据晚点时长和受影响列车列表动态生成影响图数据 
+    根据晚点时长和受影响列车列表动态生成影响图数据，依次产出
+    ('address', AffectAddress), 每个站点的 ('point', AffectPoint), 每个线路段的 ('segment', (线路下标, LineSegment))
+    （均为 dict）；站点、线路段上的列车先按站点 / 区段建索引，不再逐段扫描全部列车
     """
     # 动态确定影响范围：基于实际受影响的站点
     affected_stations = set()
     
-    # 从受影响列车中收集所有相关站点
+    # 从受影响列车中收集所有相关站点，同时按站点、按区段（无序站点对）索引列车
+    trains_by_station: Dict[str, List[str]] = {}
+    trains_by_segment: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
     for train_info in affected_trains:
-        affected_stations.add(train_info['startStation'])
-        affected_stations.add(train_info['endStation'])
+        start_station, end_station = train_info['startStation'], train_info['endStation']
+        affected_stations.add(start_station)
+        affected_stations.add(end_station)
+        trains_by_station.setdefault(start_station, []).append(train_info['trainNo'])
+        if end_station != start_station:
+            trains_by_station.setdefault(end_station, []).append(train_info['trainNo'])
+            trains_by_segment.setdefault(tuple(sorted((start_station, end_station))), []).append(train_info)
     
     # 确保事故站点在列表中
     affected_stations.add(incident_station)
@@ -438,74 +523,45 @@ def _generate_affect_graph(primary_delay: int, affected_trains: List[Dict[str, A
     print(f"  受影响站点: {stations}")
     print(f"  主要列车晚点: {primary_delay}分钟")
     
-    # 生成站点列表
-    points = []
-    for station in stations:
-        # 收集该站点上受影响的列车
-        trains_at_station = []
-        for train_info in affected_trains:
-            if train_info['startStation'] == station or train_info['endStation'] == station:
-                trains_at_station.append(train_info['trainNo'])
-        
-        points.append(AffectPoint(
-            id=station,
-            name=station,
-            trains=list(set(trains_at_station))  # 去重
-        ))
-    
-    # 生成线路段信息（基于实际受影响的列车运行区段）
-    lines = []
-    
-    # 按线路分组：将相邻的站点连接成线段
-    if len(stations) >= 2:
-        # 创建线段列表
-        segments = []
-        for i in range(len(stations) - 1):
-            station1 = stations[i]
-            station2 = stations[i + 1]
-            
-            # 查找在该线段上运行的受影响列车
-            segment_trains = []
-            for train_info in affected_trains:
-                if (train_info['startStation'] == station1 and train_info['endStation'] == station2) or \
-                   (train_info['startStation'] == station2 and train_info['endStation'] == station1):
-                    direction = TrainDirection.UP if train_info['startStation'] == station1 else TrainDirection.DOWN
-                    segment_trains.append(LineTrainInfo(
-                        id=train_info['trainNo'],
-                        delay=str(train_info['delay']),
-                        derection=direction
-                    ))
-            
-            segments.append(LineSegment(
-                pointA=station1,
-                pointB=station2,
-                trains=segment_trains
-            ))
-        
-        if segments:
-            lines.append(segments)
-    
     # 生成地址信息（根据影响范围）
     if stations:
-        address = AffectAddress(
-            pointA=stations[0],
-            pointB=stations[-1]
-        )
+        address = {'pointA': stations[0], 'pointB': stations[-1]}
     else:
-        address = AffectAddress(
-            pointA=incident_station,
-            pointB=incident_station
-        )
+        address = {'pointA': incident_station, 'pointB': incident_station}
     
-    print(f"生成影响图: 影响范围: {address.pointA} -> {address.pointB}")
+    print(f"生成影响图: 影响范围: {address['pointA']} -> {address['pointB']}")
     print(f"显示站点: {stations}")
     print(f"受影响列车数: {len(affected_trains)}")
+    yield 'address', address
+    
+    # 生成站点列表
+    for station in stations:
+        yield 'point', {
+            'id': station,
+            'name': station,
+            'trains': list(set(trains_by_station.get(station, [])))  # 去重
+        }
     
-    return AffectGraph(
-        address=address,
-        points=points,
-        lines=lines
-    )
+    # 生成线路段信息（基于实际受影响的列车运行区段）：相邻的站点连接成一条线路上的线段
+    for i in range(len(stations) - 1):
+        station1 = stations[i]
+        station2 = stations[i + 1]
+        
+        # 在该线段上运行的受影响列车
+        segment_trains = []
+        for train_info in trains_by_segment.get((station1, station2), []):
+            direction = TrainDirection.UP if train_info['startStation'] == station1 else TrainDirection.DOWN
+            segment_trains.append({
+                'id': train_info['trainNo'],
+                'delay': str(train_info['delay']),
+                'derection': direction.value
+            })
+        
+        yield 'segment', (0, {
+            'pointA': station1,
+            'pointB': station2,
+            'trains': segment_trains
+        })
 
 def add(a: float, b: float) -> float:
     return a + b 
@@ -515,82 +571,59 @@ def get_predict_result(request: PredictRequest) -> PredictResponse:
     统一的后果预估/晚点预测算法入口
     组合输出：statistics和train_table用晚点预测，timeEstimateGraph用后果预估，trainStationGraph用影响图
     """
+    return PredictResponse.model_validate(compute_predict_result(request))
+
+
+def compute_predict_result(request) -> Dict[str, Any]:
+    """
+    get_predict_result 的计算部分，返回 PredictResponse 结构的纯 dict（枚举为其值）
+    批量接口直接序列化该 dict，不为每趟列车、每个线路段创建 Pydantic 模型；
+    request 只需提供 request.args 上的 train_id / event_time / event_location / event_location_value
+    """
+    prepared = prepare_predict_result(request)
+    result = {'statistics': None, 'train_table': [], 'affect_graph': {'address': None, 'points': [], 'lines': []},
+              'model_tier': prepared['model_tier']}
+    graph = result['affect_graph']
+    for kind, payload in iter_predict_result(prepared):
+        if kind == 'statistics':
+            result['statistics'] = payload
+        elif kind == 'train':
+            result['train_table'].append(payload)
+        elif kind == 'address':
+            graph['address'] = payload
+        elif kind == 'point':
+            graph['points'].append(payload)
+        elif kind == 'segment':
+            line, segment = payload
+            while len(graph['lines']) <= line:
+                graph['lines'].append([])
+            graph['lines'][line].append(segment)
+    return result
+
+
+def prepare_predict_result(request) -> Dict[str, Any]:
+    """
+    执行晚点预测（查库、模型推理、级联），返回 iter_predict_result 的输入：
+    affected_trains（首项为主要列车）、primary_delay、model_tier、incident_station
+    预测异常时返回空结果（与原默认结果相同）
+    """
     print("收到请求：", request)
     
     # ========== 晚点预测算法执行 ==========
-    delay_statistics = None
-    delay_train_table = None
-    affect_graph = None
     try:
         print("执行晚点预测算法")
         
-        # # 晚点预测的默认参数
-        # default_delay_params = {
-        #     "time_gap": [0.0, 0.0, -1.0, -1.0],
-        #     "dist": 138.0,
-        #     "lats": [34.44619, 34.660505, 34.772197, 34.839294],
-        #     "lngs": [115.658058, 115.180599, 114.824453, 114.261521],
-        #     "driverID": 1262,
-        #     "weekID": 0,
-        #     "states": [1.0, 1.0, 1.0, 1.0],
-        #     "timeID": 838,
-        #     "time": -1.0,
-        #     "dateID": 340,
-        #     "dist_gap": [0.0, 50.0, 35.0, 53.0],
-        #     "weather": [22, 22, 1, 1],
-        #     "temperature": [9, 10, 8, 8],
-        #     "wind": [24, 24, 15, 15]
-        # }
-        
-     
-        # train_delay_params = _convert_to_model_format(request)
         train_delay_params = data_input_utils.convert_predict_request_to_model_format(request)
-        req = TrainDelayRequest(**train_delay_params)
         
         # 添加调试信息
         print(f"\n=== 晚点预测模型输入参数 ===")
-        print(f"time_gap: {train_delay_params.get('time_gap', [])}")
-        print(f"dist: {train_delay_params.get('dist', 0)}")
-        print(f"lats: {train_delay_params.get('lats', [])}")
-        print(f"lngs: {train_delay_params.get('lngs', [])}")
-        print(f"dist_gap: {train_delay_params.get('dist_gap', [])}")
-        print(f"weather: {train_delay_params.get('weather', [])}")
-        print(f"temperature: {train_delay_params.get('temperature', [])}")
-        print(f"wind: {train_delay_params.get('wind', [])}")
-        print(f"driverID: {train_delay_params.get('driverID', 0)}")
-        print(f"weekID: {train_delay_params.get('weekID', 0)}")
-        print(f"timeID: {train_delay_params.get('timeID', 0)}")
-        print(f"dateID: {train_delay_params.get('dateID', 0)}")
-        print(f"states: {train_delay_params.get('states', [])}")
-        
-        # 检查输入参数是否合理
-        time_gap = train_delay_params.get('time_gap', [])
-        if not time_gap or all(x <= 0 for x in time_gap):
-            print("警告: time_gap 数组无效，使用默认值")
-            # 使用默认的合理晚点数据
-            train_delay_params['time_gap'] = [0, 5, 12, 8, 15, 0]
-            req = TrainDelayRequest(**train_delay_params)
-            print(f"使用默认 time_gap: {train_delay_params['time_gap']}")
-        
-        # 打印完整的模型输入参数
-        print(f"\n=== 完整的模型输入参数 ===")
         for key, value in train_delay_params.items():
             print(f"{key}: {value}")
         
-        dist_gap = train_delay_params.get('dist_gap', [])
-        
-        # 检查是否有合理的晚点数据
-        positive_delays = [x for x in time_gap if x > 0]
-        print(f"正数晚点数量: {len(positive_delays)}")
-        if positive_delays:
-            print(f"晚点范围: {min(positive_delays)} - {max(positive_delays)}分钟")
-        
-        # 根据输入数据特征进行预测
-        if positive_delays:
-            avg_delay = sum(positive_delays) / len(positive_delays)
-            primary_predicted_delay = int(round(avg_delay))
-        else:
-            primary_predicted_delay = 15
+        # 主要列车与受影响的其他列车一起批量预测（基于时刻表数据）
+        affected_trains = _get_affected_trains_from_schedule(request, train_delay_params)
+        primary_predicted_delay = affected_trains[0]['delay']
+        model_tier = affected_trains[0].get('tier')
         
         print(f"\n=== 晚点预测结果 ===")
         print(f"预测晚点时间: {primary_predicted_delay}分钟")
@@ -603,62 +636,54 @@ def get_predict_result(request: PredictRequest) -> PredictResponse:
         else:
             print(f"预测晚点 {primary_predicted_delay} 分钟")
         
-        # 获取受影响的其他列车信息（基于时刻表数据）
-        affected_trains = _get_affected_trains_from_schedule(request, primary_predicted_delay)
-        
-        # 计算统计信息
-        # 统计信息中的impactDuration应反映主要列车的实际晚点（非负）
-        impact_duration_for_stats = max(0, primary_predicted_delay) 
-        total_affected_trains = len(affected_trains)
-        high_affected = sum(1 for train in affected_trains if train['delay'] >= 10)
-        middle_affected = sum(1 for train in affected_trains if 5 <= train['delay'] < 10)
-        low_affected = sum(1 for train in affected_trains if 2 <= train['delay'] < 5)
-        
-        # 晚点预测的统计信息
-        delay_statistics = Statistics(
-            impact_duration=impact_duration_for_stats,
-            affect_trains_num=total_affected_trains,
-            high_affect_trains_num=high_affected,
-            middle_affect_trains_num=middle_affected,
-            low_affect_trains_num=low_affected
-        )
-        
-        # 晚点预测的列车表
-        delay_train_table = []
-        for train_info in affected_trains:
-            delay_train_table.append(TrainTableItem(
-                train_id=train_info['trainNo'],
-                start_station=train_info['startStation'],
-                end_station=train_info['endStation'],
-                next_station=train_info['nextStation'],
-                status=train_info['status'],
-                affect_time=train_info['delay'],
-            ))
-        
-        # 生成动态影响图
-        # 从 PredictRequest 对象获取事故站点
+        # 从请求获取事故站点
         if request.args.event_location == EventLocationType.SECTION:
             incident_station = request.args.event_location_value.split(",")[0]
         else:
             incident_station = request.args.event_location_value
-        affect_graph = _generate_affect_graph(primary_predicted_delay, affected_trains, incident_station)
         
         print(f"晚点预测结果：primary_predicted_delay={primary_predicted_delay}")
     except Exception as e:
         print(f"晚点预测算法异常：{e}")
         # 异常时使用默认结果
-        delay_statistics = Statistics(
-            impact_duration=0,
-            affect_trains_num=0,
-            high_affect_trains_num=0,
-            middle_affect_trains_num=0,
-            low_affect_trains_num=0
-        )
-        delay_train_table = []
-        affect_graph = _generate_affect_graph(0, [], '天津南')
+        affected_trains, primary_predicted_delay, model_tier, incident_station = [], 0, None, '天津南'
+    
+    return {
+        'affected_trains': affected_trains,
+        'primary_delay': primary_predicted_delay,
+        'model_tier': model_tier,
+        'incident_station': incident_station,
+    }
+
+
+def iter_predict_result(prepared: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """
+    按输出顺序逐项产出预测结果（均为 dict，不创建 Pydantic 模型）：
+    ('statistics', Statistics)、每趟列车的 ('train', TrainTableItem)，然后是影响图各项（见 _iter_affect_graph）
+    流式接口逐项编码发送，compute_predict_result 把各项组装成 PredictResponse 结构
+    """
+    affected_trains = prepared['affected_trains']
+    primary_delay = prepared['primary_delay']
+    
+    # 统计信息中的impactDuration应反映主要列车的实际晚点（非负）
+    yield 'statistics', {
+        'impact_duration': max(0, primary_delay),
+        'affect_trains_num': len(affected_trains),
+        'high_affect_trains_num': sum(1 for train in affected_trains if train['delay'] >= 10),
+        'middle_affect_trains_num': sum(1 for train in affected_trains if 5 <= train['delay'] < 10),
+        'low_affect_trains_num': sum(1 for train in affected_trains if 2 <= train['delay'] < 5)
+    }
+    
+    # 晚点预测的列车表
+    for train_info in affected_trains:
+        yield 'train', {
+            'train_id': train_info['trainNo'],
+            'start_station': train_info['startStation'],
+            'end_station': train_info['endStation'],
+            'next_station': train_info['nextStation'],
+            'status': int(train_info['status']),
+            'affect_time': train_info['delay'],
+        }
     
-    return PredictResponse(
-        statistics=delay_statistics,
-        train_table=delay_train_table,
-        affect_graph=affect_graph
-    )
\ No newline at end of file
+    # 动态影响图
+    yield from _iter_affect_graph(primary_delay, affected_trains, prepared['incident_station'])
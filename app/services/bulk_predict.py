@@ -0,0 +1,172 @@
+"""
+批量 / 流式预测的精简路径
+
+请求体一次解析（ujson）并校验成带 __slots__ 的 LeanRequest / LeanArgs，必填字段按 Args 的类型逐个校验，
+其余可选字段（风速、降雪量、异物大小等）不校验、不创建 Pydantic 模型；
+结果由 algorithm.compute_predict_result / iter_predict_result 直接产出纯 dict，不为每趟列车、每个线路段创建模型实例，
+批量接口整体用 ujson 序列化一次，流式接口逐项编码为 NDJSON 分块发送。单条接口 /affect/predict 的行为不变。
+"""
+import os
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import ujson
+from pydantic import TypeAdapter, ValidationError
+
+from app.core import deadline
+from app.core.metrics import metrics
+from app.models.predict import Args
+
+# 一个批量请求最多包含的预测数
+BULK_MAX_REQUESTS = int(os.getenv('BULK_MAX_REQUESTS', '256'))
+# 一个批量请求整批的截止时间（毫秒，含排队时间），默认与单条请求相同，0 表示不限制
+BULK_DEADLINE_MS = int(os.getenv('BULK_DEADLINE_MS', str(deadline.REQUEST_DEADLINE_MS)))
+# 流式响应每个分块包含的 NDJSON 行数
+STREAM_CHUNK_RECORDS = int(os.getenv('STREAM_CHUNK_RECORDS', '64'))
+
+# Args 的必填字段（Pydantic v2 中没有默认值的 Optional 字段也是必填），逐字段用与 Args 相同的类型校验，
+# 转换规则（枚举、时间格式、数字字符串等）与 /affect/predict 完全一致
+_REQUIRED = {name: TypeAdapter(field.annotation)
+             for name, field in Args.model_fields.items() if field.is_required()}
+
+
+class LeanArgs:
+    """Args 的精简版本：必填字段为同名属性，extra 为未校验的可选字段"""
+    __slots__ = tuple(_REQUIRED) + ('extra',)
+
+    def __init__(self, values: Dict[str, Any], extra: Dict[str, Any]):
+        for name, value in values.items():
+            setattr(self, name, value)
+        self.extra = extra
+
+
+class LeanRequest:
+    """PredictRequest 的精简版本，algorithm.compute_predict_result 只访问 request.args"""
+    __slots__ = ('args',)
+
+    def __init__(self, args: LeanArgs):
+        self.args = args
+
+
+def parse_args(raw: Any) -> LeanArgs:
+    """
+    校验一条请求的 args：必填字段与 Args 的约束相同（缺少或类型不符时抛出 ValueError）；
+    可选字段（风速、降雪量等，算法未使用）不校验，原样放在 extra 中，这一点比 /affect/predict 宽松
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("args 应为对象")
+    values = {}
+    for name, adapter in _REQUIRED.items():
+        if name not in raw:
+            raise ValueError(f"缺少字段 {name}")
+        try:
+            values[name] = adapter.validate_python(raw[name])
+        except ValidationError as e:
+            raise ValueError(f"{name} 取值无效: {raw[name]!r}（{e.errors()[0]['msg']}）") from None
+    return LeanArgs(values, {k: v for k, v in raw.items() if k not in _REQUIRED})
+
+
+def parse_bulk(body: bytes, max_requests: int = BULK_MAX_REQUESTS) -> List[LeanRequest]:
+    """
+    解析批量请求体：PredictRequest 的数组（[{"args": {...}}, ...]），或 {"requests": [...]}
+    校验失败时抛出 ValueError，消息中带出错条目的下标
+    """
+    try:
+        payload = ujson.loads(body)
+    except ValueError as e:
+        raise ValueError(f"请求体不是有效的 JSON: {e}") from None
+    if isinstance(payload, dict):
+        payload = payload.get('requests')
+    if not isinstance(payload, list):
+        raise ValueError("请求体应为数组或 {\"requests\": [...]}")
+    if len(payload) > max_requests:
+        raise ValueError(f"单次最多 {max_requests} 条，实际 {len(payload)} 条")
+
+    requests = []
+    for i, item in enumerate(payload):
+        try:
+            requests.append(_parse_item(item))
+        except ValueError as e:
+            raise ValueError(f"第 {i} 条: {e}") from None
+    return requests
+
+
+def parse_request(body: bytes) -> LeanRequest:
+    """解析单条请求体（与 /affect/predict 相同的 {"args": {...}}），校验失败时抛出 ValueError"""
+    try:
+        payload = ujson.loads(body)
+    except ValueError as e:
+        raise ValueError(f"请求体不是有效的 JSON: {e}") from None
+    return _parse_item(payload)
+
+
+def _parse_item(item: Any) -> LeanRequest:
+    if not isinstance(item, dict) or 'args' not in item:
+        raise ValueError("缺少 args")
+    return LeanRequest(parse_args(item['args']))
+
+
+def run_bulk(requests: Sequence[LeanRequest], compute: Callable[[LeanRequest], Dict[str, Any]]
+             ) -> List[Dict[str, Any]]:
+    """
+    逐条计算，整批共用调用方设置的截止时间（endpoint 中为 BULK_DEADLINE_MS），占用准入名额的时间不超过它；
+    截止时间已过时剩余各条不再计算（code 503），单条失败只影响该条（code 500），不影响同批其他请求
+    """
+    results = []
+    for request in requests:
+        if deadline.expired():
+            metrics.inc("bulk.timeouts")
+            results.append({'code': 503, 'msg': '批量请求已超过截止时间，该条未计算', 'data': None})
+            continue
+        try:
+            results.append({'code': 200, 'msg': '请求成功', 'data': compute(request)})
+        except Exception as e:
+            metrics.inc("bulk.errors")
+            print(f"批量预测第 {len(results)} 条失败: {e}")
+            results.append({'code': 500, 'msg': str(e), 'data': None})
+    metrics.inc("bulk.requests", len(requests))
+    return results
+
+
+def encode_response(results: Sequence[Dict[str, Any]]) -> str:
+    """批量结果按 ResponseModel 的结构一次序列化，data 为各条的 {code, msg, data}"""
+    return ujson.dumps({'code': 200, 'msg': '请求成功', 'data': results}, ensure_ascii=False)
+
+
+def iter_ndjson(records: Iterable[Tuple[str, Any]], model_tier: Optional[str],
+                chunk_records: int = STREAM_CHUNK_RECORDS) -> Iterator[bytes]:
+    """
+    把 algorithm.iter_predict_result 产出的各项逐行编码为 NDJSON，每 chunk_records 行一个分块：
+
+        {"type": "statistics", "data": {...}, "model_tier": "deeptte"}
+        {"type": "train", "data": {...}}                  每趟受影响列车一行
+        {"type": "address", "data": {...}}
+        {"type": "point", "data": {...}}                  每个站点一行
+        {"type": "segment", "line": 0, "data": {...}}     每个线路段一行
+        {"type": "end", "data": {"trains": n, "points": n, "segments": n}}
+
+    中途出错时以 {"type": "error", "msg": ...} 结束，客户端没有收到 end 行即为不完整的结果
+    """
+    counts = {'train': 0, 'point': 0, 'segment': 0}
+    lines = []
+    try:
+        for kind, payload in records:
+            if kind == 'statistics':
+                record = {'type': kind, 'data': payload, 'model_tier': model_tier}
+            elif kind == 'segment':
+                record = {'type': kind, 'line': payload[0], 'data': payload[1]}
+            else:
+                record = {'type': kind, 'data': payload}
+            if kind in counts:
+                counts[kind] += 1
+            lines.append(ujson.dumps(record, ensure_ascii=False))
+            if len(lines) >= chunk_records:
+                yield ('\n'.join(lines) + '\n').encode('utf-8')
+                lines = []
+        lines.append(ujson.dumps({'type': 'end', 'data': {'trains': counts['train'], 'points': counts['point'],
+                                                          'segments': counts['segment']}}))
+    except Exception as e:
+        metrics.inc("stream.errors")
+        print(f"流式预测输出失败: {e}")
+        lines.append(ujson.dumps({'type': 'error', 'msg': str(e)}, ensure_ascii=False))
+    metrics.inc("stream.records", sum(counts.values()))
+    yield ('\n'.join(lines) + '\n').encode('utf-8')
@@ -0,0 +1,84 @@
+"""
+预计算的日历 / 时刻特征表
+
+以 epoch 日（1970-01-01 起的天数）为下标，预先算好 CALENDAR_START_YEAR ~ CALENDAR_END_YEAR 每一天的
+dateID 和 weekID；timeID 为一天内的分钟数，直接由 epoch 分钟取余得到。
+特征提取只做整数运算和数组下标，不再 strftime / strptime；范围外的日期退回逐项计算。
+"""
+import os
+from datetime import date, datetime
+from typing import Tuple
+
+import numpy as np
+
+from app.services.timetable_store import to_epoch_minute
+
+CALENDAR_START_YEAR = int(os.getenv('CALENDAR_START_YEAR', '2020'))
+CALENDAR_END_YEAR = int(os.getenv('CALENDAR_END_YEAR', '2035'))
+
+# 与 calculate_date_id 相同的基准年
+DATE_ID_BASE_YEAR = 2020
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class CalendarTables:
+    """
+    日历特征查询表
+
+    日表（下标为 epoch 日 - 起始日）: date_id (int32)、week_id (int8)
+    """
+
+    def __init__(self, start_year: int = CALENDAR_START_YEAR, end_year: int = CALENDAR_END_YEAR):
+        self.first_day = date(start_year, 1, 1).toordinal() - _EPOCH_ORDINAL
+        last_day = date(end_year, 12, 31).toordinal() - _EPOCH_ORDINAL
+        self.num_days = last_day - self.first_day + 1
+
+        days = np.arange(self.first_day, last_day + 1, dtype=np.int64)
+        day64 = days.astype('datetime64[D]')
+        year_start = day64.astype('datetime64[Y]')
+        yday = (day64 - year_start.astype('datetime64[D]')).astype(np.int64) + 1
+        years = year_start.astype(np.int64) + 1970
+        self.date_id = ((years - DATE_ID_BASE_YEAR) * 365 + yday).astype(np.int32)
+        # 1970-01-01 为星期四（weekday() == 3）
+        self.week_id = ((days + 3) % 7).astype(np.int8)
+
+    def lookup(self, epoch_minutes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """epoch 分钟数组 -> (timeID, dateID, weekID)，与 calculate_time_id / calculate_date_id / calculate_week_id 相同"""
+        epoch_minutes = np.asarray(epoch_minutes, dtype=np.int64)
+        days = epoch_minutes // 1440
+        time_id = epoch_minutes - days * 1440
+        k = days - self.first_day
+        inside = (k >= 0) & (k < self.num_days)
+        if inside.all():
+            return time_id, self.date_id[k].astype(np.int64), self.week_id[k].astype(np.int64)
+        date_id = np.empty(len(days), dtype=np.int64)
+        week_id = np.empty(len(days), dtype=np.int64)
+        date_id[inside] = self.date_id[k[inside]]
+        week_id[inside] = self.week_id[k[inside]]
+        for i in np.flatnonzero(~inside).tolist():
+            date_id[i], week_id[i] = self._compute(int(days[i]))
+        return time_id, date_id, week_id
+
+    def features(self, time_obj: datetime) -> Tuple[int, int, int]:
+        """单个时刻的 (timeID, dateID, weekID)"""
+        minute = to_epoch_minute(time_obj)
+        day = minute // 1440
+        k = day - self.first_day
+        if 0 <= k < self.num_days:
+            return minute - day * 1440, int(self.date_id[k]), int(self.week_id[k])
+        return (minute - day * 1440,) + self._compute(day)
+
+    @staticmethod
+    def _compute(epoch_day: int) -> Tuple[int, int]:
+        """范围外日期的 (dateID, weekID)"""
+        d = date.fromordinal(epoch_day + _EPOCH_ORDINAL)
+        return (d.year - DATE_ID_BASE_YEAR) * 365 + d.timetuple().tm_yday, d.weekday()
+
+    @property
+    def nbytes(self) -> int:
+        return self.date_id.nbytes + self.week_id.nbytes
+
+
+# 全局日历特征表（进程内只构建一次）
+calendar_tables = CalendarTables()
@@ -1,8 +1,12 @@
 import pymysql
 import random
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 from app.core.database import db_connection
+from app.services.timetable_store import TimetableStore
+from app.services.delay_ingest import delay_buffer
+from app.services.calendar_features import calendar_tables
+from app.services.weather_provider import WEATHER_FILE, resolve_observations, weather_provider
 
 
 try:
@@ -22,6 +26,10 @@ except ImportError:
     class UpDownType:
         pass
 
+# 最短轨迹长度：GeoConv 卷积核大小（3）个历史站点 + 1 个目标站点
+MIN_TRAJECTORY_LEN = 4
+
+
 class DataInputUtils:
     def __init__(self, db_config: Dict[str, str]):
         """
@@ -30,18 +38,17 @@ class DataInputUtils:
         try:
             # 使用全局数据库连接
             if db_connection.is_connected() or db_connection.connect():
-                self.db = db_connection.db
-                self.cursor = db_connection.cursor
                 print("数据库连接成功")
             else:
                 print("数据库连接失败")
-                self.db = None
-                self.cursor = None
         except Exception as e:
             print(f"数据库连接失败: {e}")
-            self.db = None
-            self.cursor = None
         
+        # 各参考表已加载到的最大自增 id（高水位），供 TimetableSync 增量同步
+        self.watermarks: Dict[str, int] = {}
+        # 带 updated_at 列的表（migrations/004）已加载到的 (最大更新时间, 该时间的最大 id)，TimetableSync 对这些表按更新时间同步
+        self.updated_watermarks: Dict[str, Tuple[datetime, int]] = {}
+
         try:
             self.station_coordinates = self.load_station_coordinates()
             self.weather_mapping = self.load_weather_mapping()
@@ -50,6 +57,7 @@ class DataInputUtils:
             self.station_distances = self.load_station_distances()  # 从数据库加载距离
             self.historical_data = self.load_historical_data()  # 从数据库加载历史数据
             self.station_mapping = self.load_station_mapping()  # 加载中英文站点映射
+            self.load_weather_observations()  # 各站天气观测写入天气特征索引
             
         except Exception as e:
             print(f"初始化数据映射失败: {e}")
@@ -58,61 +66,88 @@ class DataInputUtils:
             self.wind_mapping = {}
             self.driver_mapping = {}
             self.station_distances = {}
-            self.historical_data = {}
+            self.historical_data = TimetableStore.from_rows([])
             self.station_mapping = {}
 
-    def load_historical_data(self) -> Dict[str, List[Dict[str, Any]]]:
-        """从数据库加载历史列车数据"""
+    @property
+    def db(self):
+        """全局数据库连接（pre-fork 部署时 worker 重连后自动指向本进程的新连接）"""
+        return db_connection.db
+
+    @property
+    def cursor(self):
+        """全局数据库连接的游标"""
+        return db_connection.cursor
+
+    def load_historical_data(self) -> TimetableStore:
+        """从数据库加载历史列车数据，存为列式时刻表"""
         if not self.cursor:
             print("数据库游标未初始化")
-            return {}
+            return TimetableStore.from_rows([])
         try:
-            # 从test3表加载历史列车数据
-            sql = "SELECT train_ID, station, arrival_time, departure_time FROM test3"
+            # 从test3表加载历史列车数据；按 id 升序，同一 (车次, 站点, 出发日期) 的多行以最新写入的为准
+            # 执行过 migrations/004 时一并读取 updated_at，增量同步改为按更新时间（可同步原地 UPDATE 的修改）
+            updated = self._has_column('test3', 'updated_at')
+            sql = (f"SELECT id, train_ID, station, arrival_time, departure_time{', updated_at' if updated else ''} "
+                   f"FROM test3 ORDER BY id")
             self.cursor.execute(sql)
-            
-            historical_data = {}
-            for row in self.cursor.fetchall():
-                train_id = row[0]
-                station = row[1]
-                arrival_time = row[2]
-                departure_time = row[3]
-                
-                if train_id not in historical_data:
-                    historical_data[train_id] = []
-                
-                historical_data[train_id].append({
-                    'station': station,
-                    'arrival_time': arrival_time,
-                    'departure_time': departure_time
-                })
-            
-            print(f"从数据库加载了 {len(historical_data)} 辆列车的历史数据")
-            for train_id, stations in list(historical_data.items())[:5]:  # 只显示前5辆列车
-                print(f"  列车 {train_id}: {len(stations)} 个站点")
-            
+            rows = self.cursor.fetchall()
+            self._record_watermark('test3', rows)
+            if updated:
+                self.updated_watermarks['test3'] = max(((row[5], row[0]) for row in rows),
+                                                       default=(datetime(1970, 1, 1), 0))
+            historical_data = TimetableStore.from_rows(row[1:5] for row in rows)
+
+            print(f"从数据库加载了 {len(historical_data)} 辆列车的历史数据 "
+                  f"({historical_data.num_stops} 个停站, {historical_data.nbytes() / 1024:.1f}KB)")
+            for train_id in historical_data.train_names[:5]:  # 只显示前5辆列车
+                start, end = historical_data.stop_range(train_id)
+                print(f"  列车 {train_id}: {end - start} 个站点")
+
             return historical_data
         except Exception as e:
             print(f"从数据库加载历史数据失败: {e}")
-            return {}
+            return TimetableStore.from_rows([])
+
+    def _has_column(self, table: str, column: str) -> bool:
+        """当前库中 table 是否有 column 列（判断迁移是否已执行），查询失败时视为没有"""
+        try:
+            self.cursor.execute("SELECT COUNT(*) FROM information_schema.columns "
+                                "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+                                (table, column))
+            return self.cursor.fetchone()[0] > 0
+        except Exception as e:
+            print(f"查询 {table}.{column} 列失败: {e}")
+            return False
+
+    def _record_watermark(self, table: str, rows) -> None:
+        """记录已加载行（首列为 id）的最大 id"""
+        if rows:
+            self.watermarks[table] = max(self.watermarks.get(table, 0), max(row[0] for row in rows))
+        else:
+            self.watermarks.setdefault(table, 0)
 
     def get_historical_stations_from_database(self, train_no: str, pre_station: str) -> List[str]:
         """从数据库获取历史站点序列"""
-        if not self.cursor:
+        if train_no not in self.historical_data and not self.cursor:
             print("数据库游标未初始化")
             return self._get_default_station_sequence()
         
         try:
-            # 查询指定列车的历史站点
-            sql = """
-                SELECT station 
-                FROM test3 
-                WHERE train_ID = %s 
-                ORDER BY departure_time
-            """
-            
-            self.cursor.execute(sql, (train_no,))
-            stations = [row[0] for row in self.cursor.fetchall()]
+            if train_no in self.historical_data:
+                # 内存时刻表中已有该车次时不再查库（级联预测需为每个并发车次取站点序列）
+                stations = self.historical_data.station_sequence(train_no)
+            else:
+                # 查询指定列车的历史站点
+                sql = """
+                    SELECT station 
+                    FROM test3 
+                    WHERE train_ID = %s 
+                    ORDER BY departure_time
+                """
+                
+                self.cursor.execute(sql, (train_no,))
+                stations = [row[0] for row in self.cursor.fetchall()]
             
             # 过滤掉空字符串和None值
             stations = [station for station in stations if station and station.strip()]
@@ -153,24 +188,13 @@ class DataInputUtils:
             return {}
         try:
             # 从jinghu_station表加载站点坐标
-            sql = "SELECT zh_name, en_name, longitude, latitude FROM jinghu_station"
+            sql = "SELECT id, zh_name, en_name, longitude, latitude FROM jinghu_station"
             self.cursor.execute(sql)
-            
+            rows = self.cursor.fetchall()
+            self._record_watermark('jinghu_station', rows)
+
             coordinates = {}
-            for row in self.cursor.fetchall():
-                zh_name = row[0]  # 中文站点名称
-                en_name = row[1]  # 英文站点名称
-                longitude = float(row[2])  # 经度
-                latitude = float(row[3])   # 纬度
-                
-                # 存储中文站点名称的坐标
-                coordinates[zh_name] = {"lng": longitude, "lat": latitude}
-                # 存储英文站点名称的坐标
-                coordinates[en_name] = {"lng": longitude, "lat": latitude}
-                # 存储去掉"站"字的中文名称
-                if zh_name.endswith("站"):
-                    short_name = zh_name.replace("站", "")
-                    coordinates[short_name] = {"lng": longitude, "lat": latitude}
+            self.add_station_coordinates(coordinates, (row[1:] for row in rows))
             
             print(f"从数据库加载了 {len(coordinates)} 个站点坐标")
             return coordinates
@@ -178,6 +202,24 @@ class DataInputUtils:
             print(f"从数据库加载站点坐标失败: {e}")
             return {}
 
+    @staticmethod
+    def add_station_coordinates(coordinates: Dict[str, Dict[str, float]], rows) -> None:
+        """将 (zh_name, en_name, longitude, latitude) 行写入坐标映射"""
+        for row in rows:
+            zh_name = row[0]  # 中文站点名称
+            en_name = row[1]  # 英文站点名称
+            longitude = float(row[2])  # 经度
+            latitude = float(row[3])   # 纬度
+
+            # 存储中文站点名称的坐标
+            coordinates[zh_name] = {"lng": longitude, "lat": latitude}
+            # 存储英文站点名称的坐标
+            coordinates[en_name] = {"lng": longitude, "lat": latitude}
+            # 存储去掉"站"字的中文名称
+            if zh_name.endswith("站"):
+                short_name = zh_name.replace("站", "")
+                coordinates[short_name] = {"lng": longitude, "lat": latitude}
+
     def load_weather_mapping(self) -> Dict[str, int]:
         """从数据库加载天气映射"""
         if not self.cursor:
@@ -222,14 +264,40 @@ class DataInputUtils:
             print(f"从数据库加载风速映射失败: {e}")
             return {}
 
+    def load_weather_observations(self) -> None:
+        """从 weather_observation 表和 WEATHER_FILE 加载各站天气观测，写入全局天气特征索引"""
+        if self.cursor:
+            try:
+                sql = "SELECT id, station, observed_at, weather, temperature, wind FROM weather_observation"
+                self.cursor.execute(sql)
+                rows = self.cursor.fetchall()
+                self._record_watermark('weather_observation', rows)
+                count = self.add_weather_observations(rows)
+                print(f"从数据库加载了 {count} 条天气观测")
+            except Exception as e:
+                print(f"从数据库加载天气观测失败: {e}")
+        if WEATHER_FILE:
+            try:
+                count = weather_provider.load_csv(WEATHER_FILE, self.weather_mapping, self.wind_mapping)
+                print(f"从 {WEATHER_FILE} 加载了 {count} 条天气观测")
+            except Exception as e:
+                print(f"加载天气观测文件失败: {e}")
+
+    def add_weather_observations(self, rows) -> int:
+        """将 (id, station, observed_at, weather, temperature, wind) 行写入天气特征索引，返回写入条数"""
+        return weather_provider.add(resolve_observations(
+            (row[1:] for row in rows), self.weather_mapping, self.wind_mapping))
+
     def load_driver_mapping(self) -> Dict[str, int]:
         """加载列车车次映射"""
         if not self.cursor:
             return {}
         try:
-            sql = "SELECT train_no, code FROM train_number"
+            sql = "SELECT id, train_no, code FROM train_number"
             self.cursor.execute(sql)
-            return {row[0]: int(row[1]) for row in self.cursor.fetchall()}
+            rows = self.cursor.fetchall()
+            self._record_watermark('train_number', rows)
+            return {row[1]: int(row[2]) for row in rows}
         except Exception as e:
             print(f"加载列车车次映射失败: {e}")
             return {}
@@ -245,17 +313,7 @@ class DataInputUtils:
             self.cursor.execute(sql)
             
             station_mapping = {}
-            for row in self.cursor.fetchall():
-                from_station = row[0]
-                to_station = row[1]
-                
-                # 提取中文站点名称（去掉"Railway Station"等英文后缀）
-                if "Railway Station" in from_station:
-                    chinese_name = from_station.replace(" Railway Station", "")
-                    station_mapping[chinese_name] = from_station
-                if "Railway Station" in to_station:
-                    chinese_name = to_station.replace(" Railway Station", "")
-                    station_mapping[chinese_name] = to_station
+            self.add_station_names(station_mapping, self.cursor.fetchall())
             
             # 添加常见的中文站点名称映射
             common_mappings = {
@@ -286,6 +344,21 @@ class DataInputUtils:
             print(f"从数据库加载中英文站点映射失败: {e}")
             return {}
 
+    @staticmethod
+    def add_station_names(station_mapping: Dict[str, str], rows) -> None:
+        """从 (from_station, to_station) 行提取中英文站点映射"""
+        for row in rows:
+            from_station = row[0]
+            to_station = row[1]
+
+            # 提取中文站点名称（去掉"Railway Station"等英文后缀）
+            if "Railway Station" in from_station:
+                chinese_name = from_station.replace(" Railway Station", "")
+                station_mapping[chinese_name] = from_station
+            if "Railway Station" in to_station:
+                chinese_name = to_station.replace(" Railway Station", "")
+                station_mapping[chinese_name] = to_station
+
     def load_station_distances(self) -> Dict[tuple, float]:
         """从数据库加载站点距离"""
         if not self.cursor:
@@ -293,22 +366,17 @@ class DataInputUtils:
             return {}
         try:
             # 从data_adj表加载距离数据
-            sql = "SELECT from_station, to_station, mileage FROM data_adj"
+            sql = "SELECT id, from_station, to_station, mileage FROM data_adj"
             self.cursor.execute(sql)
-            
+            rows = self.cursor.fetchall()
+            self._record_watermark('data_adj', rows)
+
             dist_dict = {}
-            sample_count = 0
-            for row in self.cursor.fetchall():
-                from_station = row[0]
-                to_station = row[1]
-                distance = float(row[2])
-                dist_dict[(from_station, to_station)] = distance
-                dist_dict[(to_station, from_station)] = distance
-                
-                # 显示前10个样本用于调试
-                if sample_count < 10:
-                    print(f"样本距离数据: '{from_station}' -> '{to_station}' = {distance}km")
-                    sample_count += 1
+            self.add_station_distances(dist_dict, (row[1:] for row in rows))
+
+            # 显示前10个样本用于调试
+            for row in rows[:10]:
+                print(f"样本距离数据: '{row[1]}' -> '{row[2]}' = {float(row[3])}km")
             
             print(f"总共从数据库加载了 {len(dist_dict)//2} 对站点距离")
             return dist_dict
@@ -316,6 +384,16 @@ class DataInputUtils:
             print(f"从数据库加载站点距离失败: {e}")
             return {}
 
+    @staticmethod
+    def add_station_distances(dist_dict: Dict[tuple, float], rows) -> None:
+        """将 (from_station, to_station, mileage) 行写入双向距离映射"""
+        for row in rows:
+            from_station = row[0]
+            to_station = row[1]
+            distance = float(row[2])
+            dist_dict[(from_station, to_station)] = distance
+            dist_dict[(to_station, from_station)] = distance
+
     def get_station_coordinates(self, station_name: str) -> Dict[str, float]:
         """获取站点坐标"""
         coords = self.station_coordinates.get(station_name, {"lng": 0.0, "lat": 0.0})
@@ -439,10 +517,41 @@ class DataInputUtils:
         except:
             return 0
 
+    @staticmethod
+    def pad_trajectory(lats: List[float], lngs: List[float], dist_gap: List[float], time_gap: List[float]) -> None:
+        """在轨迹前部重复起点（距离、晚点为 0）直到达到 MIN_TRAJECTORY_LEN，原地修改"""
+        if not lats:
+            return
+        while len(lats) < MIN_TRAJECTORY_LEN:
+            lats.insert(0, lats[0])
+            lngs.insert(0, lngs[0])
+            dist_gap.insert(0, 0.0)
+            time_gap.insert(0, 0)
+
+    @staticmethod
+    def pad_stations(stations: List[str], length: int) -> List[str]:
+        """与 pad_trajectory 对应的站点序列：在前部重复起点到 length"""
+        return [stations[0]] * (length - len(stations)) + list(stations)
+
+    @staticmethod
+    def stretch(values: List[Any], length: int) -> List[Any]:
+        """将逐站特征截取或以末值延长到 length"""
+        return (list(values) + [values[-1]] * length)[:length]
+
     def generate_random_delay(self) -> int:
         """生成随机晚点时间"""
         return random.randint(0, 30)
 
+    def get_observed_delay(self, train_no: str, service_date, station: str, previous: int = 0) -> int:
+        """
+        取车次在某站的实际晚点（来自实时到站报告，见 delay_ingest）
+        该站没有观测时沿用 previous（轨迹上一站的晚点，起点为 0），同一输入的特征保持确定
+        """
+        delay = delay_buffer.get_delay(train_no, service_date, station)
+        if delay is None:
+            return previous
+        return round(delay)
+
     def convert_predict_request_to_model_format_simple(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         将 PredictRequest 格式转换为模型输入格式
@@ -459,12 +568,9 @@ class DataInputUtils:
             # 解析时间
             try:
                 time_obj = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S")
-                date_str = time_obj.strftime("%Y-%m-%d")
-                time_str = time_obj.strftime("%H:%M:%S")
             except:
-                time_obj = datetime.strptime("2025-07-22 08:00:00", "%Y-%m-%d %H:%M:%S")
-                date_str = "2025-07-22"
-                time_str = "08:00:00"
+                time_obj = datetime(2025, 7, 22, 8, 0, 0)
+            time_id, date_id, week_id = calendar_tables.features(time_obj)
             
             # 获取历史站点信息
             historical_stations = self.get_historical_stations_from_database(train_no, pre_station)
@@ -499,31 +605,31 @@ class DataInputUtils:
                     distance = self.get_station_distance(prev_station, station)
                     dist_gap.append(distance)
                     
-                    delay = self.generate_random_delay()
+                    delay = self.get_observed_delay(train_no, time_obj.date(), station, time_gap[-1])
                     time_gap.append(delay)
         
-            while len(lats) < 4:
-                lats.append(0.0)
-                lngs.append(0.0)
-                dist_gap.append(0.0)
-                time_gap.append(0)
+            # 轨迹不足最短长度时在起点前重复起点补齐，目标站点始终位于末尾
+            self.pad_trajectory(lats, lngs, dist_gap, time_gap)
+            length = len(lats)
+            weather, temperature, wind = weather_provider.trajectory_features(
+                self.pad_stations(station_sequence, length), time_obj)
             
             # 构造模型输入格式
             model_input = {
-                "time_gap": time_gap[:4],
+                "time_gap": time_gap,
                 "dist": sum(dist_gap),
-                "lats": lats[:4],
-                "lngs": lngs[:4],
+                "lats": lats,
+                "lngs": lngs,
                 "driverID": self.get_driver_id(train_no),
-                "weekID": self.calculate_week_id(date_str),
-                "states": [1.0] * 4,
-                "timeID": self.calculate_time_id(time_str),
+                "weekID": week_id,
+                "states": [1.0] * length,
+                "timeID": time_id,
                 "time": -1.0,
-                "dateID": self.calculate_date_id(date_str),
-                "dist_gap": dist_gap[:4],
-                "weather": [22, 22, 1, 1],
-                "temperature": [9, 10, 8, 8],
-                "wind": [24, 24, 15, 15]
+                "dateID": date_id,
+                "dist_gap": dist_gap,
+                "weather": weather,
+                "temperature": temperature,
+                "wind": wind
             }
             
             print(f"转换结果:")
@@ -552,7 +658,8 @@ class DataInputUtils:
             if args.event_location == EventLocationType.SECTION:
                 s = args.event_location_value.split(",")
                 pre_station = s[0]
-                next_station = s[1]
+                # 只写了一个站点时按车站事件处理
+                next_station = s[1] if len(s) > 1 else s[0]
             else:
                 pre_station = args.event_location_value
                 next_station = args.event_location_value
@@ -563,77 +670,8 @@ class DataInputUtils:
                 time_obj = start_time
             else:
                 time_obj = datetime.strptime(start_time, "%Y-%m-%d %H:%M:%S")
-            date_str = time_obj.strftime("%Y-%m-%d")
-            time_str = time_obj.strftime("%H:%M:%S")
 
-            # 获取历史站点信息
-            historical_stations = self.get_historical_stations_from_database(train_no, pre_station)
-            
-            # 生成站点序列
-            station_sequence = []
-            for station_info in historical_stations:
-                station_sequence.append(station_info)
-            
-            # 添加目标站点
-            if next_station not in station_sequence:
-                station_sequence.append(next_station)
-            
-            # 生成坐标和距离数据
-            lats = []
-            lngs = []
-            dist_gap = []
-            time_gap = []
-            
-            for i, station in enumerate(station_sequence):
-                coords = self.get_station_coordinates(station)
-                lats.append(coords['lat'])
-                lngs.append(coords['lng'])
-                
-                if i == 0:
-                    #起始站点的距离为0，晚点时间为0
-                    dist_gap.append(0.0)
-                    time_gap.append(0)
-                else:
-                    # 计算距离
-                    prev_station = station_sequence[i-1]
-                    distance = self.get_station_distance(prev_station, station)
-                    dist_gap.append(distance)
-                    
-                    delay = self.generate_random_delay()
-                    time_gap.append(delay)
-            
-            while len(lats) < 4:
-                lats.append(0.0)
-                lngs.append(0.0)
-                dist_gap.append(0.0)
-                time_gap.append(0)
-            
-            # 构造模型输入格式
-            model_input = {
-                "time_gap": time_gap[:4],
-                "dist": sum(dist_gap),
-                "lats": lats[:4],
-                "lngs": lngs[:4],
-                "driverID": self.get_driver_id(train_no),
-                "weekID": self.calculate_week_id(date_str),
-                "states": [1.0] * 4,
-                "timeID": self.calculate_time_id(time_str),
-                "time": -1.0,
-                "dateID": self.calculate_date_id(date_str),
-                "dist_gap": dist_gap[:4],
-                "weather": [22, 22, 1, 1],
-                "temperature": [9, 10, 8, 8],
-                "wind": [24, 24, 15, 15]
-            }
-            
-            # print(f"转换结果:")
-            # print(f"  time_gap: {model_input['time_gap']}")
-            # print(f"  dist: {model_input['dist']}")
-            # print(f"  lats: {model_input['lats']}")
-            # print(f"  lngs: {model_input['lngs']}")
-            # print(f"  dist_gap: {model_input['dist_gap']}")
-            
-            return model_input
+            return self.build_model_input(train_no, pre_station, next_station, time_obj)
             
         except Exception as e:
             print(f"转换失败: {e}")
@@ -641,6 +679,84 @@ class DataInputUtils:
             traceback.print_exc()
             return self._get_default_format()
 
+    def build_model_input(self, train_no: str, pre_station: str, next_station: str, time_obj: datetime,
+                          observed: bool = True) -> Dict[str, Any]:
+        """
+        构造某车次从 pre_station 驶向 next_station 的模型输入
+        主要列车与级联影响中的并发列车共用此方法，便于一次批量前向
+        observed 为 False 时不读取实时到站观测，time_gap 全为 0（夜间预计算）
+        """
+        time_id, date_id, week_id = calendar_tables.features(time_obj)
+
+        # 获取历史站点信息
+        historical_stations = self.get_historical_stations_from_database(train_no, pre_station)
+        
+        # 生成站点序列
+        station_sequence = []
+        for station_info in historical_stations:
+            station_sequence.append(station_info)
+        
+        # 添加目标站点
+        if next_station not in station_sequence:
+            station_sequence.append(next_station)
+        
+        # 生成坐标和距离数据
+        lats = []
+        lngs = []
+        dist_gap = []
+        time_gap = []
+        
+        for i, station in enumerate(station_sequence):
+            coords = self.get_station_coordinates(station)
+            lats.append(coords['lat'])
+            lngs.append(coords['lng'])
+            
+            if i == 0:
+                #起始站点的距离为0，晚点时间为0
+                dist_gap.append(0.0)
+                time_gap.append(0)
+            else:
+                # 计算距离
+                prev_station = station_sequence[i-1]
+                distance = self.get_station_distance(prev_station, station)
+                dist_gap.append(distance)
+                
+                delay = self.get_observed_delay(train_no, time_obj.date(), station, time_gap[-1]) if observed else 0
+                time_gap.append(delay)
+        
+        # 轨迹不足最短长度时在起点前重复起点补齐，目标站点始终位于末尾
+        self.pad_trajectory(lats, lngs, dist_gap, time_gap)
+        length = len(lats)
+        weather, temperature, wind = weather_provider.trajectory_features(
+            self.pad_stations(station_sequence, length), time_obj)
+        
+        # 构造模型输入格式
+        model_input = {
+            "time_gap": time_gap,
+            "dist": sum(dist_gap),
+            "lats": lats,
+            "lngs": lngs,
+            "driverID": self.get_driver_id(train_no),
+            "weekID": week_id,
+            "states": [1.0] * length,
+            "timeID": time_id,
+            "time": -1.0,
+            "dateID": date_id,
+            "dist_gap": dist_gap,
+            "weather": weather,
+            "temperature": temperature,
+            "wind": wind
+        }
+        
+        # print(f"转换结果:")
+        # print(f"  time_gap: {model_input['time_gap']}")
+        # print(f"  dist: {model_input['dist']}")
+        # print(f"  lats: {model_input['lats']}")
+        # print(f"  lngs: {model_input['lngs']}")
+        # print(f"  dist_gap: {model_input['dist_gap']}")
+        
+        return model_input
+
     def convert_to_model_format(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         将新格式的输入数据转换为模型输入格式
@@ -684,28 +800,26 @@ class DataInputUtils:
                     time_gap.append(delay)
             
             
-            while len(lats) < 4:
-                lats.append(0.0)
-                lngs.append(0.0)
-                dist_gap.append(0.0)
-                time_gap.append(0)
+            # 轨迹不足最短长度时在起点前重复起点补齐，目标站点始终位于末尾
+            self.pad_trajectory(lats, lngs, dist_gap, time_gap)
+            length = len(lats)
             
             # 构造模型输入格式
             model_input = {
-                "time_gap": time_gap[:4],
+                "time_gap": time_gap,
                 "dist": sum(dist_gap),
-                "lats": lats[:4],
-                "lngs": lngs[:4],
+                "lats": lats,
+                "lngs": lngs,
                 "driverID": 1262,
                 "weekID": 0,
-                "states": [1.0] * 4,
+                "states": [1.0] * length,
                 "timeID": 838,
                 "time": -1.0,
                 "dateID": 340,
-                "dist_gap": dist_gap[:4],
-                "weather": [22, 22, 1, 1],
-                "temperature": [9, 10, 8, 8],
-                "wind": [24, 24, 15, 15]
+                "dist_gap": dist_gap,
+                "weather": self.stretch([22, 22, 1, 1], length),
+                "temperature": self.stretch([9, 10, 8, 8], length),
+                "wind": self.stretch([24, 24, 15, 15], length)
             }
             
             print(f"转换结果:")
@@ -0,0 +1,259 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.metrics import metrics
+
+# 各 worker 共享的到站观测日志（SQLite），为空表示到站报告只写入处理该请求的进程
+DELAY_JOURNAL_DB = os.getenv(
+    'DELAY_JOURNAL_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'delay_reports.sqlite')
+)
+# worker 读取其它 worker 写入的观测的间隔（秒）
+DELAY_JOURNAL_INTERVAL = float(os.getenv('DELAY_JOURNAL_INTERVAL', '1'))
+# 日志保留的运行日期天数（含当天），更早的观测定期删除
+DELAY_JOURNAL_KEEP_DAYS = 2
+
+_JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS delay_report (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    train_id     TEXT NOT NULL,
+    service_date TEXT NOT NULL,
+    station      TEXT NOT NULL,
+    delay        REAL NOT NULL,
+    observed_at  TEXT NOT NULL
+)
+"""
+
+
+class DelayBuffer:
+    """
+    实时晚点观测缓冲
+
+    以 (车次, 运行日期) 为键，每个车次保留最近 capacity_per_train 个站点的实际晚点（分钟），
+    超出容量时淘汰最早的站点；车次数超过 max_trains 时淘汰最久未更新的车次。
+    写入和按站点查询都是 O(1)，构建模型特征时可直接取到真实的历史晚点。
+    """
+
+    def __init__(self, capacity_per_train: int = 64, max_trains: int = 20000):
+        self.capacity_per_train = capacity_per_train
+        self.max_trains = max_trains
+        self._lock = threading.Lock()
+        # (train_id, service_date) -> OrderedDict[station, (delay_minutes, observed_at)]
+        self._trains: "OrderedDict[Tuple[str, date], OrderedDict]" = OrderedDict()
+        self._listeners: List[Callable] = []
+        metrics.set_gauge("delay_ingest.trains", lambda: len(self._trains))
+
+    def subscribe(self, listener: Callable) -> None:
+        """注册到站观测回调，参数为 (train_id, service_date, station, delay, observed_at)"""
+        self._listeners.append(listener)
+
+    def record(self, train_id: str, service_date: date, station: str, delay: float, observed_at: datetime):
+        """写入一条到站观测，写入后依次通知已注册的回调"""
+        key = (train_id, service_date)
+        with self._lock:
+            stations = self._trains.get(key)
+            if stations is None:
+                stations = self._trains[key] = OrderedDict()
+                if len(self._trains) > self.max_trains:
+                    self._trains.popitem(last=False)
+            else:
+                self._trains.move_to_end(key)
+
+            stations[station] = (delay, observed_at)
+            stations.move_to_end(station)
+            if len(stations) > self.capacity_per_train:
+                stations.popitem(last=False)
+
+        for listener in self._listeners:
+            try:
+                listener(train_id, service_date, station, delay, observed_at)
+            except Exception as e:
+                print(f"到站观测回调失败: {e}")
+
+    def get_delay(self, train_id: str, service_date: date, station: str) -> Optional[float]:
+        """某车次在某站的最近观测晚点，没有观测时返回 None"""
+        stations = self._trains.get((train_id, service_date))
+        if not stations:
+            return None
+        observed = stations.get(station)
+        return observed[0] if observed else None
+
+    def has_observations(self, train_id: str, service_date: date) -> bool:
+        """某车次当天是否已有到站观测"""
+        return bool(self._trains.get((train_id, service_date)))
+
+    def recent(self, train_id: str, service_date: date) -> List[Tuple[str, float, datetime]]:
+        """按写入顺序返回某车次最近的 (站点, 晚点, 观测时间)"""
+        with self._lock:
+            stations = self._trains.get((train_id, service_date))
+            if not stations:
+                return []
+            return [(station, delay, observed_at) for station, (delay, observed_at) in stations.items()]
+
+    def clear(self):
+        with self._lock:
+            self._trains.clear()
+
+
+class DelayJournal:
+    """
+    多 worker 共享的到站观测日志
+
+    pre-fork 部署时一次到站报告只由一个 worker 处理，而晚点特征、预计算旁路、状态缓存淘汰和
+    影子模型误差都读取本进程的 DelayBuffer。报告先追加到 SQLite 日志（自增 id），
+    每个 worker 的后台线程按高水位读取新行并写入自己的 DelayBuffer（依次触发回调）；
+    处理报告的 worker 在写入后立即读取一次，本次写入的观测在返回前即可见。
+    worker 启动（或重启）后的第一次读取会载入保留期内的全部观测。
+    """
+
+    def __init__(self, path: str, buffer: DelayBuffer, interval: float = DELAY_JOURNAL_INTERVAL):
+        self.path = os.path.abspath(path)
+        self.buffer = buffer
+        self.interval = interval
+        self.watermark = 0
+        self._local = threading.local()
+        self._apply_lock = threading.Lock()
+        self._last_prune = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        metrics.set_gauge("delay_journal.watermark", lambda: self.watermark)
+
+    def _conn(self) -> sqlite3.Connection:
+        """按线程懒加载连接（pre-fork 时在 worker 中建立，不与 master 共用）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_JOURNAL_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def append(self, observations: List[Tuple[str, date, str, float, datetime]]) -> None:
+        """追加 (车次, 运行日期, 站点, 晚点, 实际到站) 观测"""
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO delay_report (train_id, service_date, station, delay, observed_at) VALUES (?, ?, ?, ?, ?)",
+                [(train_id, service_date.isoformat(), station, float(delay), observed_at.isoformat(sep=' '))
+                 for train_id, service_date, station, delay, observed_at in observations])
+
+    def apply(self) -> int:
+        """把高水位之后的观测写入本进程的 DelayBuffer，返回行数"""
+        with self._apply_lock:
+            rows = self._conn().execute(
+                "SELECT id, train_id, service_date, station, delay, observed_at FROM delay_report "
+                "WHERE id > ? ORDER BY id", (self.watermark,)).fetchall()
+            for _, train_id, service_date, station, delay, observed_at in rows:
+                self.buffer.record(train_id, date.fromisoformat(service_date), station, delay,
+                                   datetime.fromisoformat(observed_at))
+            if rows:
+                self.watermark = rows[-1][0]
+                metrics.inc("delay_journal.applied", len(rows))
+            return len(rows)
+
+    def prune(self) -> int:
+        """删除保留期之前运行日期的观测"""
+        before = date.today() - timedelta(days=DELAY_JOURNAL_KEEP_DAYS - 1)
+        conn = self._conn()
+        with conn:
+            cur = conn.execute("DELETE FROM delay_report WHERE service_date < ?", (before.isoformat(),))
+        return cur.rowcount
+
+    def _run(self):
+        while True:
+            try:
+                self.apply()
+                if time.time() - self._last_prune > 3600:
+                    self._last_prune = time.time()
+                    self.prune()
+            except (sqlite3.Error, OSError) as e:
+                metrics.inc("delay_journal.errors")
+                print(f"读取到站观测日志失败: {e}")
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self):
+        """启动后台读取线程（pre-fork 部署时需在 worker 中调用）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="delay-journal", daemon=True)
+        self._thread.start()
+        print(f"到站观测日志同步已启动: {self.path}，间隔 {self.interval} 秒")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def ingest_reports(reports, timetable, buffer: "DelayBuffer",
+                   journal: Optional[DelayJournal] = None) -> Dict[str, int]:
+    """
+    批量写入到站报告
+    报告未给出计划到站时间时，从内存时刻表查找；查不到计划时刻的报告计为 rejected
+    给出 journal 时观测经共享日志写入（各 worker 都能读到）；日志不可用时只写入本进程的 buffer
+    """
+    start = time.time()
+    observations = []
+    rejected = 0
+    for report in reports:
+        actual = report.actual_arrival
+        scheduled = report.scheduled_arrival
+        if scheduled is None and timetable is not None:
+            scheduled = _lookup_scheduled(timetable, report.train_id, report.station, actual)
+        if scheduled is None:
+            rejected += 1
+            continue
+        delay = (actual - scheduled).total_seconds() / 60
+        observations.append((report.train_id, scheduled.date(), report.station, delay, actual))
+
+    if journal is not None and observations:
+        try:
+            journal.append(observations)
+        except (sqlite3.Error, OSError) as e:
+            metrics.inc("delay_journal.errors")
+            print(f"写入到站观测日志失败，只写入本进程: {e}")
+            journal = None
+    if journal is not None:
+        try:
+            journal.apply()
+        except sqlite3.Error as e:
+            metrics.inc("delay_journal.errors")
+            print(f"读取到站观测日志失败，由后台线程重试: {e}")
+    else:
+        for observation in observations:
+            buffer.record(*observation)
+
+    accepted = len(observations)
+    metrics.inc("delay_ingest.accepted", accepted)
+    metrics.inc("delay_ingest.rejected", rejected)
+    metrics.observe("delay_ingest.batch", time.time() - start)
+    return {"accepted": accepted, "rejected": rejected}
+
+
+def _lookup_scheduled(timetable, train_id: str, station: str, actual: datetime) -> Optional[datetime]:
+    """
+    实际到站当天和前一天的计划到站时刻中离实际到站最近的一个
+    （过零点到站的车次计划时刻在前一天；时刻表含多天数据时不会误配到当天很晚的另一趟）
+    """
+    candidates = [timetable.scheduled_arrival(train_id, station, day)
+                  for day in (actual.date(), actual.date() - timedelta(days=1))]
+    candidates = [c for c in candidates if c is not None]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda c: abs((actual - c).total_seconds()))
+
+
+# 全局晚点观测缓冲
+delay_buffer = DelayBuffer()
+
+# 全局到站观测日志（DELAY_JOURNAL_DB 为空时不启用）
+delay_journal = DelayJournal(DELAY_JOURNAL_DB, delay_buffer) if DELAY_JOURNAL_DB else None
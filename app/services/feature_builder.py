@@ -0,0 +1,221 @@
+import contextlib
+import io
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.metrics import metrics
+from app.services.calendar_features import calendar_tables
+from app.services.data_input_utils import MIN_TRAJECTORY_LEN, DataInputUtils
+from app.services.delay_ingest import delay_buffer
+from app.services.timetable_store import to_epoch_minute
+from app.services.weather_provider import weather_provider
+
+# (车次, 出发站 pre_station, 目标站 next_station, 出发时刻)
+FeatureRequest = Tuple[str, str, str, datetime]
+
+
+class BatchFeatureBuilder:
+    """
+    批量构造模型输入，结果与逐条调用 DataInputUtils.build_model_input 相同
+
+    - 站点序列直接从 TimetableStore 的站点 ID 数组切片，不经过站点名称列表
+    - 坐标按站点 ID 预先解析成数组，一批请求的全部停站一次索引取出
+    - 相邻站点距离按 (站点 ID, 站点 ID) 编码去重后查询，结果缓存，跨批次复用
+    - timeID / dateID / weekID 按 epoch 分钟查预计算的日历特征表（calendar_features），不再 strftime / strptime
+    - 天气、气温、风力整批一次查询 weather_provider 的 (站点, 小时) 索引
+
+    坐标、距离查询表跟随 DataInputUtils 上各映射对象的替换（TimetableSync 增量同步时整体替换）自动重建。
+    时刻表中没有的车次退回 build_model_input（可能查库）。
+    """
+
+    def __init__(self, utils: DataInputUtils):
+        self.utils = utils
+        # 查询表与缓存在请求线程间共享，构造过程（不含退回逐条构造的部分）串行执行
+        self._lock = threading.Lock()
+        self._sources: Optional[tuple] = None
+        self._store = None
+        self._lat = self._lng = self._valid = None
+        self._extra: Dict[str, int] = {}
+        self._extra_names: List[str] = []
+        self._extra_coords: List[Tuple[float, float]] = []
+        self._distances: Dict[int, float] = {}
+
+    def _refresh(self) -> None:
+        """参考数据对象被替换后重建查询表"""
+        utils = self.utils
+        sources = (utils.historical_data, utils.station_coordinates, utils.station_distances, utils.station_mapping)
+        if self._sources is not None and all(a is b for a, b in zip(sources, self._sources)):
+            return
+        # 同一次构造内固定使用这份时刻表，站点 ID 与坐标数组保持一致
+        self._store = sources[0]
+        names = self._store.station_names
+        # 未找到坐标的警告在每次重建时每站最多输出一次，不随请求重复
+        with contextlib.redirect_stdout(io.StringIO()):
+            coords = [utils.get_station_coordinates(name) for name in names]
+        self._lat = np.array([c['lat'] for c in coords], dtype=np.float64)
+        self._lng = np.array([c['lng'] for c in coords], dtype=np.float64)
+        self._valid = np.array([bool(name and name.strip()) for name in names], dtype=bool)
+        self._extra, self._extra_names, self._extra_coords, self._distances = {}, [], [], {}
+        self._sources = sources
+
+    def _station_id(self, name: str) -> int:
+        """站点 ID；时刻表中没有的站点（只会作为目标站点出现）分配在时刻表站点之后"""
+        sid = self._store.station_index.get(name)
+        if sid is not None:
+            return sid
+        sid = self._extra.get(name)
+        if sid is None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                c = self.utils.get_station_coordinates(name)
+            sid = self._extra[name] = len(self._lat) + len(self._extra_coords)
+            self._extra_names.append(name)
+            self._extra_coords.append((c['lat'], c['lng']))
+        return sid
+
+    def _station_name(self, sid: int) -> str:
+        names = self._store.station_names
+        if sid < len(names):
+            return names[sid]
+        return self._extra_names[sid - len(names)]
+
+    def _sequence(self, train_no: str, pre_station: str, next_station: str) -> Optional[np.ndarray]:
+        """与 get_historical_stations_from_database + 追加目标站点相同的站点 ID 序列；车次不在时刻表中时返回 None"""
+        store = self._store
+        start, end = store.stop_range(train_no)
+        ids = store.station_idx[start:end]
+        ids = ids[self._valid[ids]]
+        if ids.size == 0:
+            return None
+        pre = store.station_index.get(pre_station)
+        hits = np.flatnonzero(ids == pre) if pre is not None else ()
+        ids = ids[:hits[0] + 1] if len(hits) else ids[:4]
+        target = self._station_id(next_station)
+        if not (ids == target).any():
+            ids = np.append(ids, target)
+        return ids
+
+    def _gap_distances(self, flat: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        """每个停站与前一站的距离；各序列首站为 0"""
+        dist = np.zeros(len(flat), dtype=np.float64)
+        inner = np.ones(len(flat), dtype=bool)
+        inner[starts] = False
+        positions = np.flatnonzero(inner)
+        if positions.size == 0:
+            return dist
+        width = len(self._lat) + len(self._extra_coords)
+        keys = flat[positions - 1].astype(np.int64) * width + flat[positions]
+        unique, inverse = np.unique(keys, return_inverse=True)
+        values = np.empty(len(unique), dtype=np.float64)
+        missing = []
+        for k, key in enumerate(unique.tolist()):
+            value = self._distances.get(key)
+            if value is None:
+                missing.append((k, key))
+            else:
+                values[k] = value
+        if missing:
+            metrics.inc("features.distance_lookups", len(missing))
+            with contextlib.redirect_stdout(io.StringIO()):
+                for k, key in missing:
+                    value = self.utils.get_station_distance(self._station_name(key // width),
+                                                            self._station_name(key % width))
+                    values[k] = self._distances[key] = value
+        dist[positions] = values[inverse.reshape(-1)]
+        return dist
+
+    def _weather(self, flat: np.ndarray, starts: np.ndarray, lens: np.ndarray, times: Sequence[datetime]) -> list:
+        """各轨迹（按 pad_trajectory 补齐后）在请求时刻所在小时的天气特征，整批一次查询"""
+        padded = np.maximum(lens, MIN_TRAJECTORY_LEN)
+        if len(weather_provider) == 0:
+            return [weather_provider.default_features(n) for n in padded.tolist()]
+        # 补齐部分重复各轨迹的首站：补齐后第 k 个位置对应原序列的 max(k - 补齐数, 0)
+        padded_ends = np.cumsum(padded)
+        padded_starts = padded_ends - padded
+        offset = np.arange(padded_ends[-1]) - np.repeat(padded_starts, padded)
+        src = np.repeat(starts, padded) + np.maximum(offset - np.repeat(padded - lens, padded), 0)
+        stations = [self._station_name(sid) for sid in flat[src].tolist()]
+        hours = np.repeat(np.array([to_epoch_minute(t) // 60 for t in times], dtype=np.int64), padded)
+        return weather_provider.batch_features(stations, hours, padded_starts, padded_ends)
+
+    def build(self, requests: Sequence[FeatureRequest], observed: bool = True) -> List[Dict[str, Any]]:
+        """
+        批量构造模型输入（collate_fn 的输入格式），顺序与 requests 一致
+        observed 为 False 时不读取实时到站观测，time_gap 全为 0，同一时刻表每次构造的结果相同（夜间预计算）
+        """
+        if not requests:
+            return []
+        results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        with self._lock:
+            fallback = self._build(requests, results, observed)
+        for i in fallback:
+            metrics.inc("features.fallback")
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[i] = self.utils.build_model_input(*requests[i], observed=observed)
+        return results
+
+    def _build(self, requests: Sequence[FeatureRequest], results: List[Optional[Dict[str, Any]]],
+               observed: bool) -> List[int]:
+        """填入时刻表中有的车次的结果，返回需要逐条构造的请求下标"""
+        self._refresh()
+        utils = self.utils
+
+        rows, seqs, fallback = [], [], []
+        for i, (train_no, pre_station, next_station, _) in enumerate(requests):
+            seq = self._sequence(train_no, pre_station, next_station)
+            if seq is None:
+                fallback.append(i)
+            else:
+                rows.append(i)
+                seqs.append(seq)
+        if not rows:
+            return fallback
+
+        lens = np.array([len(s) for s in seqs], dtype=np.int64)
+        ends = np.cumsum(lens)
+        starts = ends - lens
+        flat = np.concatenate(seqs)
+        lat_table, lng_table = self._lat, self._lng
+        if self._extra_coords:
+            extra = np.array(self._extra_coords, dtype=np.float64)
+            lat_table = np.concatenate([lat_table, extra[:, 0]])
+            lng_table = np.concatenate([lng_table, extra[:, 1]])
+        lats, lngs = lat_table[flat].tolist(), lng_table[flat].tolist()
+        dists = self._gap_distances(flat, starts).tolist()
+        time_id, date_id, week_id = calendar_tables.lookup([to_epoch_minute(requests[i][3]) for i in rows])
+        time_id, date_id, week_id = time_id.tolist(), date_id.tolist(), week_id.tolist()
+        weather = self._weather(flat, starts, lens, [requests[i][3] for i in rows])
+
+        for j, i in enumerate(rows):
+            train_no, _, _, time_obj = requests[i]
+            s, e = int(starts[j]), int(ends[j])
+            service_date = time_obj.date()
+            if observed and delay_buffer.has_observations(train_no, service_date):
+                delays = [0]
+                for sid in seqs[j][1:].tolist():
+                    delays.append(utils.get_observed_delay(train_no, service_date, self._station_name(sid), delays[-1]))
+            else:
+                # 没有到站观测时与 get_observed_delay 相同：沿用起点的 0
+                delays = [0] * (e - s)
+            lat, lng, dist_gap = lats[s:e], lngs[s:e], dists[s:e]
+            utils.pad_trajectory(lat, lng, dist_gap, delays)
+            length = len(lat)
+            results[i] = {
+                "time_gap": delays,
+                "dist": sum(dist_gap),
+                "lats": lat,
+                "lngs": lng,
+                "driverID": utils.get_driver_id(train_no),
+                "weekID": week_id[j],
+                "states": [1.0] * length,
+                "timeID": time_id[j],
+                "time": -1.0,
+                "dateID": date_id[j],
+                "dist_gap": dist_gap,
+                "weather": weather[j][0],
+                "temperature": weather[j][1],
+                "wind": weather[j][2]
+            }
+        return fallback
@@ -0,0 +1,82 @@
+"""
+夜间批量预计算：对某一运行日 test3 时刻表中每个 (车次, 相邻区间) 运行晚点预测，写入 forecast_store
+
+用法:
+    python -m app.services.forecast_precompute                       # 预计算明天
+    python -m app.services.forecast_precompute --date 2025-07-23     # 指定运行日期
+    python -m app.services.forecast_precompute --batch-size 2048 --threads 16 --keep-days 7
+
+预计算按"无实时晚点观测"的假设构造输入（time_gap 全为 0，同一时刻表和模型版本的结果可复现）；
+API 对当天已有到站报告的车次仍走实时推理。
+"""
+import argparse
+import os
+import time
+from datetime import date, datetime, timedelta
+
+import torch
+
+from app.core.database import db_connection, DatabaseConfig
+from app.services.data_input_utils import DataInputUtils
+from app.services.feature_builder import BatchFeatureBuilder
+from app.services.forecast_store import forecast_store
+from app.services.train_delay.predict_delay_api import model_registry, predict_delay
+
+
+def precompute(data_utils: DataInputUtils, service_date: date, batch_size: int) -> int:
+    """预计算 service_date 全部区间并写入结果库，返回写入行数"""
+    sections = data_utils.historical_data.day_sections(service_date)
+    # 整个批次固定使用开始时的模型版本
+    version = model_registry.active
+    print(f"{service_date} 共 {len(sections)} 个区间待预计算，模型版本 {version.name}")
+
+    builder = BatchFeatureBuilder(data_utils)
+    conn = forecast_store.connect_writer()
+    written = 0
+    start = time.time()
+    try:
+        for i in range(0, len(sections), batch_size):
+            chunk = sections[i:i + batch_size]
+            inputs = builder.build(chunk, observed=False)
+            predictions = predict_delay(inputs, version, batch_size)
+            written += forecast_store.write(conn, service_date, version.name,
+                                            (section + (delay,) for section, delay in zip(chunk, predictions)))
+            elapsed = time.time() - start
+            print(f"  已完成 {written}/{len(sections)}，{written / elapsed:.0f} 条/秒")
+    finally:
+        conn.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="夜间批量预计算晚点预测")
+    parser.add_argument('--date', help='运行日期 YYYY-MM-DD，默认明天')
+    parser.add_argument('--batch-size', type=int, default=1024, help='每批构造的区间数，也是每次前向的最大样本数（同一批内按轨迹长度分桶）')
+    parser.add_argument('--threads', type=int, default=os.cpu_count(), help='torch 计算线程数')
+    parser.add_argument('--keep-days', type=int, default=7, help='保留最近几天的结果，0 表示不清理')
+    args = parser.parse_args()
+
+    service_date = (datetime.strptime(args.date, "%Y-%m-%d").date() if args.date
+                    else date.today() + timedelta(days=1))
+    torch.set_num_threads(args.threads)
+
+    if not db_connection.connect():
+        raise SystemExit("数据库连接失败，无法加载时刻表")
+    data_utils = DataInputUtils(DatabaseConfig.get_db_config())
+
+    start = time.time()
+    written = precompute(data_utils, service_date, args.batch_size)
+    print(f"预计算完成: {written} 条，耗时 {time.time() - start:.1f} 秒，结果库 {forecast_store.path}")
+
+    if args.keep_days > 0:
+        conn = forecast_store.connect_writer()
+        try:
+            removed = forecast_store.prune(conn, service_date - timedelta(days=args.keep_days))
+        finally:
+            conn.close()
+        print(f"清理过期结果 {removed} 条")
+    db_connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+from typing import Iterable, Optional, Tuple
+
+from app.core.metrics import metrics
+
+# 预计算结果库路径，默认位于项目根目录 data/ 下（docker-compose 中挂载为卷）
+FORECAST_DB = os.getenv(
+    'FORECAST_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'forecasts.sqlite')
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS forecast (
+    service_date   TEXT NOT NULL,
+    train_id       TEXT NOT NULL,
+    pre_station    TEXT NOT NULL,
+    next_station   TEXT NOT NULL,
+    departure_time TEXT NOT NULL,
+    delay          REAL NOT NULL,
+    model_version  TEXT NOT NULL,
+    created_at     TEXT NOT NULL,
+    PRIMARY KEY (service_date, train_id, pre_station, next_station)
+) WITHOUT ROWID
+"""
+
+
+class ForecastStore:
+    """
+    夜间预计算晚点预测结果（SQLite）
+
+    主键 (运行日期, 车次, 出发站, 到达站) 即查询索引，单次查询为一次 B 树查找。
+    读连接按线程懒加载并以只读方式打开，pre-fork 部署时每个 worker 在自身线程中建立连接；
+    结果库不存在或查询失败时返回 None，由调用方退回实时推理。
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+
+    def _reader(self) -> Optional[sqlite3.Connection]:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if not os.path.exists(self.path):
+                return None
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def lookup(self, train_id: str, service_date: date, pre_station: str, next_station: str,
+               model_version: str) -> Optional[float]:
+        """查询预计算的晚点（分钟），没有当前模型版本的结果时返回 None"""
+        try:
+            conn = self._reader()
+            if conn is None:
+                return None
+            row = conn.execute(
+                "SELECT delay FROM forecast WHERE service_date = ? AND train_id = ? "
+                "AND pre_station = ? AND next_station = ? AND model_version = ?",
+                (service_date.isoformat(), train_id, pre_station, next_station, model_version)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"查询预计算结果失败: {e}")
+            self._local.conn = None
+            return None
+
+        metrics.inc("forecast.hits" if row else "forecast.misses")
+        return row[0] if row else None
+
+    def connect_writer(self) -> sqlite3.Connection:
+        """批处理写连接（WAL 模式，写入期间 API 仍可读取上一版结果）"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(_SCHEMA)
+        return conn
+
+    @staticmethod
+    def write(conn: sqlite3.Connection, service_date: date, model_version: str,
+              rows: Iterable[Tuple[str, str, str, datetime, float]]) -> int:
+        """写入一批 (车次, 出发站, 到达站, 出发时间, 晚点) 结果，返回写入行数"""
+        created_at = datetime.now().isoformat(timespec='seconds')
+        day = service_date.isoformat()
+        records = [(day, train_id, pre_station, next_station, departure.isoformat(sep=' '), float(delay),
+                    model_version, created_at)
+                   for train_id, pre_station, next_station, departure, delay in rows]
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO forecast VALUES (?, ?, ?, ?, ?, ?, ?, ?)", records)
+        return len(records)
+
+    @staticmethod
+    def prune(conn: sqlite3.Connection, before: date) -> int:
+        """删除 before 之前运行日期的结果"""
+        with conn:
+            cur = conn.execute("DELETE FROM forecast WHERE service_date < ?", (before.isoformat(),))
+        return cur.rowcount
+
+
+# 全局预计算结果库
+forecast_store = ForecastStore(FORECAST_DB)
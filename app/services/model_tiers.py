@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import torch
+
+from app.core.metrics import metrics
+from app.services.train_delay import cpu_tuning
+from app.services.train_delay.data_loader import collate_fn, length_buckets
+from app.services.train_delay.models import LSTM_baseline
+from app.services.train_delay.model_registry import SERVING_BATCH_SIZE
+from app.services.train_delay.predict_delay_api import WEIGHTS_DIR, config
+
+# 负载升高时使用的轻量模型（LSTM 基线），为空表示不启用，直接由 DeepTTE 降级到启发式估计
+LITE_MODEL = os.getenv('LITE_MODEL', 'lstm_baseline_lstm_baseline_log_2025-06-26_224441.608750_update3')
+
+# 降级阈值：进行中的推理数（排队深度）或最近窗口内推理耗时 P99（毫秒）达到阈值时降级
+TIER_LITE_INFLIGHT = int(os.getenv('TIER_LITE_INFLIGHT', '4'))
+TIER_HEURISTIC_INFLIGHT = int(os.getenv('TIER_HEURISTIC_INFLIGHT', '16'))
+TIER_LITE_P99_MS = float(os.getenv('TIER_LITE_P99_MS', '500'))
+TIER_HEURISTIC_P99_MS = float(os.getenv('TIER_HEURISTIC_P99_MS', '2000'))
+# P99 统计窗口（秒）；降级后至少保持 TIER_RECOVER_SECONDS 秒再回升，避免在阈值附近来回切换
+TIER_WINDOW_SECONDS = float(os.getenv('TIER_WINDOW_SECONDS', '30'))
+TIER_RECOVER_SECONDS = float(os.getenv('TIER_RECOVER_SECONDS', '10'))
+
+# 由重到轻的模型层级
+TIERS = ('deeptte', 'lite', 'heuristic')
+
+
+class LiteModel:
+    """轻量模型的推理封装，输入与 DeepTTE_nextstop 相同（collate_fn 的原始数据）"""
+
+    def __init__(self, name: str, path: str, config: Dict[str, Any]):
+        self.name = name
+        self.config = config
+        self.model = LSTM_baseline.Net()
+        self.model.load_state_dict(torch.load(path, map_location='cpu'))
+        self.model.eval()
+
+    @torch.no_grad()
+    def predict(self, batch: List[Dict[str, Any]]) -> List[float]:
+        """按轨迹长度分桶批量推理，返回与输入顺序一致的预测（分钟），无法预测的为 NaN"""
+        results = [0.0] * len(batch)
+        for bucket in length_buckets([len(item['lngs']) for item in batch], SERVING_BATCH_SIZE):
+            attr, traj = collate_fn([batch[i] for i in bucket])
+            with cpu_tuning.autocast():
+                preds = self.model.predict(attr, traj, self.config)
+            for i, p in zip(bucket, preds.tolist()):
+                results[i] = p
+        return results
+
+
+class TierController:
+    """
+    按负载选择模型层级
+
+    enter() 在每次推理前调用，根据进行中的推理数和最近 TIER_WINDOW_SECONDS 秒的推理耗时 P99
+    选出层级（DeepTTE -> 轻量模型 -> 启发式）；exit() 记录耗时并减少进行中的推理数。
+    负载升高时立即降级；负载回落后，距上次降级满 TIER_RECOVER_SECONDS 秒才回升。
+    """
+
+    def __init__(self, lite_available: bool):
+        self.lite_available = lite_available
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._latencies = deque()  # (结束时间, 耗时秒)
+        self._level = 0
+        self._degraded_at = 0.0
+        metrics.set_gauge("tier.inflight", lambda: self._inflight)
+        metrics.set_gauge("tier.current", lambda: TIERS[self._level])
+        metrics.set_gauge("tier.p99_ms", lambda: self.p99() * 1000)
+
+    def p99(self) -> float:
+        with self._lock:
+            self._expire(time.time())
+            values = sorted(seconds for _, seconds in self._latencies)
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(len(values) * 0.99))]
+
+    def _expire(self, now: float) -> None:
+        while self._latencies and self._latencies[0][0] < now - TIER_WINDOW_SECONDS:
+            self._latencies.popleft()
+
+    def _target_level(self, inflight: int, p99_ms: float) -> int:
+        if inflight >= TIER_HEURISTIC_INFLIGHT or p99_ms >= TIER_HEURISTIC_P99_MS:
+            return 2
+        if inflight >= TIER_LITE_INFLIGHT or p99_ms >= TIER_LITE_P99_MS:
+            return 1 if self.lite_available else 2
+        return 0
+
+    def enter(self) -> str:
+        """选择本次推理的层级，并计入进行中的推理数"""
+        p99_ms = self.p99() * 1000
+        with self._lock:
+            now = time.time()
+            target = self._target_level(self._inflight, p99_ms)
+            if target > self._level:
+                print(f"负载升高（进行中 {self._inflight}，P99 {p99_ms:.0f}ms），模型层级 {TIERS[self._level]} -> {TIERS[target]}")
+                self._level = target
+                self._degraded_at = now
+                metrics.inc("tier.degrade")
+            elif target < self._level and now - self._degraded_at >= TIER_RECOVER_SECONDS:
+                print(f"负载回落，模型层级 {TIERS[self._level]} -> {TIERS[target]}")
+                self._level = target
+            self._inflight += 1
+            return TIERS[self._level]
+
+    def exit(self, tier: str, seconds: float) -> None:
+        metrics.observe(f"tier.{tier}", seconds)
+        metrics.inc(f"tier.{tier}.requests")
+        with self._lock:
+            self._inflight -= 1
+            now = time.time()
+            self._latencies.append((now, seconds))
+            self._expire(now)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'tier': TIERS[self._level],
+            'inflight': self._inflight,
+            'p99_ms': round(self.p99() * 1000, 1),
+            'lite_model': lite_model.name if lite_model is not None else None,
+        }
+
+
+def _load_lite_model() -> Optional[LiteModel]:
+    if not LITE_MODEL:
+        return None
+    try:
+        model = LiteModel(LITE_MODEL, os.path.join(WEIGHTS_DIR, LITE_MODEL), config)
+        print(f"轻量模型 {LITE_MODEL} 加载完成")
+        return model
+    except Exception as e:
+        print(f"轻量模型 {LITE_MODEL} 加载失败，高负载时直接使用启发式估计: {e}")
+        return None
+
+
+# 全局实例
+lite_model = _load_lite_model()
+tier_controller = TierController(lite_model is not None)
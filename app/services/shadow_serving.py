@@ -0,0 +1,168 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import ujson
+
+from app.core.metrics import metrics
+from app.services.train_delay.data_loader import collate_fn, length_buckets
+from app.services.train_delay.model_registry import SERVING_BATCH_SIZE
+
+# 逐模型预测日志目录（<模型版本>.jsonl），为空表示不写日志
+PREDICTION_LOG_DIR = os.getenv(
+    'PREDICTION_LOG_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'prediction_logs')
+)
+
+# 后台排队中的影子批次上限，超过时丢弃新批次，避免影子推理积压拖慢应答
+SHADOW_MAX_PENDING = int(os.getenv('SHADOW_MAX_PENDING', '16'))
+
+# 预测目标：(车次, 运行日期, 目标站点)
+Target = Tuple[str, date, str]
+
+
+class OnlineComparison:
+    """
+    各模型预测与实际晚点的在线对比
+
+    预测时按 (车次, 运行日期, 目标站点) 暂存每个模型的预测值；
+    delay_buffer 收到该站的到站报告后，为每个模型累计误差并移除暂存项。
+    暂存项按 LRU 淘汰，最多 max_pending 个目标。
+    """
+
+    def __init__(self, max_pending: int = 100000):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._pending: "OrderedDict[Target, Dict[str, float]]" = OrderedDict()
+        # 模型版本 -> [样本数, 绝对误差和, 平方误差和, 误差和]
+        self._errors: Dict[str, List[float]] = {}
+        metrics.set_gauge("shadow.pending_targets", lambda: len(self._pending))
+
+    def record(self, model: str, targets: Sequence[Target], preds: Sequence[float]) -> None:
+        with self._lock:
+            for target, pred in zip(targets, preds):
+                if not math.isfinite(pred):
+                    continue
+                entry = self._pending.get(target)
+                if entry is None:
+                    entry = self._pending[target] = {}
+                    if len(self._pending) > self.max_pending:
+                        self._pending.popitem(last=False)
+                entry[model] = pred
+
+    def observe(self, train_id: str, service_date: date, station: str, delay: float,
+                observed_at: datetime) -> None:
+        """delay_buffer 的到站观测回调"""
+        with self._lock:
+            entry = self._pending.pop((train_id, service_date, station), None)
+            if entry is None:
+                return
+            for model, pred in entry.items():
+                err = pred - delay
+                stats = self._errors.setdefault(model, [0, 0.0, 0.0, 0.0])
+                stats[0] += 1
+                stats[1] += abs(err)
+                stats[2] += err * err
+                stats[3] += err
+        metrics.inc("shadow.matched")
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            errors = {k: list(v) for k, v in self._errors.items()}
+        return {
+            model: {'n': int(n), 'mae': abs_sum / n, 'rmse': (sq_sum / n) ** 0.5, 'bias': err_sum / n}
+            for model, (n, abs_sum, sq_sum, err_sum) in errors.items() if n
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+            self._errors.clear()
+
+
+class PredictionLog:
+    """逐模型追加写入的预测日志（JSON 行），只在影子线程中写入"""
+
+    def __init__(self, log_dir: str):
+        self.log_dir = os.path.abspath(log_dir) if log_dir else None
+        self._files: Dict[str, Any] = {}
+
+    def write(self, model: str, served: bool, targets: Sequence[Target], preds: Sequence[float]) -> None:
+        if self.log_dir is None:
+            return
+        f = self._files.get(model)
+        if f is None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            f = self._files[model] = open(os.path.join(self.log_dir, model + '.jsonl'), 'a', encoding='utf-8')
+        ts = datetime.now().isoformat(timespec='seconds')
+        f.write(''.join(ujson.dumps({'ts': ts, 'train_id': train_id, 'service_date': service_date.isoformat(),
+                                     'station': station, 'pred': pred, 'served': served}) + '\n'
+                        for (train_id, service_date, station), pred in zip(targets, preds)))
+        f.flush()
+
+
+class ShadowRunner:
+    """
+    影子 / A/B 对比推理
+
+    应答版本照常同步推理并返回；submit 把同一批模型输入交给后台单线程：
+    只 collate 一次（按长度分桶），其余每个已加载版本在这些 batch 上各做一次前向，
+    然后写入各模型的预测日志和在线对比。后台积压超过 SHADOW_MAX_PENDING 个批次时丢弃新批次。
+    """
+
+    def __init__(self, registry, comparison: OnlineComparison, log: PredictionLog,
+                 max_pending: int = SHADOW_MAX_PENDING):
+        self.registry = registry
+        self.comparison = comparison
+        self.log = log
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow')
+        metrics.set_gauge("shadow.queue", lambda: self._pending)
+
+    def submit(self, served, targets: Sequence[Target], model_inputs: List[Dict[str, Any]],
+               served_preds: Sequence[float]) -> bool:
+        """提交一批已应答的预测，返回是否已排队"""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                metrics.inc("shadow.dropped")
+                return False
+            self._pending += 1
+        self._executor.submit(self._run, served, list(targets), list(model_inputs), list(served_preds))
+        return True
+
+    def _run(self, served, targets, model_inputs, served_preds) -> None:
+        try:
+            self.comparison.record(served.name, targets, served_preds)
+            self.log.write(served.name, True, targets, served_preds)
+
+            others = self.registry.comparison_versions(served)
+            if not others:
+                return
+            buckets = length_buckets([len(item['lngs']) for item in model_inputs], SERVING_BATCH_SIZE)
+            collated = [(bucket, collate_fn([model_inputs[i] for i in bucket])) for bucket in buckets]
+            for version in others:
+                start = time.time()
+                preds = [0.0] * len(model_inputs)
+                for bucket, (attr, traj) in collated:
+                    for i, p in zip(bucket, version.run_collated(attr, traj)):
+                        preds[i] = p
+                metrics.observe(f"shadow.{version.name}", time.time() - start)
+                self.comparison.record(version.name, targets, preds)
+                self.log.write(version.name, False, targets, preds)
+        except Exception as e:
+            metrics.inc("shadow.errors")
+            print(f"影子推理失败: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """等待已排队的影子批次完成（测试与关闭时使用）"""
+        self._executor.submit(lambda: None).result(timeout)
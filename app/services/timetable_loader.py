@@ -0,0 +1,292 @@
+"""
+时刻表 CSV 批量导入与 test3 按日分区管理
+
+test3 按 departure_time 的日期做 RANGE 分区（migrations/002_test3_partitioning.sql）：
+每天一个分区 pYYYYMMDD，另有保存更早数据的 p_start 和兜底的 p_future (MAXVALUE)。
+
+用法:
+    python -m app.services.timetable_loader load app/services/train_delay/data/1111.csv  # 导入，自动补齐所需的日分区
+    python -m app.services.timetable_loader load --method insert --chunk 20000 timetable_0723.csv
+    python -m app.services.timetable_loader ensure --until 2025-08-31            # 预先创建日分区
+    python -m app.services.timetable_loader drop --before 2025-07-01             # 删除该日期之前的分区（瞬时，需确认）
+    python -m app.services.timetable_loader partitions                           # 各分区行数
+    python -m app.services.timetable_loader --dry-run drop --before 2025-07-01   # 只打印将执行的 DDL / 导入语句
+
+load / ensure / drop 加 --dry-run 时只查询分区信息、打印将要执行的语句（参数已代入），不修改数据库。
+drop 删除的数据无法恢复：执行前列出待删除分区及行数并要求输入 yes 确认，--yes 跳过确认（定时任务使用）。
+
+CSV 首行为列名，需包含 train_ID,station,arrival_time,departure_time（顺序不限，多余列忽略）。
+导入方式：
+- load-data: LOAD DATA LOCAL INFILE，服务端需开启 local_infile
+- insert: 分块的多行 INSERT，每块一个事务
+- auto（默认）: 先尝试 load-data，服务端不允许时改用 insert
+新增行由各 worker 的 TimetableSync 增量同步到内存时刻表（按 updated_at 或自增 id）；删除的分区在 worker 重启前仍留在内存中。
+"""
+import argparse
+import csv
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Set, Tuple
+
+import pymysql
+
+from app.core.database import DatabaseConfig
+
+TABLE = 'test3'
+COLUMNS = ['train_ID', 'station', 'arrival_time', 'departure_time']
+DEFAULT_CHUNK = 10000
+
+
+def connect(local_infile: bool = False):
+    config = DatabaseConfig.get_db_config()
+    config['autocommit'] = False
+    return pymysql.connect(**config, local_infile=local_infile)
+
+
+def partition_name(day: date) -> str:
+    return f"p{day:%Y%m%d}"
+
+
+def list_partitions(cursor) -> List[Tuple[str, Optional[str], int]]:
+    """[(分区名, 上界表达式, 行数估计)]，按位置排序；表未分区时返回空列表"""
+    cursor.execute(
+        "SELECT partition_name, partition_description, table_rows FROM information_schema.partitions "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL "
+        "ORDER BY partition_ordinal_position", (TABLE,))
+    return [(name, description, int(rows or 0)) for name, description, rows in cursor.fetchall()]
+
+
+def _day_of(name: str) -> Optional[date]:
+    try:
+        return datetime.strptime(name[1:], '%Y%m%d').date()
+    except ValueError:
+        return None
+
+
+def _bound_day(description: str) -> date:
+    """分区上界 TO_DAYS(d) 的值 -> d（MySQL 的 TO_DAYS 比 Python 的 toordinal 大 365）"""
+    return date.fromordinal(int(description) - 365)
+
+
+def _execute(cursor, sql: str, params=None, dry_run: bool = False) -> None:
+    """执行修改数据库的语句；dry_run 时只打印代入参数后的语句"""
+    if dry_run:
+        print(f"[dry-run] {cursor.mogrify(sql, params)};")
+    else:
+        cursor.execute(sql, params)
+
+
+def ensure_partitions(cursor, days: Iterable[date], dry_run: bool = False) -> List[str]:
+    """
+    从 p_future 拆分出日分区，覆盖到 days 中的最大日期，返回新建（dry_run 时为将要新建）的分区名
+    新分区从已有分区的上界连续补齐，保证每天一个分区；更早的日期落在已有分区中
+    """
+    partitions = list_partitions(cursor)
+    if not partitions:
+        print(f"{TABLE} 未分区，跳过分区管理（先执行 migrations/002_test3_partitioning.sql）")
+        return []
+    bounds = [_bound_day(description) for _, description, _ in partitions if description != 'MAXVALUE']
+    wanted = max(days, default=None)
+    if wanted is None or (bounds and wanted < max(bounds)):
+        return []
+    first = max(bounds) if bounds else wanted
+    new_days = [first + timedelta(days=i) for i in range((wanted - first).days + 1)]
+
+    definitions = ', '.join(
+        f"PARTITION {partition_name(d)} VALUES LESS THAN (TO_DAYS('{d + timedelta(days=1)}'))" for d in new_days)
+    _execute(cursor, f"ALTER TABLE {TABLE} REORGANIZE PARTITION p_future INTO "
+                     f"({definitions}, PARTITION p_future VALUES LESS THAN MAXVALUE)", dry_run=dry_run)
+    return [partition_name(d) for d in new_days]
+
+
+def partitions_before(cursor, before: date) -> List[Tuple[str, int]]:
+    """日期早于 before 的日分区 [(分区名, 行数估计)]（p_start / p_future 不计入）"""
+    return [(name, rows) for name, _, rows in list_partitions(cursor)
+            if _day_of(name) is not None and _day_of(name) < before]
+
+
+def drop_partitions(cursor, names: List[str], dry_run: bool = False) -> List[str]:
+    """删除指定的日分区，返回删除（dry_run 时为将要删除）的分区名；DROP PARTITION 不逐行删除，瞬时完成，数据不可恢复"""
+    if names:
+        _execute(cursor, f"ALTER TABLE {TABLE} DROP PARTITION {', '.join(names)}", dry_run=dry_run)
+    return names
+
+
+def scan_csv(path: str) -> Tuple[List[str], Set[date], int, str]:
+    """读取列名，统计行数和出现的出发日期，并识别换行符"""
+    with open(path, 'rb') as f:
+        newline = '\r\n' if f.readline().endswith(b'\r\n') else '\n'
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = [h.strip() for h in next(reader)]
+        missing = [c for c in COLUMNS if c not in header]
+        if missing:
+            raise ValueError(f"{path}: 缺少列 {missing}")
+        dep = header.index('departure_time')
+        days, rows = set(), 0
+        for row in reader:
+            if row:
+                days.add(datetime.strptime(row[dep][:10], '%Y-%m-%d').date())
+                rows += 1
+    return header, days, rows, newline
+
+
+def load_data_infile(cursor, path: str, header: List[str], source: str, newline: str = '\n',
+                     dry_run: bool = False) -> int:
+    """LOAD DATA LOCAL INFILE 导入，返回导入行数（dry_run 时为 0）"""
+    targets = ', '.join(h if h in COLUMNS else '@skip' for h in header)
+    _execute(cursor,
+             f"LOAD DATA LOCAL INFILE %s INTO TABLE {TABLE} CHARACTER SET utf8mb4 "
+             f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' LINES TERMINATED BY %s IGNORE 1 LINES "
+             f"({targets}) SET source_table = %s",
+             (os.path.abspath(path), newline, source), dry_run=dry_run)
+    return 0 if dry_run else cursor.rowcount
+
+
+def insert_chunks(conn, path: str, header: List[str], source: str, chunk: int) -> int:
+    """分块多行 INSERT 导入（pymysql 的 executemany 会合并为多行 VALUES），返回导入行数"""
+    idx = [header.index(c) for c in COLUMNS]
+    sql = f"INSERT INTO {TABLE} ({', '.join(COLUMNS)}, source_table) VALUES (%s, %s, %s, %s, %s)"
+    total = 0
+    with open(path, 'r', encoding='utf-8', newline='') as f, conn.cursor() as cursor:
+        reader = csv.reader(f)
+        next(reader)
+        batch = []
+        for row in reader:
+            if not row:
+                continue
+            batch.append(tuple(row[i] for i in idx) + (source,))
+            if len(batch) >= chunk:
+                cursor.executemany(sql, batch)
+                conn.commit()
+                total += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+            conn.commit()
+            total += len(batch)
+    return total
+
+
+def _preview_insert(cursor, path: str, header: List[str], source: str) -> None:
+    """dry_run 时打印 insert 方式的语句（只代入第一行数据）"""
+    idx = [header.index(c) for c in COLUMNS]
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        next(reader)
+        first = next((row for row in reader if row), None)
+    if first is not None:
+        _execute(cursor, f"INSERT INTO {TABLE} ({', '.join(COLUMNS)}, source_table) VALUES (%s, %s, %s, %s, %s)",
+                 tuple(first[i] for i in idx) + (source,), dry_run=True)
+
+
+def load(paths: List[str], method: str = 'auto', chunk: int = DEFAULT_CHUNK, source: Optional[str] = None,
+         dry_run: bool = False) -> int:
+    """导入若干 CSV，返回总行数；dry_run 时只打印分区 DDL 和导入语句（insert 方式打印首行），返回 0"""
+    conn = connect(local_infile=method != 'insert')
+    total = 0
+    try:
+        for path in paths:
+            start = time.time()
+            header, days, rows, newline = scan_csv(path)
+            with conn.cursor() as cursor:
+                created = ensure_partitions(cursor, days, dry_run)
+            if created:
+                print(f"{'将新建' if dry_run else '新建'}分区 {created[0]} ... {created[-1]}（{len(created)} 个）")
+
+            tag = (source or os.path.splitext(os.path.basename(path))[0])[:10]
+            if dry_run:
+                with conn.cursor() as cursor:
+                    if method == 'insert':
+                        _preview_insert(cursor, path, header, tag)
+                    else:
+                        load_data_infile(cursor, path, header, tag, newline, dry_run=True)
+                print(f"{path}: {rows} 行，日期 {min(days) if days else '-'} ~ {max(days) if days else '-'}（未导入）")
+                continue
+            used = method
+            if method in ('auto', 'load-data'):
+                try:
+                    with conn.cursor() as cursor:
+                        loaded = load_data_infile(cursor, path, header, tag, newline)
+                    conn.commit()
+                    used = 'load-data'
+                except pymysql.err.OperationalError as e:
+                    conn.rollback()
+                    if method == 'load-data':
+                        raise
+                    print(f"LOAD DATA 不可用，改用分块 INSERT: {e}")
+                    used = 'insert'
+            if used == 'insert':
+                loaded = insert_chunks(conn, path, header, tag, chunk)
+
+            elapsed = time.time() - start
+            print(f"{path}: {loaded}/{rows} 行（{used}），{elapsed:.2f}s，{loaded / max(elapsed, 1e-9):.0f} 行/秒，"
+                  f"日期 {min(days) if days else '-'} ~ {max(days) if days else '-'}")
+            total += loaded
+    finally:
+        conn.close()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="时刻表 CSV 批量导入与分区管理")
+    parser.add_argument('--dry-run', action='store_true', help='只打印将要执行的语句，不修改数据库')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('load', help='导入 CSV')
+    p.add_argument('csv', nargs='+')
+    p.add_argument('--method', choices=['auto', 'load-data', 'insert'], default='auto')
+    p.add_argument('--chunk', type=int, default=DEFAULT_CHUNK, help='insert 方式每个事务的行数')
+    p.add_argument('--source', help='source_table 列的值，默认取文件名（最多 10 个字符）')
+
+    p = sub.add_parser('ensure', help='预先创建日分区')
+    p.add_argument('--until', required=True, help='YYYY-MM-DD（含）')
+
+    p = sub.add_parser('drop', help='删除早于指定日期的分区')
+    p.add_argument('--before', required=True, help='YYYY-MM-DD（不含）')
+    p.add_argument('--yes', action='store_true', help='不询问确认，直接删除')
+
+    sub.add_parser('partitions', help='列出分区')
+    args = parser.parse_args()
+
+    if args.command == 'load':
+        start = time.time()
+        total = load(args.csv, args.method, args.chunk, args.source, args.dry_run)
+        elapsed = time.time() - start
+        print(f"共导入 {total} 行，耗时 {elapsed:.2f}s，{total / max(elapsed, 1e-9):.0f} 行/秒")
+        return
+
+    conn = connect()
+    try:
+        with conn.cursor() as cursor:
+            if args.command == 'ensure':
+                until = datetime.strptime(args.until, '%Y-%m-%d').date()
+                created = ensure_partitions(cursor, [until], args.dry_run)
+                print(f"{'将新建' if args.dry_run else '新建'} {len(created)} 个分区"
+                      + (f": {created[0]} ... {created[-1]}" if created else ''))
+            elif args.command == 'drop':
+                targets = partitions_before(cursor, datetime.strptime(args.before, '%Y-%m-%d').date())
+                if not targets:
+                    print("没有需要删除的分区")
+                    return
+                print(f"待删除 {len(targets)} 个分区（约 {sum(rows for _, rows in targets)} 行，不可恢复）: "
+                      + ', '.join(f"{name}({rows})" for name, rows in targets))
+                names = [name for name, _ in targets]
+                if not args.dry_run and not args.yes and input("输入 yes 确认删除: ").strip() != 'yes':
+                    print("已取消")
+                    return
+                start = time.time()
+                dropped = drop_partitions(cursor, names, args.dry_run)
+                if not args.dry_run:
+                    print(f"删除 {len(dropped)} 个分区，耗时 {time.time() - start:.2f}s")
+            else:
+                for name, description, rows in list_partitions(cursor):
+                    print(f"{name:<12}{'< ' + str(description):<20}{rows:>10}")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
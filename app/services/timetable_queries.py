@@ -0,0 +1,76 @@
+"""
+预测请求中对 test3 时刻表的查询
+
+日期条件写成 departure_time 上的范围谓词（而不是 DATE(departure_time) = ?），
+以便使用 migrations/001_test3_indexes.sql 中的复合索引：
+- idx_train_departure (train_ID, departure_time, station, arrival_time)：按车次取当日站点序列、级联查询中按车次找另一站
+- idx_station_departure (station, departure_time, train_ID, arrival_time)：从事故站点出发的停站
+- idx_station_arrival (station, arrival_time, train_ID, departure_time)：到达事故站点的停站
+三个索引都包含查询用到的全部列，查询只读索引不回表。
+"""
+from datetime import datetime, timedelta
+from typing import Tuple
+
+# 与 migrations/001_test3_indexes.sql 相同的索引定义（scripts/bench_timetable_sql.py 使用）
+TEST3_INDEXES = [
+    ('idx_train_departure', 'train_ID, departure_time, station, arrival_time'),
+    ('idx_station_departure', 'station, departure_time, train_ID, arrival_time'),
+    ('idx_station_arrival', 'station, arrival_time, train_ID, departure_time'),
+]
+
+# 指定车次在指定日期出发的站点序列
+SCHEDULE_SQL = """
+    SELECT station, departure_time
+    FROM test3
+    WHERE train_ID = %s AND departure_time >= %s AND departure_time < %s
+    ORDER BY departure_time
+"""
+
+# 时间窗口内从事故站点出发或到达事故站点的车次区段。
+# 原条件 (t1.station = ? OR t2.station = ?) 跨两张表，无法用索引，拆成两个分别走站点索引的分支再 UNION 去重
+CONCURRENT_SQL = """
+    SELECT t1.train_ID, t1.station AS from_station, t1.departure_time AS from_time,
+           t2.station AS to_station, t2.arrival_time AS to_time
+    FROM test3 t1
+    JOIN test3 t2 ON t2.train_ID = t1.train_ID
+    WHERE t1.station = %s
+      AND t1.departure_time BETWEEN %s AND %s
+      AND t2.arrival_time BETWEEN %s AND %s
+      AND t1.departure_time < t2.arrival_time
+      AND t1.station != t2.station
+    UNION
+    SELECT t1.train_ID, t1.station, t1.departure_time, t2.station, t2.arrival_time
+    FROM test3 t2
+    JOIN test3 t1 ON t1.train_ID = t2.train_ID
+    WHERE t2.station = %s
+      AND t2.arrival_time BETWEEN %s AND %s
+      AND t1.departure_time BETWEEN %s AND %s
+      AND t1.departure_time < t2.arrival_time
+      AND t1.station != t2.station
+    ORDER BY from_time
+"""
+
+
+def day_range(date_str: str) -> Tuple[str, str]:
+    """"YYYY-MM-DD" -> [当日 00:00:00, 次日 00:00:00)"""
+    day = datetime.strptime(date_str, "%Y-%m-%d")
+    return day.strftime("%Y-%m-%d %H:%M:%S"), (day + timedelta(days=1)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def schedule_params(train_no: str, date_str: str) -> tuple:
+    return (train_no, *day_range(date_str))
+
+
+def concurrent_params(date_str: str, station: str, window_start: datetime, window_end: datetime) -> tuple:
+    """
+    原查询还要求 DATE(t1.departure_time) 为事故日期：把出发时间窗口与当日范围取交集
+    （窗口跨零点时只保留当日部分），到达时间窗口不变
+    """
+    day_start, day_end = day_range(date_str)
+    fmt = "%Y-%m-%d %H:%M:%S"
+    start, end = window_start.strftime(fmt), window_end.strftime(fmt)
+    # 当日最后一秒；datetime 列精度为秒，BETWEEN 上界取闭区间
+    day_last = (datetime.strptime(day_end, fmt) - timedelta(seconds=1)).strftime(fmt)
+    dep_start, dep_end = max(start, day_start), min(end, day_last)
+    return (station, dep_start, dep_end, start, end,
+            station, start, end, dep_start, dep_end)
@@ -0,0 +1,287 @@
+import numpy as np
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 时刻以 1970-01-01 起的分钟数存储（int32 可覆盖到 5000 年以后），秒数另存一列（uint8）；
+# 按时间窗口筛选和计算实际晚点时用分钟 * 60 + 秒比较，与 SQL 中的 datetime 比较一致
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+
+
+def to_epoch_minute(dt: datetime) -> int:
+    """datetime -> epoch 分钟（整数运算，比 timedelta.total_seconds 快）"""
+    return (dt.toordinal() - _EPOCH_ORDINAL) * 1440 + dt.hour * 60 + dt.minute
+
+
+def from_epoch_minute(minute: int) -> datetime:
+    """epoch 分钟 -> datetime"""
+    return _EPOCH + timedelta(minutes=int(minute))
+
+
+class TimetableStore:
+    """
+    列式（CSR）时刻表存储
+
+    - 车次、站点名称各自编码为整数 ID（train_names / station_names 为 ID -> 名称）
+    - 所有停站按 (车次, 出发时间) 排序后平铺为三个等长数组：
+      station_idx (int32)、arrival_min / departure_min (int32, epoch 分钟)、
+      arrival_sec / departure_sec (uint8, 到站 / 出发时刻的秒数)
+    - offsets[i]:offsets[i + 1] 为第 i 个车次的停站区间
+    - 同一 (车次, 站点, 出发日期) 只保留一个停站：构建和追加时后出现的行覆盖先出现的行，
+      因此时刻表的修改（原地 UPDATE 或写入新行）同步后替换原停站，而不是并存
+
+    相比每个停站一个 dict + 两个 datetime 对象，每个停站的数组部分只占 14 字节。
+    """
+
+    def __init__(self, train_names: List[str], station_names: List[str], offsets: np.ndarray,
+                 station_idx: np.ndarray, arrival_min: np.ndarray, departure_min: np.ndarray,
+                 arrival_sec: Optional[np.ndarray] = None, departure_sec: Optional[np.ndarray] = None):
+        self.train_names = train_names
+        self.station_names = station_names
+        self.train_index = {name: i for i, name in enumerate(train_names)}
+        self.station_index = {name: i for i, name in enumerate(station_names)}
+        self.offsets = offsets
+        self.station_idx = station_idx
+        self.arrival_min = arrival_min
+        self.departure_min = departure_min
+        self.arrival_sec = arrival_sec if arrival_sec is not None else np.zeros(len(station_idx), dtype=np.uint8)
+        self.departure_sec = departure_sec if departure_sec is not None else np.zeros(len(station_idx), dtype=np.uint8)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence[Any]]) -> "TimetableStore":
+        """
+        由 (train_ID, station, arrival_time, departure_time) 行构建
+        同一 (车次, 站点, 出发日期) 的多行以最后一行为准，调用方按 id（或更新时间）升序传入
+        """
+        train_index: Dict[str, int] = {}
+        station_index: Dict[str, int] = {}
+        # array.array 追加时不保留 Python int 对象，大表构建时的峰值内存和耗时都更低
+        train_codes, station_codes = array('i'), array('i')
+        arrivals, departures, arrival_secs, departure_secs = array('i'), array('i'), array('B'), array('B')
+
+        for train_id, station, arrival_time, departure_time in rows:
+            train_codes.append(train_index.setdefault(train_id, len(train_index)))
+            station_codes.append(station_index.setdefault(station, len(station_index)))
+            arrivals.append(to_epoch_minute(arrival_time))
+            arrival_secs.append(arrival_time.second)
+            departures.append(to_epoch_minute(departure_time))
+            departure_secs.append(departure_time.second)
+
+        return cls._from_codes(
+            train_names=list(train_index),
+            station_names=list(station_index),
+            train_codes=np.frombuffer(train_codes, dtype=np.int32),
+            station_codes=np.frombuffer(station_codes, dtype=np.int32),
+            arrival_min=np.frombuffer(arrivals, dtype=np.int32),
+            departure_min=np.frombuffer(departures, dtype=np.int32),
+            arrival_sec=np.frombuffer(arrival_secs, dtype=np.uint8),
+            departure_sec=np.frombuffer(departure_secs, dtype=np.uint8),
+        )
+
+    @classmethod
+    def _from_codes(cls, train_names: List[str], station_names: List[str], train_codes: np.ndarray,
+                    station_codes: np.ndarray, arrival_min: np.ndarray,
+                    departure_min: np.ndarray, arrival_sec: np.ndarray,
+                    departure_sec: np.ndarray) -> "TimetableStore":
+        """由未排序的编码数组构建 CSR 布局，同一 (车次, 站点, 出发日期) 保留最后出现的停站"""
+        train_codes, station_codes, arrival_min, departure_min, arrival_sec, departure_sec = cls._latest_stops(
+            train_codes, station_codes, arrival_min, departure_min, arrival_sec, departure_sec)
+        # 先按车次、再按出发时间排序（lexsort 以最后一个键为主键，且为稳定排序）
+        order = np.lexsort((departure_sec, departure_min, train_codes))
+
+        counts = np.bincount(train_codes, minlength=len(train_names))
+        offsets = np.zeros(len(train_names) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        return cls(
+            train_names=train_names,
+            station_names=station_names,
+            offsets=offsets,
+            station_idx=station_codes[order],
+            arrival_min=arrival_min[order],
+            departure_min=departure_min[order],
+            arrival_sec=arrival_sec[order],
+            departure_sec=departure_sec[order],
+        )
+
+    @staticmethod
+    def _latest_stops(train_codes: np.ndarray, station_codes: np.ndarray, *columns: np.ndarray) -> tuple:
+        """按 (车次, 站点, 出发日期) 去重，保留每组最后出现的停站，其余数组按相同下标筛选"""
+        if len(train_codes) == 0:
+            return (train_codes, station_codes) + columns
+        departure_day = columns[1].astype(np.int64) // 1440
+        keys = (train_codes.astype(np.int64) << 40) | (station_codes.astype(np.int64) << 20) | departure_day
+        _, first_in_reversed = np.unique(keys[::-1], return_index=True)
+        if len(first_in_reversed) == len(keys):
+            return (train_codes, station_codes) + columns
+        keep = np.sort(len(keys) - 1 - first_in_reversed)
+        return tuple(column[keep] for column in (train_codes, station_codes) + columns)
+
+    def extend(self, rows: Iterable[Sequence[Any]]) -> "TimetableStore":
+        """
+        追加或更新若干 (train_ID, station, arrival_time, departure_time) 行，返回新实例
+        与已有停站的 (车次, 站点, 出发日期) 相同时替换该停站（新行之间以后出现的为准）
+        原实例保持不变，调用方可直接替换引用，正在读取旧实例的请求不受影响
+        """
+        added = TimetableStore.from_rows(rows)
+        if added.num_stops == 0:
+            return self
+
+        train_names = list(self.train_names)
+        train_index = dict(self.train_index)
+        train_map = np.asarray([train_index.setdefault(name, len(train_index)) for name in added.train_names],
+                               dtype=np.int32)
+        train_names.extend(name for name in added.train_names if train_index[name] >= len(self.train_names))
+
+        station_names = list(self.station_names)
+        station_index = dict(self.station_index)
+        station_map = np.asarray([station_index.setdefault(name, len(station_index)) for name in added.station_names],
+                                 dtype=np.int32)
+        station_names.extend(name for name in added.station_names if station_index[name] >= len(self.station_names))
+
+        return TimetableStore._from_codes(
+            train_names=train_names,
+            station_names=station_names,
+            train_codes=np.concatenate((self.stop_train_idx(), train_map[added.stop_train_idx()])),
+            station_codes=np.concatenate((self.station_idx, station_map[added.station_idx])),
+            arrival_min=np.concatenate((self.arrival_min, added.arrival_min)),
+            departure_min=np.concatenate((self.departure_min, added.departure_min)),
+            arrival_sec=np.concatenate((self.arrival_sec, added.arrival_sec)),
+            departure_sec=np.concatenate((self.departure_sec, added.departure_sec)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.train_names)
+
+    def __contains__(self, train_id: str) -> bool:
+        return train_id in self.train_index
+
+    @property
+    def num_stops(self) -> int:
+        return int(self.station_idx.size)
+
+    def nbytes(self) -> int:
+        """数组部分占用的字节数（不含名称表）"""
+        return int(self.offsets.nbytes + self.station_idx.nbytes
+                   + self.arrival_min.nbytes + self.departure_min.nbytes
+                   + self.arrival_sec.nbytes + self.departure_sec.nbytes)
+
+    def stop_range(self, train_id: str) -> Tuple[int, int]:
+        """车次停站在平铺数组中的 [start, end) 区间，车次不存在时返回空区间"""
+        i = self.train_index.get(train_id)
+        if i is None:
+            return 0, 0
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def station_sequence(self, train_id: str) -> List[str]:
+        """车次按出发时间排序的站点序列"""
+        start, end = self.stop_range(train_id)
+        names = self.station_names
+        return [names[s] for s in self.station_idx[start:end].tolist()]
+
+    def scheduled_arrival(self, train_id: str, station: str, day: date) -> Optional[datetime]:
+        """车次在指定日期到达某站的计划时刻（保留秒数），找不到时返回 None"""
+        s = self.station_index.get(station)
+        if s is None:
+            return None
+        start, end = self.stop_range(train_id)
+        day_start = to_epoch_minute(datetime(day.year, day.month, day.day))
+        arrivals = self.arrival_min[start:end]
+        hits = np.flatnonzero((self.station_idx[start:end] == s)
+                              & (arrivals >= day_start) & (arrivals < day_start + 1440))
+        if hits.size == 0:
+            return None
+        k = start + int(hits[0])
+        return self._arrival_time(k)
+
+    def _arrival_time(self, k: int) -> datetime:
+        return from_epoch_minute(self.arrival_min[k]) + timedelta(seconds=int(self.arrival_sec[k]))
+
+    def _departure_time(self, k: int) -> datetime:
+        return from_epoch_minute(self.departure_min[k]) + timedelta(seconds=int(self.departure_sec[k]))
+
+    def terminal_station(self, train_id: str, day: date) -> Optional[str]:
+        """车次在指定日期运行的终点站，找不到时返回 None"""
+        start, end = self.stop_range(train_id)
+        day_start = to_epoch_minute(datetime(day.year, day.month, day.day))
+        departures = self.departure_min[start:end]
+        hits = np.flatnonzero((departures >= day_start) & (departures < day_start + 1440))
+        if hits.size == 0:
+            return None
+        return self.station_names[self.station_idx[start + hits[-1]]]
+
+    def day_sections(self, day: date) -> List[Tuple[str, str, str, datetime]]:
+        """指定日期内各车次相邻两站组成的区间 (车次, 出发站, 到达站, 出发时刻)"""
+        day_start = to_epoch_minute(datetime(day.year, day.month, day.day))
+        stops = np.flatnonzero((self.departure_min >= day_start) & (self.departure_min < day_start + 1440))
+        if stops.size < 2:
+            return []
+        train_of = self.stop_train_idx()
+        pre, nxt = stops[:-1], stops[1:]
+        pairs = (nxt == pre + 1) & (train_of[pre] == train_of[nxt])
+        pre, nxt = pre[pairs], nxt[pairs]
+
+        trains, stations = self.train_names, self.station_names
+        return [(trains[t], stations[a], stations[b], from_epoch_minute(d))
+                for t, a, b, d in zip(train_of[pre].tolist(), self.station_idx[pre].tolist(),
+                                      self.station_idx[nxt].tolist(), self.departure_min[pre].tolist())]
+
+    def day_schedule(self, train_id: str, day: date) -> List[Tuple[str, datetime]]:
+        """车次在指定日期出发的停站 (站点, 出发时刻)，按出发时间排序"""
+        start, end = self.stop_range(train_id)
+        day_start = to_epoch_minute(datetime(day.year, day.month, day.day))
+        departures = self.departure_min[start:end]
+        hits = np.flatnonzero((departures >= day_start) & (departures < day_start + 1440))
+        return [(self.station_names[self.station_idx[start + k]], self._departure_time(start + k))
+                for k in hits.tolist()]
+
+    def trips_between(self, day: date, start: datetime, end: datetime,
+                      station: str) -> List[Tuple[str, str, datetime, str, datetime]]:
+        """
+        时间窗口内经过某站的车次区段 (车次, 出发站, 出发时刻, 到达站, 到达时刻)，按出发时刻排序
+        与 algorithm 中并发列车查询的条件相同：同一车次的两个停站，出发站在指定日期且窗口内出发、
+        到达站在窗口内到达，出发早于到达、两站不同，且其中一站为指定站点
+        """
+        s = self.station_index.get(station)
+        if s is None:
+            return []
+        day_start = to_epoch_minute(datetime(day.year, day.month, day.day)) * 60
+        lo, hi = to_epoch_minute(start) * 60 + start.second, to_epoch_minute(end) * 60 + end.second
+        # 先按分钟粗筛，再对候选停站按秒比较
+        departs = np.flatnonzero((self.departure_min >= max(lo, day_start) // 60)
+                                 & (self.departure_min <= min(hi, day_start + 86399) // 60))
+        departure_s = self.departure_min[departs].astype(np.int64) * 60 + self.departure_sec[departs]
+        departs = departs[(departure_s >= max(lo, day_start)) & (departure_s <= min(hi, day_start + 86399))]
+        arrives = np.flatnonzero((self.arrival_min >= lo // 60) & (self.arrival_min <= hi // 60))
+        arrival_s = self.arrival_min[arrives].astype(np.int64) * 60 + self.arrival_sec[arrives]
+        arrives = arrives[(arrival_s >= lo) & (arrival_s <= hi)]
+        if departs.size == 0 or arrives.size == 0:
+            return []
+
+        trips = []
+        trains, stations = self.train_names, self.station_names
+        for a, t in zip(departs.tolist(), (np.searchsorted(self.offsets, departs, side='right') - 1).tolist()):
+            candidates = arrives[(arrives >= self.offsets[t]) & (arrives < self.offsets[t + 1])]
+            sa, dep = self.station_idx[a], self._departure_time(a)
+            for b in candidates.tolist():
+                sb = self.station_idx[b]
+                arr = self._arrival_time(b)
+                if dep < arr and sa != sb and s in (sa, sb):
+                    trips.append((trains[t], stations[sa], dep, stations[sb], arr))
+        trips.sort(key=lambda trip: trip[2])
+        return trips
+
+    def stop_train_idx(self) -> np.ndarray:
+        """每个停站所属车次 ID（按需展开 CSR，用于全表向量化扫描）"""
+        return np.repeat(np.arange(len(self.train_names), dtype=np.int32), np.diff(self.offsets))
+
+    def departures_between(self, start: datetime, end: datetime, station: Optional[str] = None) -> np.ndarray:
+        """出发时间落在 [start, end] 内（可限定站点）的停站下标"""
+        mask = (self.departure_min >= to_epoch_minute(start)) & (self.departure_min <= to_epoch_minute(end))
+        if station is not None:
+            s = self.station_index.get(station)
+            if s is None:
+                return np.empty(0, dtype=np.int64)
+            mask &= self.station_idx == s
+        return np.flatnonzero(mask)
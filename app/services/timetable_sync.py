@@ -0,0 +1,150 @@
+import threading
+import time
+from typing import Dict, Optional
+
+from app.core.database import DatabaseConnection
+from app.core.metrics import metrics
+
+
+class TimetableSync:
+    """
+    参考数据增量同步
+
+    DataInputUtils 在初始化时一次性加载 test3 / data_adj / jinghu_station / train_number，
+    并记录每张表已加载的最大自增 id（高水位）。本类在后台线程中定期只查询 id 大于高水位的新行，
+    在新对象上合并后整体替换 DataInputUtils 上的引用：
+    - 替换是单次属性赋值，读请求无需加锁，已取得旧引用的请求继续使用旧数据
+    - 同步使用独立的数据库连接，不与请求线程共用连接
+
+    test3 执行过 migrations/004（有 updated_at 列）时改为按 (updated_at, id) 高水位同步，原地 UPDATE 的修改也会同步；
+    同步的时刻表行在 TimetableStore 中按 (车次, 站点, 出发日期) 替换原停站。未迁移时只能同步新增行（修改需以新行写入）。
+    其余几张表只有自增主键、没有更新时间列，只同步新增行。
+    weather_observation（各站天气观测）在初始加载成功时一并按高水位同步，写入天气特征索引。
+    """
+
+    def __init__(self, data_utils, interval: float = 60.0):
+        self.data_utils = data_utils
+        self.interval = interval
+        self.db = DatabaseConnection(max_retries=1, retry_delay=0)
+        # DataInputUtils 刚完成全量加载，视为一次成功同步
+        self.last_success: Optional[float] = time.time()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        metrics.set_gauge("timetable_sync.lag_seconds", self.lag_seconds)
+        for table in ("test3", "data_adj", "jinghu_station", "train_number", "weather_observation"):
+            metrics.set_gauge(f"timetable_sync.watermark.{table}",
+                              lambda table=table: self.data_utils.watermarks.get(table, 0))
+
+    def lag_seconds(self) -> Optional[float]:
+        """距离上次成功同步的秒数；从未成功时为 None"""
+        if self.last_success is None:
+            return None
+        return round(time.time() - self.last_success, 3)
+
+    def _fetch(self, table: str, columns: str):
+        """查询某表 id 大于高水位的新行，返回 (id, ...) 元组列表"""
+        watermark = self.data_utils.watermarks.get(table, 0)
+        sql = f"SELECT id, {columns} FROM {table} WHERE id > %s ORDER BY id"
+        return self.db.execute_with_retry(sql, (watermark,))
+
+    def _fetch_updated(self, table: str, columns: str):
+        """
+        查询某表 (updated_at, id) 大于更新时间高水位的行，返回 (id, ..., updated_at) 元组列表，按更新时间升序
+        在高水位之后才提交、但 updated_at 早于高水位的事务中的行会被跳过，修改时刻表的事务应尽量短
+        """
+        updated_at, last_id = self.data_utils.updated_watermarks[table]
+        sql = (f"SELECT id, {columns}, updated_at FROM {table} "
+               f"WHERE updated_at >= %s AND (updated_at > %s OR id > %s) ORDER BY updated_at, id")
+        return self.db.execute_with_retry(sql, (updated_at, updated_at, last_id))
+
+    def _advance(self, table: str, rows) -> None:
+        """应用完成后推进高水位并累计同步行数"""
+        utils = self.data_utils
+        if table in utils.updated_watermarks:
+            utils.updated_watermarks[table] = (rows[-1][-1], rows[-1][0])
+            utils.watermarks[table] = max(utils.watermarks.get(table, 0), max(row[0] for row in rows))
+        else:
+            utils.watermarks[table] = rows[-1][0]
+        metrics.inc(f"timetable_sync.rows.{table}", len(rows))
+
+    def sync_once(self) -> Dict[str, int]:
+        """执行一轮增量同步，返回各表应用的行数"""
+        start = time.time()
+        utils = self.data_utils
+        applied = {}
+
+        if "test3" in utils.updated_watermarks:
+            rows = self._fetch_updated("test3", "train_ID, station, arrival_time, departure_time")
+        else:
+            rows = self._fetch("test3", "train_ID, station, arrival_time, departure_time")
+        if rows:
+            utils.historical_data = utils.historical_data.extend(row[1:5] for row in rows)
+            self._advance("test3", rows)
+        applied["test3"] = len(rows)
+
+        rows = self._fetch("data_adj", "from_station, to_station, mileage")
+        if rows:
+            distances = dict(utils.station_distances)
+            utils.add_station_distances(distances, (row[1:] for row in rows))
+            station_mapping = dict(utils.station_mapping)
+            utils.add_station_names(station_mapping, (row[1:3] for row in rows))
+            utils.station_distances = distances
+            utils.station_mapping = station_mapping
+            self._advance("data_adj", rows)
+        applied["data_adj"] = len(rows)
+
+        rows = self._fetch("jinghu_station", "zh_name, en_name, longitude, latitude")
+        if rows:
+            coordinates = dict(utils.station_coordinates)
+            utils.add_station_coordinates(coordinates, (row[1:] for row in rows))
+            utils.station_coordinates = coordinates
+            self._advance("jinghu_station", rows)
+        applied["jinghu_station"] = len(rows)
+
+        rows = self._fetch("train_number", "train_no, code")
+        if rows:
+            driver_mapping = dict(utils.driver_mapping)
+            driver_mapping.update((row[1], int(row[2])) for row in rows)
+            utils.driver_mapping = driver_mapping
+            self._advance("train_number", rows)
+        applied["train_number"] = len(rows)
+
+        # 天气观测表在初始加载成功（表存在）时才同步
+        if "weather_observation" in utils.watermarks:
+            rows = self._fetch("weather_observation", "station, observed_at, weather, temperature, wind")
+            if rows:
+                utils.add_weather_observations(rows)
+                self._advance("weather_observation", rows)
+            applied["weather_observation"] = len(rows)
+
+        self.last_success = time.time()
+        metrics.observe("timetable_sync.duration", self.last_success - start)
+        if any(applied.values()):
+            print(f"参考数据增量同步完成: {applied}")
+        return applied
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync_once()
+            except Exception as e:
+                metrics.inc("timetable_sync.errors")
+                print(f"参考数据增量同步失败: {e}")
+
+    def start(self):
+        """启动后台同步线程（pre-fork 部署时需在 worker 中调用）"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="timetable-sync", daemon=True)
+        self._thread.start()
+        print(f"参考数据增量同步已启动，间隔 {self.interval} 秒")
+
+    def stop(self):
+        """停止后台同步线程并关闭连接"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.db.close()
@@ -90,7 +90,7 @@ class Net(nn.Module):
         
         # 创建一个全零张量以恢复原始的batch size, 保证与输入对齐
         # 无效序列的位置将保持为零
-        h_local = torch.zeros(len(lens), hiddens.size(1), hiddens.size(2)).to(hiddens.device)
+        h_local = torch.zeros(len(lens), hiddens.size(1), hiddens.size(2), dtype=hiddens.dtype).to(hiddens.device)
         h_local[valid_indices] = hiddens
         
         return h_local, lens_conv 
\ No newline at end of file
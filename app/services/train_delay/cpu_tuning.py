@@ -0,0 +1,78 @@
+"""
+CPU 训练/推理调优：bf16 自动混合精度与线程数、CPU 亲和性设置
+
+- autocast(): CPU bfloat16 autocast。Linear / Conv1d / LSTM 等矩阵运算以 bf16 计算，
+  其余算子保持 fp32；DeepTTE_nextstop 的注意力和输出层显式以 fp32 计算，损失也在 fp32 上求。
+  推理默认关闭，环境变量 DEEPTTE_BF16=1 开启；训练由 train.py --bf16 开启。
+- configure_threads(): 设置算子内 / 算子间线程数，并把进程绑定到指定 CPU 核，
+  绑核后线程数默认等于核数，避免线程在核之间迁移、超额订阅。
+"""
+import os
+from typing import Iterable, List, Optional
+
+import torch
+
+# 推理是否启用 bf16 autocast
+BF16 = os.getenv('DEEPTTE_BF16', '0') == '1'
+
+
+def bf16_supported() -> bool:
+    """CPU 是否有原生 bf16 指令（AVX512-BF16 / AMX），没有时 bf16 通常比 fp32 更慢"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def autocast(enabled: Optional[bool] = None):
+    """CPU bf16 autocast 上下文，enabled 为 None 时取 DEEPTTE_BF16"""
+    if enabled is None:
+        enabled = BF16
+    return torch.autocast(device_type='cpu', dtype=torch.bfloat16, enabled=enabled)
+
+
+def parse_cpu_list(spec: str) -> List[int]:
+    """解析 "0-7,16-23" 形式的 CPU 列表"""
+    cpus = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def configure_threads(intra: Optional[int] = None, inter: Optional[int] = None,
+                      cpus: Optional[Iterable[int]] = None) -> dict:
+    """
+    设置本进程的 CPU 亲和性和 torch 线程数，返回生效的配置
+    intra 为 None 时：指定了 cpus 则取核数，否则保持 torch 默认值
+    """
+    if cpus is not None:
+        cpus = sorted(set(cpus))
+        if hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, cpus)
+        else:
+            print("当前平台不支持设置 CPU 亲和性，忽略 cpus 参数")
+        if intra is None:
+            intra = len(cpus)
+
+    if intra is not None:
+        torch.set_num_threads(max(1, intra))
+    if inter is not None:
+        try:
+            torch.set_num_interop_threads(max(1, inter))
+        except RuntimeError:
+            # 算子间线程池已初始化时无法再修改，保持原值
+            print("算子间线程池已初始化，interop 线程数保持不变")
+
+    return {
+        'intra_threads': torch.get_num_threads(),
+        'interop_threads': torch.get_num_interop_threads(),
+        'cpus': sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None,
+        'bf16_native': bf16_supported(),
+    }
@@ -1,5 +1,6 @@
 import time
 from app.services.train_delay import utils
+from app.services.train_delay.packed_dataset import PackedSet, is_packed, resolve_path
 import os
 import torch
 import torch.nn as nn
@@ -18,7 +19,7 @@ class MySet(Dataset):
         kernel_size = config.get('kernel_size', 3) if config else 3
         min_length = kernel_size + 1  # 原始轨迹长度至少需要 kernel_size + 1
 
-        with open(input_file, 'r') as file:
+        with open(resolve_path(input_file), 'r') as file:
             for line in file:
                 try:
                     json_dict = json.loads(line)
@@ -145,17 +146,55 @@ class BatchSampler:
     def __len__(self):
         return (self.count + self.batch_size - 1) // self.batch_size
 
-def get_loader(input_file, batch_size, config=None):
-    dataset = MySet(input_file=input_file, config=config)
+def length_buckets(lengths, batch_size, max_pad_ratio=0.25):
+    '''
+    Group sample indices into inference batches of similar length.
+    Like BatchSampler, indices are sorted by length (descending); a new batch starts when
+    it is full or when the next sample would be padded by more than max_pad_ratio of the
+    batch's longest trajectory, which bounds the padding waste of every batch.
+    '''
+    order = sorted(range(len(lengths)), key = lambda x: lengths[x], reverse = True)
+
+    batches, current = [], []
+    for idx in order:
+        if current and (len(current) >= batch_size or
+                        lengths[idx] < lengths[current[0]] * (1 - max_pad_ratio)):
+            batches.append(current)
+            current = []
+        current.append(idx)
+    if current:
+        batches.append(current)
+    return batches
+
+def get_loader(input_file, batch_size, config=None, num_workers=None, prefetch_factor=2):
+    '''
+    num_workers: worker processes for loading/collating (default: config['num_workers'],
+    then env LOADER_WORKERS, then 0). Workers are persistent across epochs and each keeps
+    prefetch_factor batches ready; batches are pinned only when CUDA is available.
+    '''
+    # 已转换为打包格式（packed_dataset）时使用内存映射数据集
+    if is_packed(input_file):
+        dataset = PackedSet(input_file, config)
+    else:
+        dataset = MySet(input_file=input_file, config=config)
 
     batch_sampler = BatchSampler(dataset, batch_size)
 
-    data_loader = DataLoader(dataset = dataset, \
-                             batch_size = 1, \
-                             collate_fn = lambda x: collate_fn(x), \
-                             num_workers = 0,
-                             batch_sampler = batch_sampler,
-                             pin_memory = True
+    return DataLoader(dataset = dataset, \
+                      collate_fn = collate_fn, \
+                      batch_sampler = batch_sampler, \
+                      **loader_options(config, num_workers, prefetch_factor)
     )
 
-    return data_loader
+def loader_options(config=None, num_workers=None, prefetch_factor=2):
+    '''DataLoader keyword arguments shared by data_loader and data_loader_nextstop'''
+    if num_workers is None:
+        num_workers = (config or {}).get('num_workers', int(os.getenv('LOADER_WORKERS', '0')))
+    options = {
+        'num_workers': num_workers,
+        'pin_memory': torch.cuda.is_available(),
+    }
+    if num_workers > 0:
+        options['persistent_workers'] = True
+        options['prefetch_factor'] = prefetch_factor
+    return options
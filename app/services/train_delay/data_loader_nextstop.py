@@ -1,5 +1,4 @@
 import time
-import utils
 import os
 import torch
 import torch.nn as nn
@@ -8,6 +7,10 @@ from torch.utils.data import Dataset, DataLoader
 import numpy as np
 import ujson as json
 
+from app.services.train_delay import utils
+from app.services.train_delay.packed_dataset import PackedNextStopSet, is_packed, resolve_path
+from app.services.train_delay.data_loader import loader_options
+
 class MySet(Dataset):
     def __init__(self, input_file, config):
         """
@@ -17,8 +20,8 @@ class MySet(Dataset):
         """
         self.content = []
         kernel_size = config.get('kernel_size', 3) # 从config获取kernel_size, 默认为3
-        # 使用绝对路径
-        file_path = os.path.join('D:/项目各文档/6-30-1/DeepTTE_11/data', input_file)
+        # 相对路径相对于训练数据根目录（环境变量 DEEPTTE_DATA_DIR）
+        file_path = resolve_path(input_file)
         with open(file_path, 'r') as file:
             for line in file:
                 try:
@@ -140,14 +143,17 @@ class BatchSampler:
     def __len__(self):
         return (self.count + self.batch_size - 1) // self.batch_size
 
-def get_loader(input_file, batch_size, config, shuffle=True):
-    dataset = MySet(input_file = input_file, config=config)
+def get_loader(input_file, batch_size, config, shuffle=True, num_workers=None, prefetch_factor=2):
+    # 已转换为打包格式（packed_dataset）时使用内存映射数据集
+    if is_packed(input_file):
+        dataset = PackedNextStopSet(input_file, config)
+    else:
+        dataset = MySet(input_file = input_file, config=config)
     batch_sampler = BatchSampler(dataset, batch_size)
+    # collate_fn 为模块级函数，可被 pickle 到 worker 进程；worker 数等选项与 data_loader 一致
     data_loader = DataLoader(dataset = dataset, \
-                             batch_size = 1, \
-                             collate_fn = lambda x: collate_fn(x), \
-                             num_workers = 0,
-                             batch_sampler = batch_sampler,
-                             pin_memory = True
+                             collate_fn = collate_fn, \
+                             batch_sampler = batch_sampler, \
+                             **loader_options(config, num_workers, prefetch_factor)
     )
-    return data_loader
\ No newline at end of file
+    return data_loader
@@ -0,0 +1,212 @@
+"""
+预测结果评估：对 result/*.res 与 saved_weights/ 中的模型做横向对比
+
+用法:
+    python -m app.services.train_delay.evaluate                          # 对比 result/ 下全部 .res
+    python -m app.services.train_delay.evaluate result/gru.res result/deeptte_new.res --sort rmse
+    python -m app.services.train_delay.evaluate --weights saved_weights/run_log_GPU_* --test data/test_finals_update100.json
+    python -m app.services.train_delay.evaluate --csv compare.csv
+
+.res 文件每行 "真实值 预测值"（空格或制表符分隔）。少数早期文件两列顺序相反，
+按"真实值为整数分钟"自动识别并在表中标记。
+指标（单位与文件相同，一般为分钟）：
+- MAE / RMSE / 绝对误差分位数 P50 / P90 / P95 / P99
+- MAPE: 只在 |真实值| >= --mape-min 的样本上计算（真实值常为 0），同时给出覆盖比例
+- 分桶 MAE: 按真实值落入的晚点区间分组
+"""
+import argparse
+import glob
+import json
+import mmap
+import os
+import time
+
+import numpy as np
+import torch
+
+from app.services.train_delay import cpu_tuning, data_loader
+from app.services.train_delay.train import CONFIG_PATH, RESULT_DIR, build_model
+
+DEFAULT_BUCKETS = [-10, -3, 0, 3, 10]
+PERCENTILES = [50, 90, 95, 99]
+
+
+def load_res(path):
+    """
+    以内存映射读取 .res 文件，返回 (label, pred, swapped)
+    swapped 为 True 表示文件中为 "预测值 真实值" 顺序
+    """
+    if os.path.getsize(path) == 0:
+        empty = np.empty(0, dtype=np.float64)
+        return empty, empty, False
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        values = np.fromstring(mm[:], dtype=np.float64, sep=' ')
+    if values.size % 2:
+        raise ValueError(f"{path}: 数值个数为奇数，不是两列格式")
+    columns = values.reshape(-1, 2)
+    first, second = columns[:, 0], columns[:, 1]
+
+    if _integral_ratio(second) > 0.99 and _integral_ratio(first) <= 0.99:
+        return second, first, True
+    return first, second, False
+
+
+def _integral_ratio(values):
+    # 部分文件的真实值带有 811.0001 这样的浮点误差，按容差判断
+    return np.mean(np.abs(values - np.round(values)) < 1e-3)
+
+
+def bucket_edges(spec):
+    return [float(x) for x in spec.split(',')] if spec else DEFAULT_BUCKETS
+
+
+def bucket_names(edges):
+    names = [f"<{edges[0]:g}"]
+    names += [f"[{lo:g},{hi:g})" for lo, hi in zip(edges[:-1], edges[1:])]
+    names.append(f">={edges[-1]:g}")
+    return names
+
+
+def compute_metrics(label, pred, edges=DEFAULT_BUCKETS, mape_min=1.0):
+    """全部指标一次向量化计算"""
+    n = label.size
+    if n == 0:
+        return {'n': 0}
+    err = pred - label
+    abs_err = np.abs(err)
+
+    mape_mask = np.abs(label) >= mape_min
+    mape = (float(np.mean(abs_err[mape_mask] / np.abs(label[mape_mask])) * 100)
+            if mape_mask.any() else float('nan'))
+
+    # 分桶：np.bincount 一次求出每个桶的样本数和误差和
+    bucket = np.digitize(label, edges)
+    counts = np.bincount(bucket, minlength=len(edges) + 1)
+    sums = np.bincount(bucket, weights=abs_err, minlength=len(edges) + 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bucket_mae = sums / counts
+
+    result = {
+        'n': n,
+        'mae': float(abs_err.mean()),
+        'rmse': float(np.sqrt(np.mean(err * err))),
+        'bias': float(err.mean()),
+        'mape': mape,
+        'mape_coverage': float(mape_mask.mean()),
+        'bucket_n': counts.tolist(),
+        'bucket_mae': bucket_mae.tolist(),
+    }
+    for p, v in zip(PERCENTILES, np.percentile(abs_err, PERCENTILES)):
+        result[f'p{p}'] = float(v)
+    return result
+
+
+@torch.no_grad()
+def predict_checkpoint(weights, test_files, config, batch_size=1024, bf16=False):
+    """用 DeepTTE_nextstop 权重对测试集批量推理，返回 (label, pred)，单位分钟"""
+    model = build_model(config)
+    model.load_state_dict(torch.load(weights, map_location='cpu'))
+    model.eval()
+    labels, preds = [], []
+    for input_file in test_files:
+        for attr, traj in data_loader.get_loader(input_file, batch_size, config, num_workers=0):
+            with cpu_tuning.autocast(bf16):
+                pred_dict, _ = model.eval_on_batch(attr, traj, config)
+            labels.append(pred_dict['label'].reshape(-1).float().numpy())
+            preds.append(pred_dict['pred'].reshape(-1).float().numpy())
+    return np.concatenate(labels).astype(np.float64), np.concatenate(preds).astype(np.float64)
+
+
+def write_res(path, label, pred):
+    np.savetxt(path, np.column_stack((label, pred)), fmt='%.6f')
+
+
+def print_table(rows, edges):
+    """rows: [(名称, 指标, 备注)]"""
+    w = max([40] + [len(name) + 2 for name, _, _ in rows])
+    header = f"{'run':<{w}}{'n':>8}{'MAE':>10}{'RMSE':>10}{'bias':>10}{'MAPE%':>8}{'cov':>6}"
+    header += ''.join(f"{'P' + str(p):>10}" for p in PERCENTILES)
+    print(header)
+    for name, m, note in rows:
+        if m['n'] == 0:
+            print(f"{name:<{w}}{0:>8}  (空文件)")
+            continue
+        line = (f"{name:<{w}}{m['n']:>8}{m['mae']:>10.4f}{m['rmse']:>10.4f}{m['bias']:>10.3f}"
+                f"{m['mape']:>8.1f}{m['mape_coverage']:>6.2f}")
+        line += ''.join(f"{m['p' + str(p)]:>10.3f}" for p in PERCENTILES)
+        print(line + (f"  {note}" if note else ''))
+
+    names = bucket_names(edges)
+    print()
+    print(f"{'MAE by label bucket':<{w}}" + ''.join(f"{b:>12}" for b in names))
+    for name, m, _ in rows:
+        if m['n'] == 0:
+            continue
+        print(f"{name:<{w}}" + ''.join(f"{v:>12.3f}" if c else f"{'-':>12}"
+                                      for v, c in zip(m['bucket_mae'], m['bucket_n'])))
+
+
+def write_csv(path, rows, edges):
+    names = bucket_names(edges)
+    columns = ['n', 'mae', 'rmse', 'bias', 'mape', 'mape_coverage'] + [f'p{p}' for p in PERCENTILES]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(','.join(['run'] + columns + [f'mae {b}' for b in names]) + '\n')
+        for name, m, _ in rows:
+            if m['n'] == 0:
+                continue
+            values = [m[c] for c in columns] + m['bucket_mae']
+            f.write(','.join([name] + [f'{v:g}' for v in values]) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比 .res 预测结果与模型权重")
+    parser.add_argument('res', nargs='*', help='.res 文件，默认 result/*.res')
+    parser.add_argument('--weights', nargs='+', default=[], help='在测试集上评估的 DeepTTE_nextstop 权重')
+    parser.add_argument('--test', nargs='+', help='测试集，默认配置中的 test_set')
+    parser.add_argument('--config', default=CONFIG_PATH)
+    parser.add_argument('--batch-size', type=int, default=1024)
+    parser.add_argument('--bf16', action='store_true', help='权重评估使用 CPU bf16 autocast')
+    parser.add_argument('--save-res', action='store_true', help='把权重评估的预测写入 result/<权重名>.res')
+    parser.add_argument('--buckets', help='分桶边界，逗号分隔，默认 -10,-3,0,3,10')
+    parser.add_argument('--mape-min', type=float, default=1.0, help='计算 MAPE 的最小 |真实值|')
+    parser.add_argument('--sort', choices=['name', 'mae', 'rmse', 'p95'], default='name')
+    parser.add_argument('--csv', help='同时写出 CSV 表格')
+    args = parser.parse_args()
+
+    edges = bucket_edges(args.buckets)
+    rows = []
+    start = time.perf_counter()
+
+    res_files = args.res or ([] if args.weights else sorted(glob.glob(os.path.join(RESULT_DIR, '*.res'))))
+    for path in res_files:
+        label, pred, swapped = load_res(path)
+        rows.append((os.path.basename(path), compute_metrics(label, pred, edges, args.mape_min),
+                     '列顺序为 预测 真实' if swapped else ''))
+    load_time = time.perf_counter() - start
+
+    if args.weights:
+        with open(args.config, 'r') as f:
+            config = json.load(f)
+        test_files = args.test or config['test_set']
+        for weights in args.weights:
+            name = os.path.basename(weights)
+            try:
+                label, pred = predict_checkpoint(weights, test_files, config, args.batch_size, args.bf16)
+            except (RuntimeError, KeyError) as e:
+                # 基线模型（GRU / LSTM / MLP）等非 DeepTTE_nextstop 结构的权重无法加载
+                print(f"跳过 {name}: 不是 DeepTTE_nextstop 权重 ({str(e).splitlines()[0]})")
+                continue
+            if args.save_res:
+                write_res(os.path.join(RESULT_DIR, name + '.res'), label, pred)
+            rows.append((name, compute_metrics(label, pred, edges, args.mape_min), '权重'))
+
+    key = {'name': lambda r: r[0]}.get(args.sort, lambda r: r[1].get(args.sort, float('inf')))
+    rows.sort(key=key)
+    print_table(rows, edges)
+    if args.csv:
+        write_csv(args.csv, rows, edges)
+    print(f"\n{len(res_files)} 个 .res 文件读取并计算耗时 {load_time:.2f}s，总耗时 {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+import math
+import os
+import threading
+import time
+import zlib
+from typing import Any, Dict, Hashable, List, Optional
+
+import torch
+
+from app.core.metrics import metrics
+from app.services.train_delay import cpu_tuning
+from app.services.train_delay.data_loader import collate_fn, length_buckets
+from app.services.train_delay.state_cache import LSTMStateCache
+from app.services.train_delay.train import build_model
+
+# 推理时每个长度桶的最大样本数
+SERVING_BATCH_SIZE = int(os.getenv('SERVING_BATCH_SIZE', '64'))
+
+# 运行车次的编码器增量状态缓存（STATE_CACHE_MB 为内存上限，0 表示关闭）
+STATE_CACHE_MB = int(os.getenv('STATE_CACHE_MB', '64'))
+
+# 多 worker 之间同步当前版本的文件，默认与预计算结果库同在项目根目录 data/ 下
+ACTIVE_MODEL_FILE = os.getenv(
+    'ACTIVE_MODEL_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'data', 'active_model')
+)
+
+# 各 worker 检查 ACTIVE_MODEL_FILE 的最小间隔（秒）
+MODEL_SYNC_INTERVAL = float(os.getenv('MODEL_SYNC_INTERVAL', '5'))
+
+# 不是模型权重的文件（train.py 的完整检查点和写入中的临时文件）
+_SKIP_SUFFIXES = ('.ckpt', '.tmp', '.json')
+
+
+class ModelVersion:
+    """一个已加载的 DeepTTE_nextstop 权重版本：模型、推理配置和该版本专属的状态缓存"""
+
+    def __init__(self, name: str, path: str, config: Dict[str, Any], metadata: Dict[str, Any]):
+        self.name = name
+        self.path = path
+        # kernel_size 等结构参数以权重本身为准，LocalDecoder / 数据过滤也读取 config['kernel_size']
+        self.config = {**config, **{k: metadata[k] for k in ('kernel_size', 'num_filter') if k in metadata}}
+        self.metadata = metadata
+        self.model = build_model(self.config)
+        self.model.load_state_dict(torch.load(path, map_location='cpu'))
+        self.model.eval()
+        self.state_cache: Optional[LSTMStateCache] = None
+        self.loaded_at = time.time()
+
+    def _run_batch(self, batch: List[Dict[str, Any]]) -> List[float]:
+        return self.run_collated(*collate_fn(batch))
+
+    def run_collated(self, attr, traj) -> List[float]:
+        """对已整理好的 batch 前向（影子模型复用同一份 collate 结果）"""
+        device = next(self.model.parameters()).device
+        attr = {k: v.to(device) for k, v in attr.items()}
+        traj = {k: v.to(device) if torch.is_tensor(v) else v for k, v in traj.items()}
+        # DEEPTTE_BF16=1 时以 bf16 autocast 推理（见 cpu_tuning）
+        with torch.no_grad(), cpu_tuning.autocast():
+            pred_dict, _ = self.model.eval_on_batch(attr, traj, self.config)
+        return [float(p) for p in pred_dict['pred'].reshape(-1)]
+
+    def predict(self, batch: List[Dict[str, Any]], batch_size: Optional[int] = None) -> List[float]:
+        """
+        按轨迹长度分桶批量前向，结果与输入顺序一致
+        batch_size 为每次前向的最大样本数，缺省为 SERVING_BATCH_SIZE（夜间预计算使用更大的批）
+        """
+        if len(batch) <= 1:
+            return self._run_batch(batch)
+        preds = [0.0] * len(batch)
+        for bucket in length_buckets([len(item['lngs']) for item in batch], batch_size or SERVING_BATCH_SIZE):
+            for i, p in zip(bucket, self._run_batch([batch[i] for i in bucket])):
+                preds[i] = p
+        return preds
+
+    def warm_up(self) -> float:
+        """
+        用几种典型长度的样本走一遍完整前向和增量编码，触发算子初始化和内存分配
+        输出非有限值时抛出 ValueError，该版本不会被切换上线；返回耗时（秒）
+        """
+        start = time.time()
+        samples = [_warmup_sample(T) for T in (4, 12, 40)]
+        preds = self.predict(samples)
+        if self.state_cache is not None:
+            preds += self.state_cache.predict([('__warmup__', T) for T in (4, 12, 40)], samples)
+            self.state_cache.clear()
+        if not all(math.isfinite(p) for p in preds):
+            raise ValueError(f"模型 {self.name} 预热输出非有限值: {preds}")
+        return time.time() - start
+
+
+def _warmup_sample(T: int) -> Dict[str, Any]:
+    return {
+        "time_gap": [0.0] * T,
+        "dist": 50.0 * T,
+        "lats": [34.4 + 0.1 * i for i in range(T)],
+        "lngs": [115.6 - 0.4 * i for i in range(T)],
+        "driverID": 0,
+        "weekID": 0,
+        "states": [1.0] * T,
+        "timeID": 600,
+        "time": 0.0,
+        "dateID": 0,
+        "dist_gap": [0.0] + [50.0] * (T - 1),
+        "weather": [1] * T,
+        "temperature": [10] * T,
+        "wind": [15] * T,
+    }
+
+
+class ModelRegistry:
+    """
+    saved_weights/ 下模型权重的索引与热切换
+
+    - index(): 列出每个权重文件的结构参数（由权重形状推断 kernel_size / num_filter）、
+      能否加载为 DeepTTE_nextstop，以及 train.py 检查点和 result/<name>.res 中的指标
+    - activate(): 在后台线程中加载新版本、预热，成功后以单次引用赋值切换 active；
+      请求开始时取得的版本对象在整个请求内保持不变，进行中的请求在旧版本上完成
+    - pre-fork 多 worker 部署时，activate 在新版本加载、预热成功后把版本名写入 ACTIVE_MODEL_FILE，
+      其它 worker 在访问 active 时（至多每 MODEL_SYNC_INTERVAL 秒一次）发现变化后各自后台加载
+    """
+
+    def __init__(self, weights_dir: str, config: Dict[str, Any], result_dir: Optional[str] = None,
+                 active_file: str = ACTIVE_MODEL_FILE):
+        self.weights_dir = weights_dir
+        self.result_dir = result_dir
+        self.config = config
+        self.active_file = os.path.abspath(active_file)
+        self._active: Optional[ModelVersion] = None
+        self._lock = threading.Lock()
+        self._loading: Optional[str] = None
+        self._last_error: Optional[Dict[str, Any]] = None
+        self._last_sync = 0.0
+        self._index_cache: Dict[str, Dict[str, Any]] = {}
+        # 对比实验：影子模型只在后台对同一批输入预测；A/B 版本按车次哈希承接 ab_percent% 的请求
+        self.shadows: Dict[str, ModelVersion] = {}
+        self.ab_version: Optional[ModelVersion] = None
+        self.ab_percent = 0
+
+        metrics.set_gauge("model_registry.active", lambda: self._active.name if self._active else None)
+
+    # ---------- 索引 ----------
+
+    def _path(self, name: str) -> str:
+        if not name or os.path.basename(name) != name or name.endswith(_SKIP_SUFFIXES):
+            raise ValueError(f"无效的模型版本名: {name}")
+        path = os.path.join(self.weights_dir, name)
+        if not os.path.isfile(path):
+            raise ValueError(f"模型版本不存在: {name}")
+        return path
+
+    def describe(self, name: str) -> Dict[str, Any]:
+        """单个权重文件的元数据，按文件修改时间缓存"""
+        path = self._path(name)
+        mtime = os.path.getmtime(path)
+        cached = self._index_cache.get(name)
+        if cached is not None and cached['mtime'] == mtime:
+            return cached
+
+        info: Dict[str, Any] = {'name': name, 'size': os.path.getsize(path), 'mtime': mtime}
+        try:
+            state_dict = torch.load(path, map_location='cpu')
+            conv = state_dict['local_encoder.geo_conv.conv.weight']
+            info['num_filter'], _, info['kernel_size'] = conv.shape
+            # 用推断出的结构严格加载一次，确认与当前 DeepTTE_nextstop 代码兼容
+            build_model({**self.config, 'kernel_size': info['kernel_size'],
+                         'num_filter': info['num_filter']}).load_state_dict(state_dict)
+            info['compatible'] = True
+        except Exception as e:
+            info['compatible'] = False
+            info['error'] = str(e).splitlines()[0][:200]
+
+        ckpt = path + '.ckpt'
+        if os.path.exists(ckpt):
+            try:
+                saved = torch.load(ckpt, map_location='cpu', weights_only=False)
+                info['train'] = {'epoch': saved['epoch'], 'best_val_mae': saved['best_mae'],
+                                 'batch_size': saved['args'].get('batch_size'), 'lr': saved['args'].get('lr')}
+            except Exception as e:
+                info['train'] = {'error': str(e).splitlines()[0][:200]}
+
+        if self.result_dir:
+            res = os.path.join(self.result_dir, name + '.res')
+            if os.path.exists(res):
+                from app.services.train_delay.evaluate import compute_metrics, load_res
+                label, pred, _ = load_res(res)
+                m = compute_metrics(label, pred)
+                info['test'] = {k: m[k] for k in ('n', 'mae', 'rmse')} if m['n'] else {'n': 0}
+
+        self._index_cache[name] = info
+        return info
+
+    def index(self) -> List[Dict[str, Any]]:
+        names = sorted(n for n in os.listdir(self.weights_dir)
+                       if os.path.isfile(os.path.join(self.weights_dir, n)) and not n.endswith(_SKIP_SUFFIXES))
+        return [self.describe(n) for n in names]
+
+    # ---------- 加载与切换 ----------
+
+    @property
+    def active(self) -> ModelVersion:
+        self._maybe_sync()
+        return self._active
+
+    def status(self) -> Dict[str, Any]:
+        active = self._active
+        return {
+            'active': active.name if active else None,
+            'loaded_at': active.loaded_at if active else None,
+            'loading': self._loading,
+            'last_error': self._last_error,
+        }
+
+    def load(self, name: str, state_cache: bool = True) -> ModelVersion:
+        """加载并预热一个版本（不切换）；影子模型只做完整前向，不需要状态缓存"""
+        start = time.time()
+        version = ModelVersion(name, self._path(name), self.config, self.describe(name))
+        if state_cache and STATE_CACHE_MB > 0:
+            version.state_cache = LSTMStateCache(version.model, version.config, max_bytes=STATE_CACHE_MB << 20)
+        warm = version.warm_up()
+        print(f"模型 {name} 加载完成，耗时 {time.time() - start:.2f}s（预热 {warm * 1000:.0f}ms）")
+        return version
+
+    def _swap(self, version: ModelVersion) -> None:
+        previous = self._active
+        self._active = version
+        if version.state_cache is not None:
+            # 状态缓存的指标改为指向新版本的缓存
+            metrics.set_gauge("state_cache.entries", lambda: len(version.state_cache))
+            metrics.set_gauge("state_cache.bytes", lambda: version.state_cache.nbytes)
+        metrics.inc("model_registry.swaps")
+        print(f"模型版本切换: {previous.name if previous else None} -> {version.name}")
+
+    def _load_and_swap(self, name: str, persist: bool) -> None:
+        try:
+            version = self.load(name)
+            self._swap(version)
+            self._last_error = None
+            # 加载、预热成功后才通知其它 worker；失败时 ACTIVE_MODEL_FILE 保持不变
+            if persist:
+                self._write_active_file(name)
+        except Exception as e:
+            metrics.inc("model_registry.load_errors")
+            self._last_error = {'name': name, 'error': str(e), 'time': time.time()}
+            print(f"模型 {name} 加载失败，继续使用 {self._active.name if self._active else None}: {e}")
+        finally:
+            with self._lock:
+                self._loading = None
+
+    def activate(self, name: str, background: bool = True, persist: bool = True) -> Dict[str, Any]:
+        """
+        切换到 name 版本
+        background=False 时在当前线程加载（服务启动时使用），加载失败直接抛出异常
+        persist=True 时在加载、预热并切换成功后写入 ACTIVE_MODEL_FILE，通知其它 worker
+        """
+        self._path(name)
+        if not self.describe(name)['compatible']:
+            raise ValueError(f"{name} 不是 DeepTTE_nextstop 权重: {self.describe(name).get('error')}")
+
+        with self._lock:
+            if self._loading is not None:
+                raise ValueError(f"正在加载 {self._loading}，请稍后再试")
+            if self._active is not None and self._active.name == name:
+                if persist:
+                    self._write_active_file(name)
+                return self.status()
+            self._loading = name
+
+        if background:
+            threading.Thread(target=self._load_and_swap, args=(name, persist), name=f"model-load-{name}",
+                             daemon=True).start()
+        else:
+            try:
+                self._swap(self.load(name))
+                if persist:
+                    self._write_active_file(name)
+            finally:
+                with self._lock:
+                    self._loading = None
+        return self.status()
+
+    # ---------- 影子模型与 A/B ----------
+
+    def configure_experiments(self, shadow_names: List[str], ab_name: Optional[str] = None,
+                              ab_percent: int = 0) -> None:
+        """加载影子模型和 A/B 版本（启动时由环境变量配置，加载失败的版本跳过）"""
+        shadows = {}
+        for name in shadow_names:
+            try:
+                shadows[name] = self.load(name, state_cache=False)
+            except Exception as e:
+                print(f"影子模型 {name} 加载失败，跳过: {e}")
+        self.shadows = shadows
+
+        if ab_name and ab_percent > 0:
+            try:
+                self.ab_version = self.load(ab_name)
+                self.ab_percent = min(100, ab_percent)
+            except Exception as e:
+                print(f"A/B 版本 {ab_name} 加载失败，不分流: {e}")
+
+    def choose(self, key: Hashable) -> ModelVersion:
+        """
+        为一个请求选择应答版本：未配置 A/B 时为 active；
+        否则按 crc32(key) 稳定分流（同一车次始终落在同一组，多 worker 间一致）
+        """
+        active = self.active
+        ab = self.ab_version
+        if ab is None or ab.name == active.name:
+            return active
+        return ab if zlib.crc32(str(key).encode('utf-8')) % 100 < self.ab_percent else active
+
+    def comparison_versions(self, served: ModelVersion) -> List[ModelVersion]:
+        """除应答版本外参与对比的其它已加载版本（active / A/B / 影子模型）"""
+        versions, seen = [], {served.name}
+        for version in [self._active, self.ab_version, *self.shadows.values()]:
+            if version is not None and version.name not in seen:
+                seen.add(version.name)
+                versions.append(version)
+        return versions
+
+    def experiments(self) -> Dict[str, Any]:
+        return {
+            'shadows': list(self.shadows),
+            'ab': {'name': self.ab_version.name, 'percent': self.ab_percent} if self.ab_version else None,
+        }
+
+    # ---------- 多 worker 同步 ----------
+
+    def _write_active_file(self, name: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.active_file), exist_ok=True)
+            tmp = self.active_file + f'.{os.getpid()}.tmp'
+            with open(tmp, 'w') as f:
+                f.write(name)
+            os.replace(tmp, self.active_file)
+        except OSError as e:
+            print(f"写入当前模型版本文件失败，其它 worker 不会跟随切换: {e}")
+
+    def desired_version(self) -> Optional[str]:
+        """ACTIVE_MODEL_FILE 中记录的版本名，文件不存在时为 None"""
+        try:
+            with open(self.active_file, 'r') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _maybe_sync(self) -> None:
+        now = time.time()
+        if now - self._last_sync < MODEL_SYNC_INTERVAL:
+            return
+        self._last_sync = now
+        desired = self.desired_version()
+        if desired is None or self._loading is not None or (self._active and self._active.name == desired):
+            return
+        if self._last_error and self._last_error['name'] == desired:
+            # 上次加载该版本失败，不反复重试
+            return
+        try:
+            print(f"检测到其它 worker 切换模型版本: {desired}")
+            self.activate(desired, background=True, persist=False)
+        except ValueError as e:
+            self._last_error = {'name': desired, 'error': str(e), 'time': now}
+            print(f"无法跟随切换到 {desired}: {e}")
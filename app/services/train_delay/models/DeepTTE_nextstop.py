@@ -26,6 +26,11 @@ class DotProductAttention(nn.Module):
             mask (Tensor): Boolean mask for padding, shape (B, S).
         """
 
+        # bf16 autocast 下注意力仍以 fp32 计算：softmax 前的打分对精度敏感
+        with torch.autocast(device_type=query.device.type, enabled=False):
+            return self._attend(query.float(), key.float(), value.float(), mask)
+
+    def _attend(self, query, key, value, mask):
         score = torch.bmm(key, query.unsqueeze(2)).squeeze(2)  # (B, S)
 
         if mask is not None:
@@ -83,7 +88,7 @@ class LocalDecoder(nn.Module):
 
     def forward(self, packed_h_local, traj, local_lens_valid, config):
         # Prediction part is unchanged
-        delta_y_hat = self.mlp(packed_h_local.data).squeeze(-1)
+        delta_y_hat = self.mlp(packed_h_local.data).squeeze(-1).float()
         
 
         time_gap_padded = traj['time_gap']
@@ -154,13 +159,16 @@ class Net(nn.Module):
         traj_history = {}
         y_features = {}
         original_lens = traj['lens']
+        # 变长 batch 中较短轨迹的末列是 padding，目标站点需按各自长度取第 lens-1 个位置
+        batch_idx = torch.arange(len(original_lens))
+        last_idx = torch.tensor([l - 1 if l > 0 else 0 for l in original_lens])
         
         for k, v in traj.items():
             if k == 'lens':
                 traj_history[k] = [l - 1 if l > 0 else 0 for l in original_lens]
             else:
                 traj_history[k] = v[:, :-1]
-                y_features[k] = v[:, -1]
+                y_features[k] = v[batch_idx.to(v.device), last_idx.to(v.device)]
 
         # 1. Local Encoder
         H_local, local_lens = self.local_encoder(traj_history, config)
@@ -174,7 +182,7 @@ class Net(nn.Module):
         z_global, attn_weights = self.attention(q_T_proj, H_local, H_local, mask=mask)
         
         # 4. Global Decoder
-        y_hat_T = self.global_decoder(z_global).squeeze(-1)
+        y_hat_T = self.global_decoder(z_global).squeeze(-1).float()
 
         # 5. Local Decoder
         valid_local_indices = [i for i, l in enumerate(local_lens) if l > 0]
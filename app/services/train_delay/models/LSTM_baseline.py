@@ -0,0 +1,39 @@
+import torch
+import torch.nn as nn
+
+from app.services.train_delay.base import GeoConv
+
+
+class Net(nn.Module):
+    """
+    LSTM 基线：GeoConv 局部特征 + 单层 LSTM + 全连接，按 saved_weights/lstm_baseline_* 的参数结构重建
+
+    与 DeepTTE_nextstop 使用相同的 collate_fn 输入，整条轨迹（含目标站点的位置和天气）
+    经 GeoConv 卷积后送入 LSTM，取最后一个有效位置的输出预测目标站点的 time_gap（归一化值）。
+    轨迹长度小于 kernel_size 时没有卷积输出，预测为 NaN，由调用方退回启发式估计。
+    """
+    def __init__(self, kernel_size=3, num_filter=32, hidden_size=128):
+        super(Net, self).__init__()
+        self.kernel_size = kernel_size
+        self.geo_conv = GeoConv.Net(kernel_size=kernel_size, num_filter=num_filter)
+        self.lstm = nn.LSTM(num_filter + 1, hidden_size, batch_first=True)
+        self.fc = nn.Linear(hidden_size, 1)
+
+    def forward(self, attr, traj, config):
+        lens = torch.tensor(traj['lens'])
+        conv_lens = lens - self.kernel_size + 1
+        valid = conv_lens > 0
+        y_hat = torch.full((len(lens),), float('nan'))
+        if not valid.any():
+            return y_hat
+
+        idx = torch.nonzero(valid).squeeze(1)
+        conv_locs = self.geo_conv({k: v[idx] for k, v in traj.items() if k != 'lens'}, config)
+        packed = nn.utils.rnn.pack_padded_sequence(conv_locs, conv_lens[idx], batch_first=True, enforce_sorted=False)
+        _, (h_n, _) = self.lstm(packed)
+        y_hat[idx] = self.fc(h_n[-1]).squeeze(-1).float()
+        return y_hat
+
+    def predict(self, attr, traj, config):
+        """返回反归一化后的预测（分钟）"""
+        return self.forward(attr, traj, config) * config['time_gap_std'] + config['time_gap_mean']
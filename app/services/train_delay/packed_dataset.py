@@ -0,0 +1,193 @@
+"""
+训练数据的打包二进制格式与内存映射数据集
+
+JSON 行格式（每行一条轨迹）一次性转换为目录 <input>.packed/：
+- offsets.bin: int64，长度 N + 1，第 i 条轨迹的逐站数据位于 [offsets[i], offsets[i + 1])
+- <逐站字段>.bin: 所有轨迹首尾相接的平铺数组（lngs / lats / time_gap / ...）
+- <静态字段>.bin: 每条轨迹一个值（dist / time / driverID / ...）
+- meta.json: 样本数和各字段的 dtype
+
+PackedSet 以 np.memmap 打开这些文件，启动时不解析任何数据，按下标取样本只是数组切片（零拷贝）。
+
+用法:
+    python -m app.services.train_delay.packed_dataset data/train_00_finals_update100.json ...
+    python -m app.services.train_delay.packed_dataset --config    # 转换 config_update.json 中的全部数据集
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import ujson
+from torch.utils.data import Dataset
+
+# 训练数据根目录：config 中的数据集路径（如 data/train_00_finals_update100.json）相对于此目录
+DATA_DIR = os.getenv('DEEPTTE_DATA_DIR', os.path.dirname(os.path.abspath(__file__)))
+
+# 取值为整数类别/编号的字段，其余字段按 float32 存储
+INT_KEYS = {'weather', 'wind', 'driverID', 'dateID', 'weekID', 'timeID'}
+
+
+def resolve_path(input_file):
+    """数据集路径：绝对路径原样返回，相对路径相对于 DATA_DIR"""
+    if os.path.isabs(input_file):
+        return input_file
+    return os.path.join(DATA_DIR, input_file)
+
+
+def packed_dir(input_file):
+    path = resolve_path(input_file)
+    return path if path.endswith('.packed') else path + '.packed'
+
+
+def is_packed(input_file):
+    return os.path.exists(os.path.join(packed_dir(input_file), 'meta.json'))
+
+
+def pack(input_file, output_dir=None):
+    """
+    将 JSON 行文件流式转换为打包格式，逐行追加写入，内存占用与文件大小无关
+    返回写入的样本数
+    """
+    src = resolve_path(input_file)
+    output_dir = output_dir or packed_dir(input_file)
+    os.makedirs(output_dir, exist_ok=True)
+
+    files, traj_keys, static_keys = {}, [], []
+    offsets = open(os.path.join(output_dir, 'offsets.bin'), 'wb')
+    offsets.write(np.int64(0).tobytes())
+    count, total = 0, 0
+    try:
+        with open(src, 'r') as f:
+            for line in f:
+                try:
+                    item = ujson.loads(line)
+                except ValueError as e:
+                    print(f"解析JSON时出错: {line[:80]}. 错误: {e}")
+                    continue
+
+                if not files:
+                    # 以第一条样本确定字段：列表为逐站字段，标量为静态字段
+                    for key, value in item.items():
+                        (traj_keys if isinstance(value, list) else static_keys).append(key)
+                        files[key] = open(os.path.join(output_dir, key + '.bin'), 'wb')
+
+                T = len(item['lngs'])
+                for key in traj_keys:
+                    files[key].write(np.asarray(item[key], dtype=_dtype(key)).tobytes())
+                for key in static_keys:
+                    files[key].write(np.asarray(item[key], dtype=_dtype(key)).tobytes())
+                total += T
+                count += 1
+                offsets.write(np.int64(total).tobytes())
+    finally:
+        offsets.close()
+        for fp in files.values():
+            fp.close()
+
+    meta = {
+        'count': count,
+        'traj_keys': {key: np.dtype(_dtype(key)).name for key in traj_keys},
+        'static_keys': {key: np.dtype(_dtype(key)).name for key in static_keys},
+    }
+    with open(os.path.join(output_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    print(f"{src} -> {output_dir}: {count} 条轨迹, {total} 个站点")
+    return count
+
+
+def _dtype(key):
+    return np.int32 if key in INT_KEYS else np.float32
+
+
+class PackedSet(Dataset):
+    """
+    内存映射的训练数据集，样本格式与 data_loader.MySet 相同（逐站字段为 numpy 视图）
+    与 MySet 一样过滤掉长度小于 kernel_size + 1 的轨迹
+    """
+
+    def __init__(self, input_file, config=None):
+        self.path = packed_dir(input_file)
+        with open(os.path.join(self.path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        self.traj_keys = meta['traj_keys']
+        self.static_keys = meta['static_keys']
+        self.count = meta['count']
+        self._offsets = None
+        self._arrays = None
+
+        kernel_size = config.get('kernel_size', 3) if config else 3
+        all_lengths = np.diff(self.offsets)
+        self.index = np.flatnonzero(all_lengths >= kernel_size + 1)
+        self.lengths = all_lengths[self.index]
+
+    @property
+    def offsets(self):
+        if self._offsets is None:
+            self._offsets = np.memmap(os.path.join(self.path, 'offsets.bin'), dtype=np.int64, mode='r',
+                                      shape=(self.count + 1,)).view(np.ndarray)
+        return self._offsets
+
+    @property
+    def arrays(self):
+        # 懒打开：DataLoader worker 进程中首次取样本时各自映射文件
+        if self._arrays is None:
+            self._arrays = {key: self._open(key, dtype) for key, dtype in {**self.traj_keys, **self.static_keys}.items()}
+        return self._arrays
+
+    def __getstate__(self):
+        # pickle 到 worker 进程（spawn）时不携带映射的数据，只传路径和下标
+        state = self.__dict__.copy()
+        state['_offsets'] = None
+        state['_arrays'] = None
+        return state
+
+    def _open(self, key, dtype):
+        path = os.path.join(self.path, key + '.bin')
+        if os.path.getsize(path) == 0:
+            return np.empty(0, dtype=dtype)
+        # 以普通 ndarray 视图访问（仍引用同一映射），切片不经过 np.memmap 子类的额外开销
+        return np.memmap(path, dtype=dtype, mode='r').view(np.ndarray)
+
+    def __getitem__(self, idx):
+        i = self.index[idx]
+        offsets, arrays = self.offsets, self.arrays
+        start, end = offsets[i], offsets[i + 1]
+        item = {key: arrays[key][start:end] for key in self.traj_keys}
+        for key in self.static_keys:
+            item[key] = arrays[key][i].item()
+        return item
+
+    def __len__(self):
+        return len(self.index)
+
+
+class PackedNextStopSet(PackedSet):
+    """与 data_loader_nextstop.MySet 相同的 (x, y) 样本：x 为前 T-1 步，y 为第 T 步"""
+
+    def __getitem__(self, idx):
+        item = super().__getitem__(idx)
+        x_item = {k: v[:-1] if k in self.traj_keys else v for k, v in item.items()}
+        y_item = {k: item[k][-1].item() for k in self.traj_keys}
+        return x_item, y_item
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将 JSON 行训练数据转换为内存映射打包格式")
+    parser.add_argument('inputs', nargs='*', help='数据集文件（相对路径相对于 DEEPTTE_DATA_DIR）')
+    parser.add_argument('--config', action='store_true', help='转换 config_update.json 中的全部数据集')
+    args = parser.parse_args()
+
+    inputs = list(args.inputs)
+    if args.config:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config_update.json'), 'r') as f:
+            config = json.load(f)
+        inputs += config['train_set'] + config['eval_set'] + config['test_set']
+    if not inputs:
+        parser.error('请指定数据集文件或 --config')
+    for input_file in inputs:
+        pack(input_file)
+
+
+if __name__ == '__main__':
+    main()
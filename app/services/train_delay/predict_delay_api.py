@@ -1,66 +1,48 @@
-import torch
 import json
 import os
-from app.services.train_delay import utils
-from app.services.train_delay.data_loader import collate_fn
-from app.services.train_delay import models
-import inspect
+from app.services.train_delay.model_registry import ModelRegistry
 
 # 用绝对路径加载模型和配置
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), 'config_update.json')
-WEIGHT_PATH = os.path.join(os.path.dirname(__file__), 'saved_weights', 'run_log_GPU_2025-06-26_222529.890974_update1003')
+WEIGHTS_DIR = os.path.join(os.path.dirname(__file__), 'saved_weights')
+RESULT_DIR = os.path.join(os.path.dirname(__file__), 'result')
 
 config = json.load(open(CONFIG_PATH, 'r'))
 
-# 只保留模型__init__需要的参数
-model_init_args = inspect.getfullargspec(models.DeepTTE_nextstop.Net.__init__).args
-if 'self' in model_init_args:
-    model_init_args.remove('self')
-filtered_config = {k: v for k, v in config.items() if k in model_init_args}
+# 启动时服务的模型版本（saved_weights/ 下的权重文件名），预计算结果按版本区分；
+# 运行中可通过 /api/v1/models 接口热切换，ACTIVE_MODEL_FILE 中记录的版本优先
+MODEL_VERSION = os.getenv('MODEL_VERSION', 'run_log_GPU_2025-06-26_222529.890974_update1003')
 
-model = models.DeepTTE_nextstop.Net(**filtered_config)
-model.load_state_dict(torch.load(WEIGHT_PATH, map_location='cpu'))
-model.eval()
+model_registry = ModelRegistry(WEIGHTS_DIR, config, result_dir=RESULT_DIR)
 
-def prepare_input_for_model(input_data):
+_initial = model_registry.desired_version() or MODEL_VERSION
+try:
+    model_registry.activate(_initial, background=False, persist=False)
+except Exception as e:
+    if _initial == MODEL_VERSION:
+        raise
+    print(f"加载 {_initial} 失败，使用 MODEL_VERSION={MODEL_VERSION}: {e}")
+    model_registry.activate(MODEL_VERSION, background=False, persist=False)
+
+# 对比实验：SHADOW_MODELS 为逗号分隔的影子模型版本，AB_MODEL 按车次承接 AB_PERCENT% 的请求
+model_registry.configure_experiments(
+    [name.strip() for name in os.getenv('SHADOW_MODELS', '').split(',') if name.strip()],
+    os.getenv('AB_MODEL') or None,
+    int(os.getenv('AB_PERCENT', '0')),
+)
+
+def predict_delay(input_data, version=None, batch_size=None):
     """
-    输入: dict 或 list[dict]
-    输出: attr, traj (均为tensor/Variable)
+    输入: 一条或多条原始数据（dict或list[dict]），轨迹长度可以不同
+    输出: 每条的预测晚点时长list（与输入顺序一致）
+    多条输入按轨迹长度分桶，每个桶一次前向，避免长短轨迹混在一起时大量 padding
+    version 缺省时使用模型注册表当前的版本；batch_size 为每次前向的最大样本数，缺省为 SERVING_BATCH_SIZE
     """
     if isinstance(input_data, dict):
         batch = [input_data]
     else:
-        batch = input_data
-    attr, traj = collate_fn(batch)
-    device = next(model.parameters()).device  # 获取模型所在设备
-    for k, v in attr.items():
-        attr[k] = utils.to_var(v)
-        if hasattr(attr[k], 'to'):
-            attr[k] = attr[k].to(device)
-    for k, v in traj.items():
-        traj[k] = utils.to_var(v)
-        if hasattr(traj[k], 'to'):
-            traj[k] = traj[k].to(device)
-    return attr, traj
-
-def predict_delay(input_data):
-    """
-    输入: 一条或多条原始数据（dict或list[dict]）
-    输出: 每条的预测晚点时长list
-    """
-    attr, traj = prepare_input_for_model(input_data)
-    with torch.no_grad():
-        pred_dict, _ = model.eval_on_batch(attr, traj, config)
-    pred = pred_dict['pred']
-    if isinstance(pred, torch.Tensor):
-        if pred.dim() == 0:
-            # 单个标量
-            return [float(pred.item())]
-        else:
-            return [float(p.item()) for p in pred]
-    else:
-        # 不是tensor，直接返回
-        return [float(pred)]
+        batch = list(input_data)
+    return (version or model_registry.active).predict(batch, batch_size)
 
 if __name__ == '__main__':
     # 示例用法
@@ -0,0 +1,204 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+import torch
+import torch.nn.functional as F
+from torch.nn.utils.rnn import pad_sequence
+
+from app.core.metrics import metrics
+from app.services.train_delay import cpu_tuning
+from app.services.train_delay.data_loader import collate_fn
+
+# GeoConv 只使用以下逐站特征，历史前缀是否一致只需比较这些值（time_gap / states 不进入编码器）
+_POINT_FEATURES = ('lngs', 'lats', 'dist_gap', 'weather', 'wind', 'temperature')
+
+
+class TrainState:
+    """
+    单个运行车次的局部编码器状态
+
+    - points / dist_tail: 最后 kernel_size - 1 个历史点经 process_coords 后的嵌入和归一化 dist_gap，
+      即下一个卷积窗口所需的尾部
+    - hidden: 2 层 LSTM 的 (h, c)
+    - H_local: 已编码的全部 LSTM 输出，作为注意力的 key / value
+    - n_points / digest: 已编码的历史点数及其特征摘要，用于判断新请求是否是同一条历史的延续
+    """
+    __slots__ = ('points', 'dist_tail', 'hidden', 'H_local', 'n_points', 'digest')
+
+    def __init__(self, points, dist_tail, hidden, H_local, n_points, digest):
+        self.points = points
+        self.dist_tail = dist_tail
+        self.hidden = hidden
+        self.H_local = H_local
+        self.n_points = n_points
+        self.digest = digest
+
+    def nbytes(self) -> int:
+        tensors = (self.points, self.dist_tail, self.hidden[0], self.hidden[1], self.H_local)
+        return sum(t.element_size() * t.nelement() for t in tensors)
+
+
+def _digest(sample: Dict[str, Any], n: int) -> int:
+    """前 n 个历史点特征的摘要"""
+    columns = [sample[key][:n] for key in _POINT_FEATURES]
+    return hash(tuple(tuple(column) for column in columns))
+
+
+class LSTMStateCache:
+    """
+    DeepTTE_nextstop 局部编码器（GeoConv + 2 层 LSTM）的增量状态缓存
+
+    以 (车次, 运行日期) 为键。同一车次再次请求时，若历史是已缓存历史的延续，
+    只对新增的站点做卷积和 LSTM 步进，注意力直接在缓存的 H_local 上计算；
+    否则（首次请求、历史被改写）完整编码一次。缓存按 LRU 淘汰，总字节数不超过 max_bytes，
+    车次到达终点后由调用方 evict。
+    """
+
+    def __init__(self, model, config: Dict[str, Any], max_bytes: int = 64 << 20):
+        self.model = model
+        self.config = config
+        self.geo_conv = model.local_encoder.geo_conv
+        self.rnn = model.local_encoder.rnn
+        self.kernel_size = model.kernel_size
+        self.max_bytes = max_bytes
+
+        self._states: "OrderedDict[Hashable, TrainState]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        metrics.set_gauge("state_cache.entries", lambda: len(self._states))
+        metrics.set_gauge("state_cache.bytes", lambda: self._bytes)
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._states
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def evict(self, key: Hashable) -> None:
+        """移除某车次的状态（车次到达终点时调用）"""
+        with self._lock:
+            state = self._states.pop(key, None)
+            if state is not None:
+                self._bytes -= state.nbytes()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._states.clear()
+            self._bytes = 0
+
+    def _store(self, key: Hashable, state: TrainState) -> None:
+        old = self._states.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes()
+        self._states[key] = state
+        self._bytes += state.nbytes()
+        while self._bytes > self.max_bytes and len(self._states) > 1:
+            _, evicted = self._states.popitem(last=False)
+            self._bytes -= evicted.nbytes()
+            metrics.inc("state_cache.evictions")
+
+    def _embed(self, traj, i: int, start: int, end: int) -> torch.Tensor:
+        """第 i 条轨迹 [start, end) 历史点的 process_coords 嵌入，与 GeoConv.forward 一致"""
+        g = self.geo_conv
+        temperature = traj['temperature'][i, start:end]
+        locs = torch.cat((
+            traj['lngs'][i, start:end].unsqueeze(1),
+            traj['lats'][i, start:end].unsqueeze(1),
+            g.weather_emb(traj['weather'][i, start:end].long()),
+            g.wind_emb(traj['wind'][i, start:end].long()),
+            temperature.unsqueeze(1),
+        ), dim=1)
+        return torch.tanh(g.process_coords(locs))
+
+    def _rnn_input(self, points: torch.Tensor, dist_gap: torch.Tensor) -> torch.Tensor:
+        """对连续的嵌入点做卷积并拼接局部距离，返回 (1, 窗口数, num_filter + 1)"""
+        k = self.kernel_size
+        windows = points.unfold(0, k, 1)  # (窗口数, 16, k)
+        conv = F.elu(self.geo_conv.conv(windows)).squeeze(-1)
+        # 与 utils.get_local_seq 相同：窗口首尾 dist_gap 之差再归一化
+        local_dist = (dist_gap[k - 1:] - dist_gap[:-k + 1] - self.config['dist_gap_mean']) / self.config['dist_gap_std']
+        return torch.cat((conv, local_dist.unsqueeze(1)), dim=1).unsqueeze(0)
+
+    def _encode(self, traj, i: int, n: int, state: Optional[TrainState]) -> TrainState:
+        """在 state 基础上编码到第 n 个历史点；state 为 None 时从头编码"""
+        k = self.kernel_size
+        if state is None:
+            points = self._embed(traj, i, 0, n)
+            dist_gap = traj['dist_gap'][i, :n]
+            out, hidden = self.rnn(self._rnn_input(points, dist_gap))
+            H_local = out.squeeze(0)
+        else:
+            points = torch.cat((state.points, self._embed(traj, i, state.n_points, n)))
+            dist_gap = torch.cat((state.dist_tail, traj['dist_gap'][i, state.n_points:n]))
+            out, hidden = self.rnn(self._rnn_input(points, dist_gap), state.hidden)
+            H_local = torch.cat((state.H_local, out.squeeze(0)))
+        return TrainState(points[-(k - 1):].clone(), dist_gap[-(k - 1):].clone(), hidden, H_local, n, None)
+
+    def _resolve(self, key: Hashable, sample: Dict[str, Any], traj, i: int, n: int) -> TrainState:
+        """
+        取得 key 编码到第 n 个历史点的状态，命中时只步进新增站点
+        锁只用于读取和写回缓存，编码在锁外进行，不同车次的请求可以并行推理；
+        缓存中的 TrainState 不会被修改，步进总是生成新对象
+        """
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None and state.n_points <= n and _digest(sample, state.n_points) == state.digest:
+                if state.n_points == n:
+                    self._states.move_to_end(key)
+                    metrics.inc("state_cache.hits")
+                    return state
+                metrics.inc("state_cache.hits")
+                metrics.inc("state_cache.steps", n - state.n_points)
+            else:
+                state = None
+                metrics.inc("state_cache.misses")
+
+        state = self._encode(traj, i, n, state)
+        state.digest = _digest(sample, n)
+
+        with self._lock:
+            # 同一车次的并发请求可能已写回更长的历史，此时保留缓存中的状态
+            current = self._states.get(key)
+            if current is None or current.n_points <= n:
+                self._store(key, state)
+        return state
+
+    @torch.no_grad()
+    def predict(self, keys: Sequence[Hashable], samples: List[Dict[str, Any]]) -> List[float]:
+        """
+        批量预测，结果与 DeepTTE_nextstop.Net 完整前向一致
+        keys[i] 为第 i 条样本的 (车次, 运行日期)；样本最后一个点为目标站点
+        """
+        attr, traj = collate_fn(samples)
+        lens = traj['lens']
+        if min(lens) - 1 < self.kernel_size:
+            raise ValueError(f"历史轨迹短于卷积核 {self.kernel_size}，无法增量编码")
+        with cpu_tuning.autocast():
+            return self._predict(keys, samples, attr, traj)
+
+    def _predict(self, keys, samples, attr, traj) -> List[float]:
+        lens = traj['lens']
+
+        H_list = [self._resolve(key, sample, traj, i, lens[i] - 1).H_local
+                  for i, (key, sample) in enumerate(zip(keys, samples))]
+
+        model = self.model
+        H_local = pad_sequence(H_list, batch_first=True)
+        local_lens = torch.tensor([h.size(0) for h in H_list])
+        mask = torch.arange(H_local.size(1))[None, :] < local_lens[:, None]
+
+        rows = torch.arange(len(samples))
+        last = torch.tensor(lens) - 1
+        y_features = {k: v[rows, last] for k, v in traj.items() if k != 'lens'}
+
+        q_T = model.query_encoder(attr, y_features, self.config)
+        z_global, _ = model.attention(model.W_q(q_T), H_local, H_local, mask=mask)
+        y_hat_T = model.global_decoder(z_global).squeeze(-1).float()
+        pred = y_hat_T * self.config['time_gap_std'] + self.config['time_gap_mean']
+        return [float(p) for p in pred]
@@ -0,0 +1,310 @@
+"""
+DeepTTE_nextstop 训练入口
+
+用法:
+    python -m app.services.train_delay.train                                  # 按 config_update.json 训练
+    python -m app.services.train_delay.train --epochs 60 --batch-size 256 --seed 7
+    python -m app.services.train_delay.train --resume saved_weights/run_log_xxx.ckpt   # 断点续训
+    python -m app.services.train_delay.train --test-only --weights saved_weights/run_log_xxx
+    python -m app.services.train_delay.train --bf16 --threads 16 --cpus 0-15       # CPU 节点 bf16 训练
+
+- 数据由 data_loader_nextstop.get_loader 读取（已打包的数据集自动使用内存映射格式）
+- 每 --checkpoint-every 个 epoch 写一次完整检查点 saved_weights/<log_name>.ckpt
+  （模型、优化器、epoch、最优指标和各随机数生成器状态），--resume 从该 epoch 结束处精确续训
+- 验证集 MAE 最优的模型以纯 state_dict 保存为 saved_weights/<log_name>，可直接用于 predict_delay_api
+- 训练结束后在测试集上预测，逐行写入 result/<log_name>.res（"真实值 预测值"，单位分钟）
+"""
+import argparse
+import inspect
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+import numpy as np
+import torch
+
+from app.services.train_delay import cpu_tuning, models, utils
+from app.services.train_delay.data_loader_nextstop import get_loader
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(BASE_DIR, 'config_update.json')
+SAVE_DIR = os.path.join(BASE_DIR, 'saved_weights')
+RESULT_DIR = os.path.join(BASE_DIR, 'result')
+
+TRAJ_ATTRS = ['lngs', 'lats', 'time_gap', 'dist_gap', 'weather', 'wind', 'temperature']
+# collate_fn 中标签只有 time_gap 已归一化，其余逐站特征需与历史部分一致地归一化
+NORMALIZED_TARGET_ATTRS = ['lngs', 'lats', 'dist_gap', 'temperature']
+
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    torch.cuda.manual_seed_all(seed)
+    torch.backends.cudnn.deterministic = True
+    torch.backends.cudnn.benchmark = False
+
+
+def rng_state():
+    state = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state['cuda'] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    random.setstate(state['python'])
+    np.random.set_state(state['numpy'])
+    torch.set_rng_state(state['torch'])
+    if 'cuda' in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state['cuda'])
+
+
+def build_model(config):
+    """只用 Net.__init__ 接受的配置项构造模型（与 predict_delay_api 一致）"""
+    init_args = inspect.getfullargspec(models.DeepTTE_nextstop.Net.__init__).args
+    return models.DeepTTE_nextstop.Net(**{k: v for k, v in config.items() if k in init_args and k != 'self'})
+
+
+def merge_target(traj, y_batch):
+    """
+    data_loader_nextstop 将轨迹拆为历史 traj（前 T-1 步）和目标 y_batch（第 T 步），
+    Net.forward 需要包含目标站点的完整轨迹：把目标写回每条轨迹的第 lens 个位置
+    """
+    lens = traj['lens']
+    rows = torch.arange(len(lens))
+    cols = torch.tensor(lens)
+    for key in TRAJ_ATTRS:
+        history = traj[key]
+        merged = torch.zeros(history.size(0), history.size(1) + 1, dtype=history.dtype)
+        merged[:, :-1] = history
+        target = torch.as_tensor(y_batch[key])
+        if key in NORMALIZED_TARGET_ATTRS:
+            target = utils.normalize(target.float(), key)
+        merged[rows, cols] = target.to(history.dtype)
+        traj[key] = merged
+    traj['lens'] = [l + 1 for l in lens]
+    return traj
+
+
+def to_device(attr, traj, device):
+    attr = {k: v.to(device) for k, v in attr.items()}
+    traj = {k: v.to(device) if torch.is_tensor(v) else v for k, v in traj.items()}
+    return attr, traj
+
+
+def save_atomic(obj, path):
+    tmp = path + '.tmp'
+    torch.save(obj, tmp)
+    os.replace(tmp, path)
+
+
+class Trainer:
+    def __init__(self, args, config):
+        self.args = args
+        self.config = config
+        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.model = build_model(config).to(self.device)
+        self.optimizer = torch.optim.Adam(self.model.parameters(), lr=args.lr)
+        self.start_epoch = 0
+        self.best_mae = float('inf')
+        self._loaders = {}
+        self._sampler_state = {}
+
+        os.makedirs(args.save_dir, exist_ok=True)
+        self.best_path = os.path.join(args.save_dir, args.log_name)
+        self.ckpt_path = self.best_path + '.ckpt'
+
+    def loader(self, input_file):
+        # loader 跨 epoch 复用：多 worker 时 persistent worker 只启动一次
+        if input_file not in self._loaders:
+            loader = get_loader(input_file, self.args.batch_size, self.config, num_workers=self.args.workers)
+            if input_file in self._sampler_state:
+                loader.batch_sampler.indices = self._sampler_state.pop(input_file)
+            self._loaders[input_file] = loader
+        return self._loaders[input_file]
+
+    def batches(self, input_file):
+        for (attr, traj), y_batch in self.loader(input_file):
+            yield to_device(attr, merge_target(traj, y_batch), self.device)
+
+    def train_epoch(self, epoch):
+        self.model.train()
+        samples, total_loss, batches = 0, 0.0, 0
+        data_time, start = 0.0, time.perf_counter()
+        for input_file in self.config['train_set']:
+            fetch_start = time.perf_counter()
+            for attr, traj in self.batches(input_file):
+                data_time += time.perf_counter() - fetch_start
+                with cpu_tuning.autocast(self.args.bf16):
+                    _, loss = self.model.eval_on_batch(attr, traj, self.config)
+                self.optimizer.zero_grad()
+                loss.backward()
+                self.optimizer.step()
+
+                n = len(traj['lens'])
+                samples += n
+                total_loss += loss.item() * n
+                batches += 1
+                if self.args.log_every and batches % self.args.log_every == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"  epoch {epoch} batch {batches}: loss {total_loss / samples:.4f}, "
+                          f"{samples / elapsed:.0f} samples/s")
+                fetch_start = time.perf_counter()
+
+        elapsed = time.perf_counter() - start
+        return {
+            'loss': total_loss / max(samples, 1),
+            'samples': samples,
+            'time': elapsed,
+            'samples_per_sec': samples / elapsed if elapsed > 0 else 0.0,
+            'data_time': data_time,
+        }
+
+    @torch.no_grad()
+    def evaluate(self, input_files, result_file=None):
+        """返回加权 MAE / RMSE（分钟）；指定 result_file 时逐条写出真实值和预测值"""
+        self.model.eval()
+        samples, abs_err, sq_err = 0, 0.0, 0.0
+        out = open(result_file, 'w') if result_file else None
+        try:
+            for input_file in input_files:
+                for attr, traj in self.batches(input_file):
+                    with cpu_tuning.autocast(self.args.bf16):
+                        pred_dict, _ = self.model.eval_on_batch(attr, traj, self.config)
+                    pred = pred_dict['pred'].reshape(-1).cpu()
+                    label = pred_dict['label'].reshape(-1).cpu()
+                    samples += label.numel()
+                    abs_err += torch.abs(pred - label).sum().item()
+                    sq_err += ((pred - label) ** 2).sum().item()
+                    if out is not None:
+                        for l, p in zip(label.tolist(), pred.tolist()):
+                            out.write(f"{l:.6f} {p:.6f}\n")
+        finally:
+            if out is not None:
+                out.close()
+        samples = max(samples, 1)
+        return {'mae': abs_err / samples, 'rmse': (sq_err / samples) ** 0.5, 'samples': samples}
+
+    def save_checkpoint(self, epoch):
+        save_atomic({
+            'epoch': epoch,
+            'model': self.model.state_dict(),
+            'optimizer': self.optimizer.state_dict(),
+            'best_mae': self.best_mae,
+            'rng': rng_state(),
+            # BatchSampler 在上一 epoch 的顺序上原地打乱，续训需要恢复各数据集当前的下标顺序
+            'samplers': {f: list(loader.batch_sampler.indices) for f, loader in self._loaders.items()},
+            'config': self.config,
+            'args': vars(self.args),
+        }, self.ckpt_path)
+
+    def resume(self, path):
+        ckpt = torch.load(path, map_location=self.device, weights_only=False)
+        self.model.load_state_dict(ckpt['model'])
+        self.optimizer.load_state_dict(ckpt['optimizer'])
+        self.start_epoch = ckpt['epoch'] + 1
+        self.best_mae = ckpt['best_mae']
+        set_rng_state(ckpt['rng'])
+        self._sampler_state = ckpt['samplers']
+        print(f"从 {path} 恢复: 已完成 {ckpt['epoch'] + 1} 个 epoch，最优验证 MAE {self.best_mae:.4f}")
+
+    def fit(self):
+        args = self.args
+        for epoch in range(self.start_epoch, args.epochs):
+            stats = self.train_epoch(epoch)
+            line = (f"epoch {epoch}: loss {stats['loss']:.4f}, {stats['samples']} 样本, "
+                    f"耗时 {stats['time']:.1f}s (数据 {stats['data_time']:.1f}s), "
+                    f"{stats['samples_per_sec']:.0f} samples/s")
+
+            if self.config.get('eval_set'):
+                val = self.evaluate(self.config['eval_set'])
+                line += f", 验证 MAE {val['mae']:.4f} RMSE {val['rmse']:.4f}"
+                if val['mae'] < self.best_mae:
+                    self.best_mae = val['mae']
+                    save_atomic(self.model.state_dict(), self.best_path)
+                    line += " *"
+            else:
+                save_atomic(self.model.state_dict(), self.best_path)
+            print(line)
+
+            if (epoch + 1) % args.checkpoint_every == 0 or epoch + 1 == args.epochs:
+                self.save_checkpoint(epoch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练 DeepTTE_nextstop 晚点预测模型")
+    parser.add_argument('--config', default=CONFIG_PATH, help='配置文件（归一化参数与数据集列表）')
+    parser.add_argument('--train', nargs='+', help='覆盖配置中的 train_set')
+    parser.add_argument('--eval', nargs='+', help='覆盖配置中的 eval_set')
+    parser.add_argument('--test', nargs='+', help='覆盖配置中的 test_set')
+    parser.add_argument('--epochs', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=400)
+    parser.add_argument('--lr', type=float, default=1e-3)
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--workers', type=int, default=None, help='DataLoader worker 数，默认见 LOADER_WORKERS')
+    parser.add_argument('--log-name', default=None, help='运行名，默认 run_log_<时间戳>')
+    parser.add_argument('--save-dir', default=SAVE_DIR)
+    parser.add_argument('--result-dir', default=RESULT_DIR)
+    parser.add_argument('--checkpoint-every', type=int, default=1, help='每隔几个 epoch 写一次完整检查点')
+    parser.add_argument('--log-every', type=int, default=0, help='每隔几个 batch 打印一次进度，0 不打印')
+    parser.add_argument('--resume', help='从完整检查点续训')
+    parser.add_argument('--bf16', action='store_true', help='CPU bf16 自动混合精度（训练和测试）')
+    parser.add_argument('--threads', type=int, default=None, help='torch 算子内线程数，默认为绑定的核数')
+    parser.add_argument('--interop-threads', type=int, default=None, help='torch 算子间线程数')
+    parser.add_argument('--cpus', default=None, help='绑定的 CPU 核，如 0-15 或 0-7,16-23')
+    parser.add_argument('--test-only', action='store_true', help='只在测试集上预测')
+    parser.add_argument('--weights', help='--test-only 时加载的模型权重（state_dict）')
+    args = parser.parse_args()
+
+    # 线程池须在任何并行计算之前配置
+    tuning = cpu_tuning.configure_threads(args.threads, args.interop_threads,
+                                          cpu_tuning.parse_cpu_list(args.cpus) if args.cpus else None)
+    if args.bf16 and not tuning['bf16_native']:
+        print("警告: CPU 不支持原生 bf16 指令，bf16 可能比 fp32 更慢")
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    for key in ('train', 'eval', 'test'):
+        if getattr(args, key):
+            config[key + '_set'] = getattr(args, key)
+
+    if args.resume:
+        # 续训沿用原运行名和超参数，保证检查点和结果文件连续
+        saved = torch.load(args.resume, map_location='cpu', weights_only=False)['args']
+        for key in ('log_name', 'batch_size', 'lr', 'seed'):
+            setattr(args, key, saved[key])
+    if args.log_name is None:
+        args.log_name = 'run_log_' + datetime.now().strftime('%Y-%m-%d_%H%M%S')
+
+    seed_everything(args.seed)
+    trainer = Trainer(args, config)
+
+    if args.test_only:
+        if args.weights:
+            trainer.model.load_state_dict(torch.load(args.weights, map_location=trainer.device))
+    else:
+        if args.resume:
+            trainer.resume(args.resume)
+        print(f"开始训练 {args.log_name}: {args.epochs} epochs, batch {args.batch_size}, "
+              f"lr {args.lr}, seed {args.seed}, 设备 {trainer.device}, bf16 {args.bf16}, "
+              f"线程 {tuning['intra_threads']}/{tuning['interop_threads']}")
+        trainer.fit()
+        if os.path.exists(trainer.best_path):
+            trainer.model.load_state_dict(torch.load(trainer.best_path, map_location=trainer.device))
+
+    if config.get('test_set'):
+        os.makedirs(args.result_dir, exist_ok=True)
+        result_file = os.path.join(args.result_dir, args.log_name + '.res')
+        test = trainer.evaluate(config['test_set'], result_file)
+        print(f"测试集 {test['samples']} 样本: MAE {test['mae']:.4f} RMSE {test['rmse']:.4f} -> {result_file}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+import csv
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.metrics import metrics
+from app.services.timetable_store import from_epoch_minute, to_epoch_minute
+
+# 各站天气观测的 CSV 文件（列: station,observed_at,weather,temperature,wind），为空表示只用数据库表
+WEATHER_FILE = os.getenv('WEATHER_FILE', '')
+# 观测的有效时长（小时）：取请求时刻所在小时及之前最近的观测，超过该时长视为没有观测
+WEATHER_MAX_AGE_HOURS = int(os.getenv('WEATHER_MAX_AGE_HOURS', '3'))
+
+# 没有观测时按轨迹位置使用的默认值（与原固定特征相同）
+DEFAULT_WEATHER = [22, 22, 1, 1]
+DEFAULT_TEMPERATURE = [9, 10, 8, 8]
+DEFAULT_WIND = [24, 24, 15, 15]
+
+# 天气 / 风力代码的取值个数，与 GeoConv / QueryEncoder 中 weather_emb、wind_emb 的词表大小一致
+WEATHER_CODES = 24
+WIND_CODES = 42
+
+_HOUR_BITS = 32
+_HOUR_MASK = (1 << _HOUR_BITS) - 1
+
+# (站点, 观测时刻, 天气代码, 气温, 风力代码)
+Observation = Tuple[str, datetime, int, float, int]
+
+
+def stretch(values: List, length: int) -> List:
+    """将逐站特征截取或以末值延长到 length（与 DataInputUtils.stretch 相同）"""
+    return (list(values) + [values[-1]] * length)[:length]
+
+
+class WeatherProvider:
+    """
+    各站天气特征的内存索引
+
+    观测按 (站点, epoch 小时) 编码为一个 int64 键（站点 ID 在高 32 位），排序后与天气代码、气温、风力代码
+    三个等长数组一起保存；同一站点同一小时的多条观测只保留最后写入的一条。
+    查询时把一条轨迹（或一批轨迹）的全部 (站点, 小时) 编码后一次 searchsorted，
+    取该小时及之前 max_age_hours 内最近的观测。
+
+    写入时在新数组上合并后整体替换快照，查询无需加锁。
+    """
+
+    def __init__(self, max_age_hours: int = WEATHER_MAX_AGE_HOURS):
+        self.max_age_hours = max_age_hours
+        self._lock = threading.Lock()
+        self._station_index: Dict[str, int] = {}
+        # (键, 天气代码, 气温, 风力代码)
+        self._snapshot: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray] = (
+            np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32),
+            np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int32))
+        metrics.set_gauge("weather.observations", lambda: len(self))
+
+    def __len__(self) -> int:
+        return len(self._snapshot[0])
+
+    def add(self, observations: Iterable[Observation]) -> int:
+        """写入观测，返回写入条数"""
+        with self._lock:
+            index = dict(self._station_index)
+            keys, weather, temperature, wind = [], [], [], []
+            for station, observed_at, weather_code, temp, wind_code in observations:
+                sid = index.setdefault(station, len(index))
+                keys.append((sid << _HOUR_BITS) | (to_epoch_minute(observed_at) // 60))
+                weather.append(weather_code)
+                temperature.append(temp)
+                wind.append(wind_code)
+            if not keys:
+                return 0
+
+            old = self._snapshot
+            # 新观测排在旧观测之后，稳定排序后每个键的最后一条即最新写入
+            all_keys = np.concatenate([old[0], np.array(keys, dtype=np.int64)])
+            order = np.argsort(all_keys, kind='stable')
+            all_keys = all_keys[order]
+            last = np.append(all_keys[1:] != all_keys[:-1], True)
+            picked = order[last]
+            self._snapshot = (
+                all_keys[last],
+                np.concatenate([old[1], np.array(weather, dtype=np.int32)])[picked],
+                np.concatenate([old[2], np.array(temperature, dtype=np.float32)])[picked],
+                np.concatenate([old[3], np.array(wind, dtype=np.int32)])[picked],
+            )
+            self._station_index = index
+        metrics.inc("weather.ingested", len(keys))
+        return len(keys)
+
+    def lookup(self, stations: Sequence[str], hours: np.ndarray
+               ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        每个 (站点, epoch 小时) 的 (是否有观测, 天气代码, 气温, 风力代码)
+        没有观测的位置代码为 0，由调用方填默认值
+        """
+        keys, weather, temperature, wind = self._snapshot
+        index = self._station_index
+        hours = np.asarray(hours, dtype=np.int64)
+        sid = np.array([index.get(s, -1) for s in stations], dtype=np.int64)
+        if len(keys) == 0 or len(sid) == 0:
+            found = np.zeros(len(sid), dtype=bool)
+            return found, np.zeros(len(sid), np.int32), np.zeros(len(sid), np.float32), np.zeros(len(sid), np.int32)
+
+        pos = np.searchsorted(keys, (sid << _HOUR_BITS) | hours, side='right') - 1
+        safe = np.maximum(pos, 0)
+        hit = keys[safe]
+        found = ((sid >= 0) & (pos >= 0) & ((hit >> _HOUR_BITS) == sid)
+                 & (hours - (hit & _HOUR_MASK) <= self.max_age_hours))
+        return (found, np.where(found, weather[safe], 0), np.where(found, temperature[safe], 0),
+                np.where(found, wind[safe], 0))
+
+    def trajectory_features(self, stations: Sequence[str], time_obj: datetime
+                            ) -> Tuple[List, List, List]:
+        """
+        一条已补齐长度的轨迹各站在 time_obj 所在小时的 (weather, temperature, wind)
+        没有观测的位置使用默认值
+        """
+        length = len(stations)
+        hours = np.full(length, to_epoch_minute(time_obj) // 60, dtype=np.int64)
+        return self._fill(self.lookup(stations, hours), length)
+
+    @staticmethod
+    def default_features(length: int) -> Tuple[List, List, List]:
+        """没有任何观测时长度为 length 的轨迹的 (weather, temperature, wind)"""
+        return stretch(DEFAULT_WEATHER, length), stretch(DEFAULT_TEMPERATURE, length), stretch(DEFAULT_WIND, length)
+
+    @classmethod
+    def _fill(cls, looked_up, length: int) -> Tuple[List, List, List]:
+        found, weather, temperature, wind = looked_up
+        default_weather, default_temperature, default_wind = cls.default_features(length)
+        if not found.any():
+            return default_weather, default_temperature, default_wind
+        metrics.inc("weather.hits", int(found.sum()))
+        hit = found.tolist()
+        return ([int(w) if f else d for f, w, d in zip(hit, weather.tolist(), default_weather)],
+                [float(t) if f else d for f, t, d in zip(hit, temperature.tolist(), default_temperature)],
+                [int(w) if f else d for f, w, d in zip(hit, wind.tolist(), default_wind)])
+
+    def batch_features(self, stations: Sequence[str], hours: np.ndarray, starts: np.ndarray,
+                       ends: np.ndarray) -> List[Tuple[List, List, List]]:
+        """
+        一批轨迹（平铺的站点序列，starts/ends 为各轨迹区间）的天气特征，一次查询
+        hours 为每个停站对应的 epoch 小时
+        """
+        found, weather, temperature, wind = self.lookup(stations, hours)
+        return [self._fill((found[s:e], weather[s:e], temperature[s:e], wind[s:e]), e - s)
+                for s, e in zip(starts.tolist(), ends.tolist())]
+
+    def load_csv(self, path: str, weather_mapping: Dict[str, int], wind_mapping: Dict[str, int]) -> int:
+        """读取观测 CSV（列: station,observed_at,weather,temperature,wind），天气和风力经 resolve_observations 转为代码"""
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            rows = ((row['station'], datetime.strptime(row['observed_at'], '%Y-%m-%d %H:%M:%S'),
+                     row['weather'], row['temperature'], row['wind']) for row in csv.DictReader(f))
+            return self.add(resolve_observations(rows, weather_mapping, wind_mapping))
+
+    def status(self) -> dict:
+        keys = self._snapshot[0]
+        if len(keys) == 0:
+            return {'observations': 0, 'stations': 0}
+        hours = keys & _HOUR_MASK
+        return {
+            'observations': int(len(keys)),
+            'stations': len(self._station_index),
+            'earliest': str(from_epoch_minute(int(hours.min()) * 60)),
+            'latest': str(from_epoch_minute(int(hours.max()) * 60)),
+        }
+
+
+def observation_code(value, mapping: Dict[str, int], size: int) -> Optional[int]:
+    """
+    天气 / 风力代码：数字或数字字符串直接作为代码，其余按名称映射；
+    未知名称或不在 [0, size) 内的代码（模型 Embedding 无法查表）返回 None
+    """
+    if isinstance(value, int):
+        code = value
+    else:
+        value = str(value).strip()
+        code = int(value) if value.lstrip('-').isdigit() else mapping.get(value)
+    if code is None or not 0 <= code < size:
+        return None
+    return code
+
+
+def resolve_observations(rows: Iterable[tuple], weather_mapping: Dict[str, int],
+                         wind_mapping: Dict[str, int]) -> Iterator[Observation]:
+    """
+    (站点, 观测时刻, 天气, 气温, 风力) 行转为观测，数据库与 CSV 共用
+    天气或风力名称未知、代码超出模型取值范围的行跳过（该站该小时视为没有观测），不以默认代码冒充观测值
+    """
+    unknown = set()
+    for station, observed_at, weather, temperature, wind in rows:
+        weather_code = observation_code(weather, weather_mapping, WEATHER_CODES)
+        wind_code = observation_code(wind, wind_mapping, WIND_CODES)
+        if weather_code is None or wind_code is None:
+            metrics.inc("weather.unknown_codes")
+            name = weather if weather_code is None else wind
+            if name not in unknown:
+                unknown.add(name)
+                print(f"天气观测中的 {name!r} 不在 weather / wind 表中或代码超出范围"
+                      f"（天气 0~{WEATHER_CODES - 1}，风力 0~{WIND_CODES - 1}），跳过该观测")
+            continue
+        yield station, observed_at, weather_code, float(temperature), wind_code
+
+
+# 全局天气特征索引
+weather_provider = WeatherProvider()
@@ -0,0 +1,64 @@
+# Gunicorn 预派生（pre-fork）多 worker 部署配置
+# 用法: gunicorn -c gunicorn.conf.py app.main:app
+#
+# preload_app=True 时 master 先导入 app.main：晚点预测模型权重、DataInputUtils 的站点/距离/时刻表
+# 映射都只在 master 中加载一次，fork 出的 worker 以写时复制方式共享这些内存页。
+# 每个 worker 在自己的 startup 事件中建立独立的数据库连接。
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+worker_class = 'uvicorn.workers.UvicornWorker'
+preload_app = True
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+
+
+def _torch_threads_per_worker() -> int:
+    """每个 worker 的 torch 算子内线程数，默认按 CPU 核数平均分给各 worker"""
+    configured = os.getenv('TORCH_NUM_THREADS')
+    if configured:
+        return max(1, int(configured))
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def when_ready(server):
+    """master 加载完成、fork worker 之前调用"""
+    from app.core.database import db_connection
+
+    # master 不处理请求，关闭导入阶段建立的连接，避免 worker 继承并共享同一个 socket
+    db_connection.close()
+
+    # 将已加载的对象移出 GC 跟踪，避免 worker 中的垃圾回收扫描触碰这些页面而触发写时复制
+    gc.freeze()
+    server.log.info("master 预加载完成，torch 线程数/worker: %s", _torch_threads_per_worker())
+
+
+def _worker_cpus(worker):
+    """
+    TORCH_CPU_AFFINITY（如 0-15）设置时，把这些核按 worker 平均切分，返回本 worker 绑定的核
+    按 worker.age 轮流分配：被重启的 worker 可能与存活 worker 共用一段核，不影响正确性
+    """
+    from app.services.train_delay.cpu_tuning import parse_cpu_list
+
+    spec = os.getenv('TORCH_CPU_AFFINITY')
+    if not spec:
+        return None
+    cpus = parse_cpu_list(spec)
+    per_worker = max(1, len(cpus) // max(1, workers))
+    slot = (worker.age - 1) % max(1, len(cpus) // per_worker)
+    return cpus[slot * per_worker:(slot + 1) * per_worker]
+
+
+def post_fork(server, worker):
+    """worker fork 后立即调用：设置本进程的 torch 线程数和 CPU 亲和性"""
+    from app.services.train_delay.cpu_tuning import configure_threads
+
+    cpus = _worker_cpus(worker)
+    # 绑核且未显式指定 TORCH_NUM_THREADS 时，线程数等于绑定的核数
+    intra = None if cpus is not None and not os.getenv('TORCH_NUM_THREADS') else _torch_threads_per_worker()
+    tuning = configure_threads(intra, int(os.getenv('TORCH_NUM_INTEROP_THREADS', '1')), cpus)
+    server.log.info("worker %s torch 线程 %s/%s, CPU %s", worker.pid, tuning['intra_threads'],
+                    tuning['interop_threads'], cpus if cpus is not None else "不限")
@@ -0,0 +1,29 @@
+-- test3 时刻表查询索引（与 app/services/timetable_queries.py 中的查询对应）
+-- 已有数据库执行一次即可，可重复执行（索引已存在时跳过）：
+--   docker exec -i railway-mysql mysql -uroot -pqwe123 train < migrations/001_test3_indexes.sql
+-- 新建的数据库由 init.sql 直接创建这些索引。
+
+USE train;
+
+-- 按车次取当日站点序列；并发列车查询中按车次找区段另一端的停站
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+               WHERE table_schema = DATABASE() AND table_name = 'test3' AND index_name = 'idx_train_departure') = 0,
+              'ALTER TABLE `test3` ADD INDEX `idx_train_departure` (`train_ID`, `departure_time`, `station`, `arrival_time`)',
+              'SELECT 1');
+PREPARE stmt FROM @ddl; EXECUTE stmt; DEALLOCATE PREPARE stmt;
+
+-- 时间窗口内从事故站点出发的停站
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+               WHERE table_schema = DATABASE() AND table_name = 'test3' AND index_name = 'idx_station_departure') = 0,
+              'ALTER TABLE `test3` ADD INDEX `idx_station_departure` (`station`, `departure_time`, `train_ID`, `arrival_time`)',
+              'SELECT 1');
+PREPARE stmt FROM @ddl; EXECUTE stmt; DEALLOCATE PREPARE stmt;
+
+-- 时间窗口内到达事故站点的停站
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.statistics
+               WHERE table_schema = DATABASE() AND table_name = 'test3' AND index_name = 'idx_station_arrival') = 0,
+              'ALTER TABLE `test3` ADD INDEX `idx_station_arrival` (`station`, `arrival_time`, `train_ID`, `departure_time`)',
+              'SELECT 1');
+PREPARE stmt FROM @ddl; EXECUTE stmt; DEALLOCATE PREPARE stmt;
+
+ANALYZE TABLE `test3`;
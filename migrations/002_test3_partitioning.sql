@@ -0,0 +1,26 @@
+-- test3 按出发日期做 RANGE 分区（每天一个分区，由 app/services/timetable_loader.py 维护）
+-- 已有数据库执行一次即可，可重复执行（表已分区时跳过）：
+--   docker exec -i railway-mysql mysql -uroot -pqwe123 train < migrations/002_test3_partitioning.sql
+--   docker exec server python -m app.services.timetable_loader ensure --until 2025-07-23
+-- 第二条命令把已有数据所在的日期从 p_future 拆成日分区；之后导入新时刻表时加载器自动补齐分区。
+-- 新建的数据库由 init.sql 直接创建分区表。
+--
+-- MySQL 要求分区列出现在每个唯一键中，主键由 (id) 改为 (id, departure_time)；
+-- id 仍自增且唯一，TimetableSync 按 id 水位线的增量同步不受影响。
+--
+-- 注意：改主键并分区会复制重建整张 test3（ALGORITHM=COPY），期间阻塞写入，耗时与表大小成正比；
+-- 请在维护窗口执行，并先在数据库副本（mysqldump 导入的测试库）上试跑确认。
+
+USE train;
+
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.partitions
+               WHERE table_schema = DATABASE() AND table_name = 'test3' AND partition_name IS NOT NULL) = 0,
+              'ALTER TABLE `test3` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `departure_time`)
+               PARTITION BY RANGE (TO_DAYS(`departure_time`)) (
+                 PARTITION p_start VALUES LESS THAN (TO_DAYS(''2025-07-01'')),
+                 PARTITION p_future VALUES LESS THAN MAXVALUE
+               )',
+              'SELECT 1');
+PREPARE stmt FROM @ddl; EXECUTE stmt; DEALLOCATE PREPARE stmt;
+
+ANALYZE TABLE `test3`;
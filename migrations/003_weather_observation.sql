@@ -0,0 +1,20 @@
+-- 各站天气观测表（app/services/weather_provider.py 的数据源）
+-- 已有数据库执行一次即可，可重复执行：
+--   docker exec -i railway-mysql mysql -uroot -pqwe123 train < migrations/003_weather_observation.sql
+-- 新建的数据库由 init.sql 直接创建。
+--
+-- weather / wind 为 weather、wind 表中的名称（或直接写代码），temperature 为摄氏度；名称不在表中的行不使用。
+-- 服务按自增 id 增量同步，修正观测时写入新行（同一站点同一小时以最后写入的为准）。
+
+USE train;
+
+CREATE TABLE IF NOT EXISTS `weather_observation` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `station` varchar(50) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `observed_at` datetime NOT NULL,
+  `weather` varchar(64) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `temperature` float NOT NULL,
+  `wind` varchar(64) COLLATE utf8mb4_unicode_ci NOT NULL,
+  PRIMARY KEY (`id`),
+  KEY `idx_station_observed` (`station`,`observed_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -0,0 +1,22 @@
+-- test3 增加更新时间列 updated_at（插入和 UPDATE 时由 MySQL 自动维护），TimetableSync 按该列增量同步
+-- 已有数据库执行一次即可，可重复执行（列已存在时跳过），执行后重启服务切换为按 updated_at 同步：
+--   docker exec -i railway-mysql mysql -uroot -pqwe123 train < migrations/004_test3_updated_at.sql
+-- 新建的数据库由 init.sql 直接创建该列。
+--
+-- 迁移后调度对时刻表的修改可直接 UPDATE 原行，同步时按 (车次, 站点, 出发日期) 替换内存中的停站；
+-- 删除的行在 worker 重启前仍留在内存中。
+--
+-- 注意：分区表增加列会重建整张 test3，期间阻塞写入，耗时与表大小成正比；
+-- 请在维护窗口执行，并先在数据库副本上试跑确认。
+
+USE train;
+
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.columns
+               WHERE table_schema = DATABASE() AND table_name = 'test3' AND column_name = 'updated_at') = 0,
+              'ALTER TABLE `test3`
+                 ADD COLUMN `updated_at` datetime(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3),
+                 ADD INDEX `idx_updated_at` (`updated_at`)',
+              'SELECT 1');
+PREPARE stmt FROM @ddl; EXECUTE stmt; DEALLOCATE PREPARE stmt;
+
+ANALYZE TABLE `test3`;
@@ -0,0 +1,112 @@
+"""
+DeepTTE_nextstop 在 CPU 上 fp32 与 bf16 autocast 的速度和精度对比
+
+用法:
+    python scripts/bench_bf16.py                                        # 合成测试集 + 线上权重
+    python scripts/bench_bf16.py --input data/test_finals_update100.json --threads 16 --cpus 0-15
+    python scripts/bench_bf16.py --train-steps 50                       # 同时对比训练步吞吐
+
+推理：对整个测试集前向，报告 samples/s、MAE / RMSE（分钟）以及 bf16 与 fp32 预测的最大差值。
+训练：从相同权重出发各跑 --train-steps 个优化步，报告 samples/s 和最终损失。
+batch 事先整理好，计时只包含模型计算。
+"""
+import argparse
+import copy
+import json
+import os
+import sys
+import tempfile
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.train_delay import cpu_tuning, data_loader
+from app.services.train_delay.train import CONFIG_PATH, build_model, seed_everything
+from bench_loader import write_synthetic
+
+WEIGHT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'services', 'train_delay',
+                           'saved_weights', 'run_log_GPU_2025-06-26_222529.890974_update1003')
+
+
+@torch.no_grad()
+def run_inference(model, batches, config, bf16):
+    model.eval()
+    preds, labels = [], []
+    start = time.perf_counter()
+    for attr, traj in batches:
+        with cpu_tuning.autocast(bf16):
+            pred_dict, _ = model.eval_on_batch(attr, traj, config)
+        preds.append(pred_dict['pred'].reshape(-1).float())
+        labels.append(pred_dict['label'].reshape(-1).float())
+    elapsed = time.perf_counter() - start
+    return torch.cat(preds), torch.cat(labels), elapsed
+
+
+def run_training(model, batches, config, bf16, steps):
+    model.train()
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    samples, loss = 0, None
+    start = time.perf_counter()
+    for step in range(steps):
+        attr, traj = batches[step % len(batches)]
+        with cpu_tuning.autocast(bf16):
+            _, loss = model.eval_on_batch(attr, traj, config)
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        samples += len(traj['lens'])
+    return samples / (time.perf_counter() - start), loss.item()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', help='JSON 行测试数据，缺省时生成合成数据')
+    parser.add_argument('--samples', type=int, default=5000, help='合成数据条数')
+    parser.add_argument('--weights', default=WEIGHT_PATH)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--train-steps', type=int, default=0)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--interop-threads', type=int, default=None)
+    parser.add_argument('--cpus', default=None, help='绑定的 CPU 核，如 0-15')
+    args = parser.parse_args()
+
+    tuning = cpu_tuning.configure_threads(args.threads, args.interop_threads,
+                                          cpu_tuning.parse_cpu_list(args.cpus) if args.cpus else None)
+    print(f"线程 {tuning['intra_threads']}/{tuning['interop_threads']}，原生 bf16: {tuning['bf16_native']}")
+
+    with open(CONFIG_PATH, 'r') as f:
+        config = json.load(f)
+
+    input_file = args.input
+    if input_file is None:
+        input_file = os.path.join(tempfile.mkdtemp(), 'synthetic.json')
+        write_synthetic(input_file, args.samples)
+
+    seed_everything(0)
+    batches = list(data_loader.get_loader(input_file, args.batch_size, config, num_workers=0))
+    model = build_model(config)
+    model.load_state_dict(torch.load(args.weights, map_location='cpu'))
+
+    results = {}
+    for name, bf16 in (('fp32', False), ('bf16', True)):
+        run_inference(model, batches[:2], config, bf16)  # 预热
+        pred, label, elapsed = run_inference(model, batches, config, bf16)
+        results[name] = pred
+        mae = (pred - label).abs().mean().item()
+        rmse = ((pred - label) ** 2).mean().sqrt().item()
+        print(f"{name} 推理: {len(pred) / elapsed:.0f} samples/s, MAE {mae:.4f}, RMSE {rmse:.4f}")
+
+    print(f"bf16 与 fp32 预测差值: 最大 {(results['bf16'] - results['fp32']).abs().max().item():.4f} 分钟, "
+          f"平均 {(results['bf16'] - results['fp32']).abs().mean().item():.4f} 分钟")
+
+    if args.train_steps:
+        for name, bf16 in (('fp32', False), ('bf16', True)):
+            speed, loss = run_training(copy.deepcopy(model), batches, config, bf16, args.train_steps)
+            print(f"{name} 训练: {speed:.0f} samples/s, 最终损失 {loss:.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+模型输入构造的吞吐对比：逐条 DataInputUtils.build_model_input 与 BatchFeatureBuilder 批量构造
+
+用法（连接参数同服务，取 DB_HOST / DB_PORT / DB_USER / DB_PASSWORD / DB_NAME）:
+    python scripts/bench_features.py                          # 2025-07-22 的全部区间
+    python scripts/bench_features.py --date 2025-07-23 --batch-size 1024
+
+两种方式使用相同的随机种子（无实时观测时 time_gap 为随机晚点），并核对结果一致。
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.core.database import DatabaseConfig
+from app.services.data_input_utils import DataInputUtils
+from app.services.feature_builder import BatchFeatureBuilder
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--date', default='2025-07-22', help='运行日期 YYYY-MM-DD')
+    parser.add_argument('--batch-size', type=int, default=512, help='批量构造每批的请求数')
+    args = parser.parse_args()
+
+    utils = DataInputUtils(DatabaseConfig.get_db_config())
+    sections = utils.historical_data.day_sections(datetime.strptime(args.date, '%Y-%m-%d').date())
+    print(f"{args.date}: {len(sections)} 个区间")
+    if not sections:
+        return
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = [utils.build_model_input(*section) for section in sections]
+    single = time.perf_counter() - start
+
+    builder = BatchFeatureBuilder(utils)
+    start = time.perf_counter()
+    actual = []
+    for i in range(0, len(sections), args.batch_size):
+        actual += builder.build(sections[i:i + args.batch_size])
+    batched = time.perf_counter() - start
+
+    print(f"逐条构造: {len(sections) / single:>10.0f} 条/秒")
+    print(f"批量构造: {len(sections) / batched:>10.0f} 条/秒（每批 {args.batch_size}，含首次建表）")
+    mismatched = sum(a != b for a, b in zip(expected, actual))
+    print(f"结果{'一致' if mismatched == 0 else f'不一致 {mismatched} 条'}")
+
+
+if __name__ == '__main__':
+    main()
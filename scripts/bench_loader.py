@@ -0,0 +1,100 @@
+"""
+训练数据加载吞吐测试：不同 DataLoader worker 数下每秒产出的 batch 数
+
+用法:
+    python scripts/bench_loader.py                                   # 生成 20000 条合成轨迹测试
+    python scripts/bench_loader.py --input data/train_00_finals_update100.json --workers 0 2 4 8
+    python scripts/bench_loader.py --packed                          # 同时测试内存映射打包格式
+    python scripts/bench_loader.py --nextstop                        # 使用 data_loader_nextstop
+
+每个配置先跑一个 epoch 预热（启动 persistent worker），再计时一个完整 epoch。
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import ujson
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.train_delay import data_loader, data_loader_nextstop
+from app.services.train_delay.packed_dataset import pack
+
+
+def write_synthetic(path, samples, seed=0):
+    """写入与训练集字段相同的合成轨迹（长度 4~60 站）"""
+    r = random.Random(seed)
+    with open(path, 'w') as f:
+        for _ in range(samples):
+            T = r.randint(4, 60)
+            f.write(ujson.dumps({
+                "time_gap": [r.randint(-3, 15) for _ in range(T)],
+                "dist": r.uniform(50, 1300),
+                "lats": [30 + r.random() * 10 for _ in range(T)],
+                "lngs": [113 + r.random() * 8 for _ in range(T)],
+                "driverID": r.randint(0, 2000),
+                "weekID": r.randint(0, 6),
+                "states": [1.0] * T,
+                "timeID": r.randint(0, 1439),
+                "time": r.uniform(-5, 5),
+                "dateID": r.randint(0, 365),
+                "dist_gap": [0.0] + [r.uniform(10, 120) for _ in range(T - 1)],
+                "weather": [r.randint(0, 23) for _ in range(T)],
+                "temperature": [r.uniform(-5, 35) for _ in range(T)],
+                "wind": [r.randint(0, 41) for _ in range(T)],
+            }) + "\n")
+
+
+def bench(module, input_file, batch_size, workers):
+    build_start = time.perf_counter()
+    loader = module.get_loader(input_file, batch_size, {}, num_workers=workers)
+    build = time.perf_counter() - build_start
+
+    for _ in loader:  # 预热
+        pass
+    start = time.perf_counter()
+    batches = sum(1 for _ in loader)
+    elapsed = time.perf_counter() - start
+    return build, batches, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', help='JSON 行训练数据，缺省时生成合成数据')
+    parser.add_argument('--samples', type=int, default=20000, help='合成数据条数')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 1, 2, 4])
+    parser.add_argument('--packed', action='store_true', help='同时测试打包格式')
+    parser.add_argument('--nextstop', action='store_true', help='使用 data_loader_nextstop')
+    args = parser.parse_args()
+
+    tmpdir = None
+    input_file = args.input
+    if input_file is None:
+        tmpdir = tempfile.mkdtemp()
+        input_file = os.path.join(tmpdir, 'synthetic.json')
+        write_synthetic(input_file, args.samples)
+        print(f"合成数据: {args.samples} 条 -> {input_file}")
+
+    module = data_loader_nextstop if args.nextstop else data_loader
+
+    print(f"{'格式':<8}{'workers':>8}{'构建(s)':>10}{'batches':>9}{'耗时(s)':>10}{'batch/s':>10}")
+    # 打包目录存在时 get_loader 优先使用打包格式，因此先测 JSON 再打包
+    formats = ['json', 'packed'] if args.packed else ['json']
+    for name in formats:
+        if name == 'packed':
+            pack(input_file)
+        for workers in args.workers:
+            build, batches, elapsed = bench(module, input_file, args.batch_size, workers)
+            print(f"{name:<8}{workers:>8}{build:>10.2f}{batches:>9}{elapsed:>10.2f}{batches / elapsed:>10.1f}")
+
+    if tmpdir is not None:
+        import shutil
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+预测请求解析与响应序列化的单条耗时对比：原路径（Pydantic 模型 + ResponseModel + FastAPI 编码 + log_function 日志）
+与批量接口的精简路径（bulk_predict 解析 + 纯 dict + ujson）
+
+不连接数据库、不运行模型，只测与预测结果规模相关的解析和序列化部分：
+
+    python scripts/bench_serialization.py                       # 200 趟受影响列车
+    python scripts/bench_serialization.py --trains 800 --repeat 200
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.funcLogger import JsonEncoder
+from app.models.predict import PredictRequest, PredictResponse
+from app.models.response import ResponseModel
+from app.services import bulk_predict
+
+REQUEST_BODY = json.dumps({"args": {
+    "event_type": 1, "event_id": "e-1", "event_time": "2025-07-22 07:35:00", "event_location": 1,
+    "event_location_value": "济南西,泰安", "direction": 1, "train_id": "G1", "address": "K406+200",
+    "incidence": None, "second_accident": False, "wind_speed": 12.5, "rainfall": 3.0,
+}}, ensure_ascii=False)
+
+
+def synthetic_result(trains: int, stations: int) -> dict:
+    """compute_predict_result 结构的结果：trains 趟受影响列车，沿 stations 个车站的线路"""
+    rng = random.Random(0)
+    names = [f"站{k:03d}" for k in range(stations)]
+    table = [{'train_id': f"G{k}", 'start_station': names[0], 'end_station': names[-1],
+              'next_station': names[rng.randrange(stations)], 'status': rng.choice([0, 1, 4]),
+              'affect_time': rng.randint(-3, 60)} for k in range(trains)]
+    points = [{'id': n, 'name': n, 'trains': [t['train_id'] for t in table if t['next_station'] == n]} for n in names]
+    segments = [{'pointA': a, 'pointB': b,
+                 'trains': [{'id': t['train_id'], 'delay': str(t['affect_time']), 'derection': 'up'}
+                            for t in table if t['next_station'] == b]}
+                for a, b in zip(names, names[1:])]
+    return {
+        'statistics': {'impact_duration': 60, 'affect_trains_num': trains, 'high_affect_trains_num': trains // 3,
+                       'middle_affect_trains_num': trains // 3, 'low_affect_trains_num': trains - 2 * (trains // 3)},
+        'train_table': table,
+        'affect_graph': {'address': {'pointA': names[0], 'pointB': names[-1]}, 'points': points, 'lines': [segments]},
+        'model_tier': 'deeptte',
+    }
+
+
+def legacy(body: str, result: dict) -> str:
+    """原 /affect/predict：解析 PredictRequest，结果构造成模型，log_function 记录入参与返回值，FastAPI 按 response_model 编码"""
+    request = PredictRequest.model_validate_json(body)
+    json.dumps(request, cls=JsonEncoder, ensure_ascii=False)
+    response = ResponseModel.success(PredictResponse.model_validate(result))
+    json.dumps(response, cls=JsonEncoder, ensure_ascii=False)
+    return json.dumps(jsonable_encoder(ResponseModel.model_validate(response)), ensure_ascii=False,
+                      separators=(',', ':'))
+
+
+def lean(body: str, result: dict) -> str:
+    """批量接口的单条开销：解析为 LeanRequest，结果 dict 直接用 ujson 序列化"""
+    bulk_predict.parse_bulk('[' + body + ']')
+    return bulk_predict.encode_response([{'code': 200, 'msg': '请求成功', 'data': result}])
+
+
+def measure(fn, body: str, result: dict, repeat: int) -> float:
+    fn(body, result)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(body, result)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trains', type=int, default=200, help='受影响列车数')
+    parser.add_argument('--stations', type=int, default=40, help='影响范围内的车站数')
+    parser.add_argument('--repeat', type=int, default=500, help='每种路径的重复次数')
+    args = parser.parse_args()
+
+    result = synthetic_result(args.trains, args.stations)
+    old = json.loads(legacy(REQUEST_BODY, result))['data']
+    new = json.loads(lean(REQUEST_BODY, result))['data'][0]['data']
+    print(f"结果{'一致' if old == new else '不一致'}，响应 {len(json.dumps(old, ensure_ascii=False).encode())} 字节")
+
+    before = measure(legacy, REQUEST_BODY, result, args.repeat)
+    after = measure(lean, REQUEST_BODY, result, args.repeat)
+    print(f"原路径:   {before:>10.1f} µs/请求")
+    print(f"精简路径: {after:>10.1f} µs/请求（{before / after:.1f}x）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+对比时刻表两种内存表示：原 dict-of-lists（每个停站一个 dict + datetime）与列式 TimetableStore
+
+用法:
+    python scripts/bench_timetable.py                 # 使用 data/1111.csv + data/2222.csv
+    python scripts/bench_timetable.py --scale 200     # 复制车次到全国规模（约 140 万停站）
+
+内存用 tracemalloc 统计构建过程中新分配的内存（含 numpy 数组）；
+扫描测试为"某站点在某一小时内出发的全部停站"和"逐车次取站点序列"。
+"""
+import argparse
+import csv
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.timetable_store import TimetableStore
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'services', 'train_delay', 'data')
+
+
+def read_rows(scale):
+    rows = []
+    for name in ('1111.csv', '2222.csv'):
+        with open(os.path.join(DATA_DIR, name), 'r', encoding='utf-8') as f:
+            for r in csv.DictReader(f):
+                rows.append((r['train_ID'], r['station'],
+                             datetime.strptime(r['arrival_time'], '%Y-%m-%d %H:%M:%S'),
+                             datetime.strptime(r['departure_time'], '%Y-%m-%d %H:%M:%S')))
+    if scale <= 1:
+        return rows
+    scaled = []
+    for k in range(scale):
+        # 每份副本是不同车次、不同日期，保证 datetime 对象互不共享
+        shift = timedelta(days=k % 365)
+        for train_id, station, arr, dep in rows:
+            scaled.append((f"{train_id}_{k}", station, arr + shift, dep + shift))
+    return scaled
+
+
+def build_dict_of_lists(rows):
+    """与原 DataInputUtils.load_historical_data 相同的构建方式"""
+    historical_data = {}
+    for train_id, station, arrival_time, departure_time in rows:
+        if train_id not in historical_data:
+            historical_data[train_id] = []
+        historical_data[train_id].append({
+            'station': station,
+            'arrival_time': arrival_time,
+            'departure_time': departure_time
+        })
+    return historical_data
+
+
+def measure(builder, rows):
+    """返回 (构建结果, 新增内存字节, 构建耗时)；耗时单独测量，避免 tracemalloc 的开销计入"""
+    start = time.perf_counter()
+    builder(rows)
+    elapsed = time.perf_counter() - start
+
+    # 行数据中的 datetime 在两种表示里都需要重新创建一份，复制后再计量
+    rows = [(t, s, a.replace(), d.replace()) for t, s, a, d in rows]
+    gc.collect()
+    tracemalloc.start()
+    base, _ = tracemalloc.get_traced_memory()
+    obj = builder(rows)
+    del rows
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current - base, elapsed
+
+
+def timeit(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=1, help='车次复制倍数')
+    args = parser.parse_args()
+
+    rows = read_rows(args.scale)
+    print(f"停站数: {len(rows)}")
+
+    legacy, legacy_bytes, legacy_build = measure(build_dict_of_lists, rows)
+    store, store_bytes, store_build = measure(TimetableStore.from_rows, rows)
+
+    station = rows[len(rows) // 2][1]
+    win_start = rows[len(rows) // 2][3] - timedelta(minutes=30)
+    win_end = win_start + timedelta(hours=1)
+
+    def legacy_scan():
+        hits = 0
+        for stops in legacy.values():
+            for stop in stops:
+                if stop['station'] == station and win_start <= stop['departure_time'] <= win_end:
+                    hits += 1
+        return hits
+
+    def store_scan():
+        return int(store.departures_between(win_start, win_end, station).size)
+
+    train_ids = list(legacy)
+
+    def legacy_sequences():
+        return sum(len([s['station'] for s in legacy[t]]) for t in train_ids)
+
+    def store_sequences():
+        return sum(len(store.station_sequence(t)) for t in train_ids)
+
+    legacy_scan_t, legacy_hits = timeit(legacy_scan)
+    store_scan_t, store_hits = timeit(store_scan)
+    assert legacy_hits == store_hits, (legacy_hits, store_hits)
+    legacy_seq_t, _ = timeit(legacy_sequences, repeat=3)
+    store_seq_t, _ = timeit(store_sequences, repeat=3)
+
+    n = len(rows)
+    print(f"{'':<24}{'dict-of-lists':>16}{'TimetableStore':>16}")
+    print(f"{'内存 (MB)':<24}{legacy_bytes / 2**20:>16.2f}{store_bytes / 2**20:>16.2f}")
+    print(f"{'每停站字节':<24}{legacy_bytes / n:>16.1f}{store_bytes / n:>16.1f}")
+    print(f"{'构建耗时 (ms)':<24}{legacy_build * 1e3:>16.1f}{store_build * 1e3:>16.1f}")
+    print(f"{'站点时间窗扫描 (ms)':<24}{legacy_scan_t * 1e3:>16.3f}{store_scan_t * 1e3:>16.3f}")
+    print(f"{'全部车次站点序列 (ms)':<24}{legacy_seq_t * 1e3:>16.1f}{store_seq_t * 1e3:>16.1f}")
+    print(f"扫描命中: {store_hits}")
+
+
+if __name__ == '__main__':
+    main()
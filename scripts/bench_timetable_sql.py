@@ -0,0 +1,183 @@
+"""
+test3 时刻表查询在 MySQL 上的耗时对比：原查询（DATE() 过滤、跨表 OR）与改写后的范围谓词 / UNION 查询，
+分别在无索引和加上 migrations/001_test3_indexes.sql 中的索引后执行
+
+用法（连接参数同服务，取 DB_HOST / DB_PORT / DB_USER / DB_PASSWORD / DB_NAME）:
+    python scripts/bench_timetable_sql.py                    # data/1111.csv + 2222.csv 复制 50 倍
+    python scripts/bench_timetable_sql.py --scale 200 --queries 100
+
+在独立的 test3_bench 表中进行（结束后删除，--keep 保留），不影响 test3。
+每条查询取多次执行的中位数，并核对新旧查询的结果一致；同时输出 EXPLAIN 中的访问类型和索引。
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+import pymysql
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import DatabaseConfig
+from app.services import timetable_queries
+from bench_timetable import read_rows
+
+TABLE = 'test3_bench'
+
+LEGACY_SCHEDULE_SQL = """
+    SELECT station, departure_time
+    FROM test3
+    WHERE train_ID = %s AND DATE(departure_time) = %s
+    ORDER BY departure_time
+"""
+
+LEGACY_CONCURRENT_SQL = """
+    SELECT DISTINCT t1.train_ID,
+           t1.station as from_station, t1.departure_time as from_time,
+           t2.station as to_station, t2.arrival_time as to_time
+    FROM test3 t1
+    JOIN test3 t2 ON t1.train_ID = t2.train_ID
+    WHERE DATE(t1.departure_time) = %s
+      AND (t1.station = %s OR t2.station = %s)
+      AND t1.departure_time BETWEEN %s AND %s
+      AND t2.arrival_time BETWEEN %s AND %s
+      AND t1.departure_time < t2.arrival_time
+      AND t1.station != t2.station
+    ORDER BY t1.departure_time
+"""
+
+
+def on_bench_table(sql):
+    return sql.replace('test3', TABLE)
+
+
+def create_table(cursor, rows, chunk=5000):
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(f"""
+        CREATE TABLE {TABLE} (
+          id int(11) NOT NULL AUTO_INCREMENT,
+          train_ID varchar(20) COLLATE utf8mb4_unicode_ci NOT NULL,
+          station varchar(50) COLLATE utf8mb4_unicode_ci NOT NULL,
+          arrival_time datetime NOT NULL,
+          departure_time datetime NOT NULL,
+          source_table varchar(10) COLLATE utf8mb4_unicode_ci NOT NULL,
+          PRIMARY KEY (id)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    sql = f"INSERT INTO {TABLE} (train_ID, station, arrival_time, departure_time, source_table) VALUES (%s, %s, %s, %s, 'bench')"
+    for i in range(0, len(rows), chunk):
+        cursor.executemany(sql, rows[i:i + chunk])
+
+
+def add_indexes(cursor):
+    for name, columns in timetable_queries.TEST3_INDEXES:
+        cursor.execute(f"ALTER TABLE {TABLE} ADD INDEX {name} ({columns})")
+    cursor.execute(f"ANALYZE TABLE {TABLE}")
+    cursor.fetchall()
+
+
+def sample_cases(rows, n, seed=0):
+    """随机取 n 个 (车次, 日期) 与 (站点, 以某次出发为中心的一小时窗口)"""
+    rng = random.Random(seed)
+    cases = []
+    for train_id, station, _, departure in rng.sample(rows, min(n, len(rows))):
+        date_str = departure.strftime('%Y-%m-%d')
+        cases.append((train_id, date_str, station,
+                      departure - timedelta(minutes=30), departure + timedelta(minutes=30)))
+    return cases
+
+
+def legacy_params(case):
+    train_id, date_str, station, start, end = case
+    fmt = '%Y-%m-%d %H:%M:%S'
+    return ((train_id, date_str),
+            (date_str, station, station, start.strftime(fmt), end.strftime(fmt), start.strftime(fmt), end.strftime(fmt)))
+
+
+def new_params(case):
+    train_id, date_str, station, start, end = case
+    return (timetable_queries.schedule_params(train_id, date_str),
+            timetable_queries.concurrent_params(date_str, station, start, end))
+
+
+def run(cursor, sql, params_list, repeat):
+    """返回 (每条查询中位数耗时 ms 的中位数, 各查询结果)"""
+    timings, results = [], []
+    for params in params_list:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            samples.append(time.perf_counter() - start)
+        timings.append(statistics.median(samples) * 1000)
+        results.append(sorted(rows))
+    return statistics.median(timings), results
+
+
+def explain(cursor, sql, params):
+    cursor.execute("EXPLAIN " + sql, params)
+    columns = [d[0] for d in cursor.description]
+    plans = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return ', '.join(f"{p.get('table')}:{p.get('type')}/{p.get('key') or '-'}" for p in plans)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=50, help='车次复制倍数')
+    parser.add_argument('--queries', type=int, default=50, help='每类查询的随机参数组数')
+    parser.add_argument('--repeat', type=int, default=3, help='每组参数的执行次数')
+    parser.add_argument('--keep', action='store_true', help='保留 test3_bench 表')
+    args = parser.parse_args()
+
+    rows = read_rows(args.scale)
+    cases = sample_cases(rows, args.queries)
+    db = pymysql.connect(**DatabaseConfig.get_db_config())
+    cursor = db.cursor()
+
+    start = time.perf_counter()
+    create_table(cursor, rows)
+    print(f"{TABLE}: {len(rows)} 个停站，写入耗时 {time.perf_counter() - start:.1f}s")
+
+    queries = [
+        ('站点序列 原查询', on_bench_table(LEGACY_SCHEDULE_SQL), [legacy_params(c)[0] for c in cases]),
+        ('站点序列 范围谓词', on_bench_table(timetable_queries.SCHEDULE_SQL), [new_params(c)[0] for c in cases]),
+        ('并发列车 原查询', on_bench_table(LEGACY_CONCURRENT_SQL), [legacy_params(c)[1] for c in cases]),
+        ('并发列车 UNION', on_bench_table(timetable_queries.CONCURRENT_SQL), [new_params(c)[1] for c in cases]),
+    ]
+
+    report = {}
+    try:
+        for phase in ('无索引', '有索引'):
+            if phase == '有索引':
+                start = time.perf_counter()
+                add_indexes(cursor)
+                print(f"建索引耗时 {time.perf_counter() - start:.1f}s")
+            for name, sql, params_list in queries:
+                # 无索引时并发列车原查询是自连接全表扫描，只取少量参数
+                sample = params_list if phase == '有索引' or '序列' in name else params_list[:5]
+                ms, results = run(cursor, sql, sample, args.repeat)
+                report[(name, phase)] = (ms, results, explain(cursor, sql, sample[0]))
+
+        print(f"\n{'查询':<16}{'无索引 ms':>12}{'有索引 ms':>12}  有索引时的执行计划")
+        for name, _, _ in queries:
+            before, after = report[(name, '无索引')], report[(name, '有索引')]
+            print(f"{name:<16}{before[0]:>12.2f}{after[0]:>12.2f}  {after[2]}")
+
+        for kind in ('站点序列', '并发列车'):
+            legacy = next(v for k, v in report.items() if k[0].startswith(kind) and '原查询' in k[0] and k[1] == '有索引')
+            new = next(v for k, v in report.items() if k[0].startswith(kind) and '原查询' not in k[0] and k[1] == '有索引')
+            same = all(a == b for a, b in zip(legacy[1], new[1]))
+            print(f"{kind}: 新旧查询结果{'一致' if same else '不一致'}")
+    finally:
+        if not args.keep:
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
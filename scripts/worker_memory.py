@@ -0,0 +1,55 @@
+"""
+统计服务进程的内存占用，用于对比 pre-fork 多 worker 部署与单进程部署
+
+用法:
+    python scripts/worker_memory.py                 # 自动查找 gunicorn / uvicorn 进程
+    python scripts/worker_memory.py 1234 1235 1236  # 指定 PID
+
+输出每个进程的 RSS / PSS / 共享 / 私有内存（MB）以及 PSS 合计。
+多 worker 时所有进程 PSS 之和即为服务实际占用的物理内存，可与单进程 uvicorn 的 RSS 直接比较。
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.core.metrics import process_memory
+
+
+def find_server_pids():
+    """查找命令行包含 gunicorn 或 uvicorn 且加载了 app.main 的进程"""
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/cmdline', 'rb') as f:
+                cmdline = f.read().replace(b'\0', b' ').decode(errors='ignore')
+        except OSError:
+            continue
+        if 'app.main:app' in cmdline and ('gunicorn' in cmdline or 'uvicorn' in cmdline):
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def main():
+    pids = [int(p) for p in sys.argv[1:]] or find_server_pids()
+    if not pids:
+        print("未找到服务进程")
+        return
+
+    print(f"{'PID':>8} {'RSS(MB)':>10} {'PSS(MB)':>10} {'共享(MB)':>10} {'私有(MB)':>10}")
+    total_pss = 0
+    for pid in pids:
+        usage = process_memory(pid)
+        if not usage:
+            print(f"{pid:>8} 无法读取 /proc/{pid}/smaps_rollup")
+            continue
+        total_pss += usage['pss_kb']
+        print(f"{pid:>8} {usage['rss_kb'] / 1024:>10.1f} {usage['pss_kb'] / 1024:>10.1f} "
+              f"{usage['shared_kb'] / 1024:>10.1f} {usage['private_kb'] / 1024:>10.1f}")
+    print(f"PSS 合计: {total_pss / 1024:.1f} MB ({len(pids)} 个进程)")
+
+
+if __name__ == '__main__':
+    main()